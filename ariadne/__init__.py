@@ -17,3 +17,7 @@ from pathlib import Path
 
 model_directory: Path = Path(__file__).resolve().parents[1] / "models"
 cache_directory: Path = Path(__file__).resolve().parents[1] / "cache"
+
+# Store used by classifiers that are not given a model directory or store, e.g. a `DirectoryModelStore` shared by
+# several nodes. `None` keeps the models in `model_directory`.
+model_store = None
@@ -0,0 +1,85 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from ariadne import metrics
+
+
+class OverloadedError(Exception):
+    """Raised when a request is rejected because too many requests are already waiting for the same classifier."""
+
+
+class ConcurrencyLimiter:
+    """Limits how many requests are processed at once, further requests wait in a bounded queue.
+
+    Requests that find the queue full, or that waited longer than `max_wait`, are rejected with an `OverloadedError`
+    right away instead of piling up, which keeps the latency of the admitted requests bounded.
+
+    Args:
+        max_concurrent: Maximum number of requests processed at once
+        max_queued: Maximum number of requests waiting to be processed
+        max_wait (optional): Maximum time in seconds a request waits before it is rejected
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int = 0, max_wait: Optional[float] = None):
+        if max_concurrent < 1:
+            raise ValueError(f"Maximum number of concurrent requests must be at least 1 but is [{max_concurrent}]")
+
+        self._max_concurrent = max_concurrent
+        self._max_queued = max_queued
+        self._max_wait = max_wait
+        self._condition = threading.Condition()
+        self._active = 0
+        self._queued = 0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @contextmanager
+    def acquire(self) -> Iterator[None]:
+        with metrics.phase("queue_wait"):
+            self._wait_for_slot()
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify()
+
+    def _wait_for_slot(self):
+        with self._condition:
+            if self._active >= self._max_concurrent:
+                if self._queued >= self._max_queued:
+                    raise OverloadedError(f"[{self._queued}] requests are already waiting")
+
+                self._queued += 1
+                try:
+                    admitted = self._condition.wait_for(lambda: self._active < self._max_concurrent, self._max_wait)
+                finally:
+                    self._queued -= 1
+
+                if not admitted:
+                    raise OverloadedError(f"Request has not been admitted within [{self._max_wait}]s")
+
+            self._active += 1
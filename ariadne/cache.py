@@ -0,0 +1,348 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import attr
+
+logger = logging.getLogger(__name__)
+
+# Default of limits that `configure` leaves as they are, `None` removes a limit
+_UNCHANGED: Any = object()
+
+
+@attr.s(frozen=True)
+class CacheStats:
+    hits: int = attr.ib()
+    misses: int = attr.ib()
+    evictions: int = attr.ib()
+    entries: int = attr.ib()
+    weight: int = attr.ib()
+
+
+class LruCache:
+    """Thread-safe least-recently-used cache bounded by entry count and, optionally, by total weight.
+
+    Args:
+        max_entries: Maximum number of entries to keep, `0` disables caching
+        max_weight (optional): Maximum summed weight of all entries, e.g. their size in bytes
+    """
+
+    def __init__(self, max_entries: int = 128, max_weight: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._max_entries = max_entries
+        self._max_weight = max_weight
+        self._weight = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, weight: int = 1):
+        with self._lock:
+            self._remove(key)
+
+            if self._max_entries <= 0 or (self._max_weight is not None and weight > self._max_weight):
+                return
+
+            self._entries[key] = (value, weight)
+            self._weight += weight
+            self._evict()
+
+    def peek(self, key: Hashable) -> Any:
+        """Returns the entry for the key without counting a hit or miss and without marking it as recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0]
+
+    def pop(self, key: Hashable) -> Any:
+        with self._lock:
+            return self._remove(key)
+
+    def remove_if(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Removes all entries for whose key and value the predicate is true and returns how many there were."""
+        with self._lock:
+            keys = [key for key, (value, _) in self._entries.items() if predicate(key, value)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._weight = 0
+
+    def configure(self, max_entries: int = _UNCHANGED, max_weight: Optional[int] = _UNCHANGED):
+        """Changes the given limits, limits that are not passed are kept."""
+        with self._lock:
+            if max_entries is not _UNCHANGED:
+                self._max_entries = max_entries
+            if max_weight is not _UNCHANGED:
+                self._max_weight = max_weight
+            self._evict()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._entries), self._weight)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _remove(self, key: Hashable) -> Any:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+
+        self._weight -= entry[1]
+        return entry[0]
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self._max_entries or (self._max_weight is not None and self._weight > self._max_weight)
+        ):
+            _, (_, weight) = self._entries.popitem(last=False)
+            self._weight -= weight
+            self._evictions += 1
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls: while a call for a key is in flight, further calls for the same key wait for it
+    and share its result, or its exception, instead of running the function again."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    @property
+    def shared(self) -> int:
+        """Number of calls that waited for a call already in flight."""
+        with self._lock:
+            return self._shared
+
+
+@attr.s(frozen=True)
+class _ModelEntry:
+    model: Any = attr.ib()
+    signature: Tuple[int, int, int] = attr.ib()
+    version: Optional[int] = attr.ib(default=None)
+
+
+class ModelCache:
+    """Keeps deserialized models in memory so that they are not unpickled on every prediction.
+
+    Entries are validated against the modification time, inode and size of the model file on every access,
+    therefore models written by other processes (e.g. other gunicorn workers) are picked up automatically.
+    The size of the model file is used as an estimate for the memory it occupies once loaded.
+
+    Replacing an entry only swaps the reference to the model, requests that already got the previous model keep
+    using it until they are done. Entries with a version are never replaced by older versions of the same model.
+
+    Args:
+        max_entries: Maximum number of models to keep, `0` disables caching
+        max_bytes (optional): Maximum summed size of the model files of all cached models
+    """
+
+    def __init__(self, max_entries: int = 32, max_bytes: Optional[int] = None):
+        self._cache = LruCache(max_entries, max_bytes)
+        self._loads = SingleFlight()
+        self._lock = threading.Lock()
+        self._installs = 0
+
+    def load(
+        self, key: Hashable, path: Path, loader: Callable[[Path], Any], version: Optional[int] = None
+    ) -> Optional[Any]:
+        """Returns the cached model or loads it. Concurrent loads of the same model, e.g. by the predictions
+        following a training, are deduplicated so that the file is deserialized only once."""
+        signature = get_file_signature(path)
+        if signature is None:
+            self._cache.pop(key)
+            return None
+
+        entry: Optional[_ModelEntry] = self._cache.get(key)
+        if entry is not None and entry.signature == signature:
+            return entry.model
+
+        return self._loads.do(
+            (key, signature), lambda: self._load(key, path, loader, _ModelEntry(None, signature, version))
+        )
+
+    def install(self, key: Hashable, path: Path, model: Any, version: Optional[int] = None) -> bool:
+        """Makes a model that is already in memory, e.g. one that has just been trained, the cached model for the
+        given file, so that the next load returns it without reading the file.
+
+        Returns:
+            Whether the model has been cached, `False` if the file does not exist or a newer version is cached
+        """
+        signature = get_file_signature(path)
+        if signature is None:
+            return False
+
+        installed = self._put(key, _ModelEntry(model, signature, version))
+        if installed:
+            with self._lock:
+                self._installs += 1
+        return installed
+
+    def _load(self, key: Hashable, path: Path, loader: Callable[[Path], Any], entry: _ModelEntry) -> Any:
+        logger.debug("Loading model from [%s]", path)
+        model = loader(path)
+        self._put(key, attr.evolve(entry, model=model))
+        return model
+
+    def _put(self, key: Hashable, entry: _ModelEntry) -> bool:
+        with self._lock:
+            current: Optional[_ModelEntry] = self._cache.peek(key)
+            if (
+                current is not None
+                and current.version is not None
+                and entry.version is not None
+                and current.version > entry.version
+            ):
+                return False
+
+            self._cache.put(key, entry, weight=entry.signature[2])
+            return True
+
+    def invalidate(self, key: Hashable):
+        self._cache.pop(key)
+
+    def discard_older(self, key: Hashable, version: int):
+        """Drops the cached model if it is a version older than the given one, e.g. once a newer model has been
+        published, so that it does not take up memory until it is evicted."""
+        with self._lock:
+            current: Optional[_ModelEntry] = self._cache.peek(key)
+            if current is not None and current.version is not None and current.version < version:
+                self._cache.pop(key)
+
+    def clear(self):
+        self._cache.clear()
+
+    def configure(self, max_entries: int = _UNCHANGED, max_bytes: Optional[int] = _UNCHANGED):
+        """Changes the given limits, limits that are not passed are kept and `max_bytes=None` removes the byte
+        limit."""
+        self._cache.configure(max_entries, max_bytes)
+
+    def stats(self) -> CacheStats:
+        return self._cache.stats()
+
+    @property
+    def shared_loads(self) -> int:
+        """Number of loads that waited for the same model to be loaded by another thread."""
+        return self._loads.shared
+
+    @property
+    def installs(self) -> int:
+        """Number of models that have been cached by `install` instead of being loaded."""
+        with self._lock:
+            return self._installs
+
+
+class ResourceCache:
+    """Keeps heavyweight objects that classifiers share and never change, e.g. featurizers wrapping pretrained models.
+
+    Each resource is loaded once on first use, concurrent first uses wait for the same load.
+    """
+
+    def __init__(self):
+        self._resources: Dict[Hashable, Any] = {}
+        self._loads = SingleFlight()
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        try:
+            return self._resources[key]
+        except KeyError:
+            return self._loads.do(key, lambda: self._load(key, loader))
+
+    def clear(self):
+        self._resources.clear()
+
+    def _load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        # A load that finished just before this one started must not be repeated
+        if key not in self._resources:
+            logger.debug("Loading resource [%s]", key)
+            self._resources[key] = loader()
+        return self._resources[key]
+
+
+def get_file_signature(path: Path) -> Optional[Tuple[int, int, int]]:
+    """Returns modification time, inode and size of the given file, which change whenever it is replaced, or `None`
+    if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    return st.st_mtime_ns, st.st_ino, st.st_size
+
+
+# Shared by all classifiers of this process, use `model_cache.configure(...)` to change its limits
+model_cache = ModelCache()
+
+resource_cache = ResourceCache()
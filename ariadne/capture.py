@@ -0,0 +1,266 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gzip
+import io
+import json
+import logging
+import os
+import random
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import attr
+
+logger = logging.getLogger(__name__)
+
+_CAPTURED_ENDPOINTS = ("predict", "train")
+
+
+@attr.s(frozen=True)
+class CapturedRequest:
+    timestamp: float = attr.ib()
+    method: str = attr.ib()
+    path: str = attr.ib()
+    query: str = attr.ib()
+    content_type: str = attr.ib()
+    body: str = attr.ib(repr=False)
+    status: Optional[int] = attr.ib(default=None)
+    duration_seconds: Optional[float] = attr.ib(default=None)
+
+    @property
+    def endpoint(self) -> str:
+        return self.path.rstrip("/").rsplit("/", 1)[-1]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "timestamp": self.timestamp,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "contentType": self.content_type,
+            "status": self.status,
+            "durationSeconds": self.duration_seconds,
+            "body": self.body,
+        }
+
+    @classmethod
+    def from_json(cls, json_object: Dict[str, Any]) -> "CapturedRequest":
+        return cls(
+            json_object["timestamp"],
+            json_object["method"],
+            json_object["path"],
+            json_object.get("query", ""),
+            json_object.get("contentType", "application/json"),
+            json_object["body"],
+            json_object.get("status"),
+            json_object.get("durationSeconds"),
+        )
+
+
+class TrafficRecorder:
+    """Appends a sample of the requests to gzip compressed JSON lines files, one per process.
+
+    The files are named `capture-<start time>-<pid>.jsonl.gz` and are only created once the first request is
+    recorded, so that processes forked by gunicorn do not share a file. Every record is flushed, files of processes
+    that were killed can still be read up to their last record.
+
+    Args:
+        directory: The directory the archives are written to
+        sample_rate: Fraction of the requests to record
+        max_request_bytes: Larger requests are not recorded
+        max_bytes: Recording stops once the archive of a process reaches this compressed size
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        sample_rate: float = 0.01,
+        max_request_bytes: int = 16 * 1024**2,
+        max_bytes: int = 1024**3,
+    ):
+        self._directory = Path(directory)
+        self._sample_rate = sample_rate
+        self._max_request_bytes = max_request_bytes
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+        self._archive: Optional[gzip.GzipFile] = None
+        self._pid: Optional[int] = None
+        self._full = False
+
+    @property
+    def max_request_bytes(self) -> int:
+        return self._max_request_bytes
+
+    def should_record(self) -> bool:
+        return not self._full and self._sample_rate > 0 and random.random() < self._sample_rate
+
+    def record(self, captured: CapturedRequest):
+        line = (json.dumps(captured.to_json()) + "\n").encode("utf-8")
+        with self._lock:
+            if self._full:
+                return
+            if self._pid != os.getpid():
+                self._open()
+
+            self._archive.write(line)
+            self._archive.flush(zlib.Z_SYNC_FLUSH)
+            if self._file.tell() >= self._max_bytes:
+                logger.warning("Traffic archive [%s] is full, no longer recording requests", self._file.name)
+                self._full = True
+                self._close()
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _open(self):
+        # After a fork the file belongs to the parent process, which keeps writing to it
+        self._file = self._archive = None
+        self._directory.mkdir(parents=True, exist_ok=True)
+        name = f"capture-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl.gz"
+        self._file = open(self._directory / name, "ab")
+        self._archive = gzip.GzipFile(fileobj=self._file, mode="wb")
+        self._pid = os.getpid()
+        logger.info("Recording a sample of the requests to [%s]", self._file.name)
+
+    def _close(self):
+        if self._archive is not None and self._pid == os.getpid():
+            self._archive.close()
+            self._file.close()
+        self._file = self._archive = None
+        self._pid = None
+
+
+class CaptureMiddleware:
+    """WSGI middleware that records a sample of the prediction and training requests with a `TrafficRecorder`.
+
+    Recorded requests are read completely before the application sees them. Requests of unknown size, e.g.
+    compressed ones, are only read up to the size limit, larger ones are passed on without being recorded.
+    """
+
+    def __init__(self, app: Callable, recorder: TrafficRecorder):
+        self._app = app
+        self._recorder = recorder
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        path = environ.get("PATH_INFO", "")
+        if (
+            environ.get("REQUEST_METHOD") != "POST"
+            or path.rstrip("/").rsplit("/", 1)[-1] not in _CAPTURED_ENDPOINTS
+            or not self._recorder.should_record()
+        ):
+            return self._app(environ, start_response)
+
+        body = self._read_body(environ)
+        if body is None:
+            return self._app(environ, start_response)
+
+        status = []
+
+        def _start_response(status_line: str, headers, exc_info=None):
+            status.append(int(status_line.split(" ", 1)[0]))
+            return start_response(status_line, headers, exc_info)
+
+        timestamp = time.time()
+        start = time.perf_counter()
+        result = self._app(environ, _start_response)
+        duration = time.perf_counter() - start
+
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            return result
+
+        captured = CapturedRequest(
+            timestamp,
+            "POST",
+            path,
+            environ.get("QUERY_STRING", ""),
+            environ.get("CONTENT_TYPE", ""),
+            text,
+            status[0] if status else None,
+            duration,
+        )
+        try:
+            self._recorder.record(captured)
+        except OSError:
+            logger.exception("Recording request to [%s] failed", path)
+        return result
+
+    def _read_body(self, environ: Dict[str, Any]) -> Optional[bytes]:
+        limit = self._recorder.max_request_bytes
+        stream = environ["wsgi.input"]
+        content_length = environ.get("CONTENT_LENGTH")
+        if content_length and not environ.get("wsgi.input_terminated"):
+            if int(content_length) > limit:
+                return None
+            body = stream.read(int(content_length))
+        else:
+            body = stream.read(limit + 1)
+            if len(body) > limit:
+                environ["wsgi.input"] = io.BufferedReader(_PrefixedStream(body, stream))
+                return None
+
+        environ["wsgi.input"] = io.BytesIO(body)
+        environ["wsgi.input_terminated"] = True
+        environ["CONTENT_LENGTH"] = str(len(body))
+        return body
+
+
+class _PrefixedStream(io.RawIOBase):
+    """Returns the already read prefix before the rest of the stream."""
+
+    def __init__(self, prefix: bytes, stream: BinaryIO):
+        self._prefix = memoryview(prefix)
+        self._stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._prefix:
+            n = min(len(buffer), len(self._prefix))
+            buffer[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+
+        data = self._stream.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def read_archives(paths: Sequence[Path]) -> List[CapturedRequest]:
+    """Reads the requests of the given archives ordered by the time they arrived."""
+    requests = []
+    for path in paths:
+        requests.extend(_read_archive(Path(path)))
+    requests.sort(key=lambda captured: captured.timestamp)
+    return requests
+
+
+def _read_archive(path: Path) -> Iterator[CapturedRequest]:
+    with gzip.open(path, "rb") as f:
+        try:
+            for line in f:
+                if line.endswith(b"\n"):
+                    yield CapturedRequest.from_json(json.loads(line))
+        except EOFError:
+            # The process writing the archive has been killed, all flushed records are complete
+            logger.debug("Archive [%s] is truncated", path)
@@ -13,49 +13,178 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import glob
 import logging
 import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional, Any
+from typing import Hashable, List, Optional, Any, Tuple
 
 import joblib
 from cassis import Cas
 
 import ariadne
-from ariadne.protocol import TrainingDocument
+from ariadne import cache, metrics
+from ariadne.protocol import TrainingDocument, PredictionRequest
+from ariadne.store import LocalModelStore, ModelStore
 
 logger = logging.getLogger(__file__)
 
+_training_context = threading.local()
+
+
+class TrainingCancelledError(Exception):
+    """Raised inside `Classifier.fit` when the training has been cancelled."""
+
+
+@contextmanager
+def cancellable_training(cancelled: threading.Event):
+    """Makes trainings run by the current thread observe the given cancellation event."""
+    _training_context.cancelled = cancelled
+    try:
+        yield
+    finally:
+        _training_context.cancelled = None
+
 
 class Classifier:
-    def __init__(self, model_directory: Path = None):
+    # Classifiers whose `fit` iterates over the documents only once can set this, they are then given an iterator
+    # that parses the documents one at a time instead of a list of all parsed documents
+    supports_streaming_training: bool = False
+
+    # Arrays of saved models are memory mapped when loading them, so that all workers share them via the page cache
+    # instead of each reading a private copy. Copy-on-write ("c") keeps them writable, `None` reads models fully.
+    model_mmap_mode: Optional[str] = "c"
+
+    # Classifiers that extract their training samples from each document on its own can set this and implement
+    # `extract_samples` and `fit_samples`, the server then only extracts samples from documents that changed since
+    # the last training. Increase `sample_version` whenever `extract_samples` changes, so that old samples are dropped.
+    supports_sample_store: bool = False
+    sample_version: int = 1
+
+    def __init__(self, model_directory: Path = None, model_store: ModelStore = None):
         self.model_directory = ariadne.model_directory if model_directory is None else model_directory
+        if model_store is None and model_directory is None:
+            model_store = ariadne.model_store
+        self.model_store = LocalModelStore(self.model_directory) if model_store is None else model_store
 
     def fit(self, documents: List[TrainingDocument], layer: str, feature: str, project_id, user_id: str):
-        pass
+        if self.supports_sample_store:
+            samples = [sample for document in documents for sample in self.extract_samples(document, layer, feature)]
+            self.fit_samples(samples, layer, feature, project_id, user_id)
+
+    def extract_samples(self, document: TrainingDocument, layer: str, feature: str) -> List[Any]:
+        """Returns the training samples of a single document, they must be picklable."""
+        raise NotImplementedError()
+
+    def fit_samples(self, samples: List[Any], layer: str, feature: str, project_id: str, user_id: str):
+        """Trains on the samples extracted from all documents of a training request."""
+        raise NotImplementedError()
 
     def predict(self, cas: Cas, layer: str, feature: str, project_id: str, document_id: str, user_id: str):
         raise NotImplementedError()
 
+    def predict_batch(self, requests: List[PredictionRequest]):
+        """Predicts several documents at once, e.g. the concurrent requests collected by the server's batching.
+
+        The default implementation predicts each request on its own, classifiers that benefit from larger batches
+        (e.g. neural models) should override it and run a single forward pass for all requests.
+        """
+        for req in requests:
+            self.predict(req.cas, req.layer, req.feature, req.project_id, req.document_id, req.user_id)
+
+    def get_model_version(self, user_id: str) -> Optional[Hashable]:
+        """Identifies the model the predictions for the given user are made with, it changes whenever
+        `_save_model` publishes a new model, also in other processes. `None` if there is no model for the user.
+        """
+        return self.model_store.current_version(self.name, user_id)
+
     def _load_model(self, user_id: str) -> Optional[Any]:
-        model_path = self._get_model_path(user_id)
-        if model_path.is_file():
-            logger.debug("Model found for [%s]", model_path)
-            return joblib.load(model_path)
-        else:
-            logger.debug("No model found for [%s]", model_path)
-            return None
+        with metrics.phase("model_load"):
+            # Retry if the version is deleted by newer ones being published between looking it up and loading it,
+            # retries ask the store itself as the version known from watching it may have been deleted already
+            for attempt in range(3):
+                if attempt == 0:
+                    version = self.model_store.current_version(self.name, user_id)
+                else:
+                    version = self.model_store.latest_version(self.name, user_id)
+                if version is None:
+                    break
+                model_path = self.model_store.fetch(self.name, user_id, version)
+                model = cache.model_cache.load(self._get_model_key(user_id), model_path, self._read_model, version)
+                if model is not None:
+                    return model
+
+        logger.debug("No model found for [%s] of user [%s]", self.name, user_id)
+        return None
 
     def _save_model(self, user_id: str, model: Any):
-        model_path = self._get_model_path(user_id)
-        model_path.parent.mkdir(parents=True, exist_ok=True)
-        tmp_model_path = model_path.with_suffix(".joblib.tmp")
-        joblib.dump(model, tmp_model_path)
-        os.replace(tmp_model_path, model_path)
+        self._check_cancelled()
 
-    def _get_model_path(self, user_id: str) -> Path:
-        return self.model_directory / self.name / f"model_{user_id}.joblib"
+        version = self.model_store.publish(self.name, user_id, lambda model_path: _write_model(model, model_path))
+
+        # Predictions use the trained model right away instead of reading it back, those running keep the old one
+        model_path = self.model_store.fetch(self.name, user_id, version)
+        cache.model_cache.install(self._get_model_key(user_id), model_path, model, version)
+
+    def _read_model(self, model_path: Path) -> Any:
+        return joblib.load(model_path, mmap_mode=self.model_mmap_mode)
+
+    def _check_cancelled(self):
+        """Aborts the current training if it has been cancelled, long running `fit` implementations can call this
+        periodically. It is also called before a model is saved so that cancelled trainings never publish a model.
+        """
+        cancelled = getattr(_training_context, "cancelled", None)
+        if cancelled is not None and cancelled.is_set():
+            raise TrainingCancelledError()
+
+    def _get_model_key(self, user_id: str) -> Tuple[str, str, str]:
+        return self.model_store.location, self.name, user_id
 
     @property
     def name(self) -> str:
         return type(self).__name__
+
+
+def migrate_model_file(model_path: Path, force: bool = False) -> bool:
+    """Rewrites a model file in the format written by `Classifier._save_model` if it cannot be memory mapped.
+
+    This is the case for compressed files and for files written by old versions of joblib, which stored arrays in
+    separate `.npy` files next to the model. The file is replaced atomically, but the migration should not run while
+    the server is training, as a model saved in between could be overwritten by the migrated older one.
+
+    Args:
+        model_path: The model file, e.g. `model_<user>.joblib`
+        force: Rewrite the file even if it looks like it is already in the current format, e.g. for files written by
+            joblib versions before 1.2 whose arrays are not aligned for memory mapping
+
+    Returns:
+        Whether the file has been rewritten
+    """
+    model_path = Path(model_path)
+    array_files = list(model_path.parent.glob(glob.escape(model_path.name) + "_*.npy"))
+    if not force and not array_files and _is_uncompressed(model_path):
+        return False
+
+    model = joblib.load(model_path)
+    tmp_model_path = model_path.with_suffix(".joblib.migrating")
+    _write_model(model, tmp_model_path)
+    os.replace(tmp_model_path, model_path)
+
+    for array_file in array_files:
+        array_file.unlink()
+
+    logger.info("Migrated model [%s]", model_path)
+    return True
+
+
+def _write_model(model: Any, model_path: Path):
+    # Uncompressed, so that joblib can memory map the arrays, which it stores aligned within the file
+    joblib.dump(model, model_path, compress=0)
+
+
+def _is_uncompressed(model_path: Path) -> bool:
+    with open(model_path, "rb") as f:
+        # Uncompressed joblib files are plain pickles, which start with the PROTO opcode
+        return f.read(1) == b"\x80"
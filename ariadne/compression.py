@@ -0,0 +1,225 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gzip
+import io
+import logging
+import zlib
+from http import HTTPStatus
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.wsgi import LimitedStream
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+_COMPRESSIBLE_TYPES = ("application/json", "application/xml", "text/")
+
+# Truncated gzip bodies raise an EOFError, other corrupt ones an OSError or a zlib.error
+_DECOMPRESSION_ERRORS: Tuple[type, ...] = (OSError, EOFError, zlib.error)
+if zstandard is not None:
+    _DECOMPRESSION_ERRORS += (zstandard.ZstdError,)
+
+
+class CompressionMiddleware:
+    """WSGI middleware that decompresses request bodies and compresses responses.
+
+    Request bodies sent with `Content-Encoding: gzip` (or `zstd` if `zstandard` is installed) are decompressed
+    while the application reads them, so that e.g. spooled training requests stay streaming. Responses are
+    compressed if the client accepts it via `Accept-Encoding`, they have a compressible content type and are at least
+    `min_size` bytes large or of unknown size.
+
+    Reading a corrupt request body fails with `400 Bad Request`, reading more than `max_request_size` decompressed
+    bytes with `413 Request Entity Too Large`, so that a small compressed request cannot exhaust the memory or disk.
+
+    Args:
+        app: The WSGI application to wrap
+        min_size (optional): Minimum size of responses to compress, `None` disables compressing responses
+        level: The compression level for gzip
+        max_request_size (optional): Maximum size of decompressed request bodies, `None` for no limit
+    """
+
+    def __init__(
+        self,
+        app: Callable,
+        min_size: Optional[int] = 1024,
+        level: int = 6,
+        max_request_size: Optional[int] = 1024 * 1024 * 1024,
+    ):
+        self._app = app
+        self._min_size = min_size
+        self._level = level
+        self._max_request_size = max_request_size
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        content_encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if not content_encoding or content_encoding == "identity":
+            return self._call_app(environ, start_response)
+
+        stream = self._decompress(environ, content_encoding)
+        if stream is None:
+            start_response(f"{HTTPStatus.UNSUPPORTED_MEDIA_TYPE.value} Unsupported Media Type", [])
+            return [f"Unsupported content encoding [{content_encoding}]".encode("utf-8")]
+
+        environ["wsgi.input"] = io.BufferedReader(_DecompressingStream(stream, self._max_request_size))
+        environ["wsgi.input_terminated"] = True
+        environ.pop("CONTENT_LENGTH", None)
+        del environ["HTTP_CONTENT_ENCODING"]
+
+        try:
+            return self._call_app(environ, start_response)
+        except (BadRequest, RequestEntityTooLarge) as e:
+            # Raised by middlewares reading the body before the application, which handles them itself
+            logger.warning("Rejected compressed request: %s", e.description)
+            return e(environ, start_response)
+
+    def _call_app(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        encoding = None
+        if self._min_size is not None:
+            encoding = _negotiate_encoding(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return self._app(environ, start_response)
+
+        response = _CompressedResponse()
+
+        def _start_response(status: str, headers: List[Tuple[str, str]], exc_info=None):
+            if self._should_compress(status, headers):
+                response.compressor = _create_compressor(encoding, self._level)
+                headers = [(k, v) for k, v in headers if k.lower() != "content-length"]
+                headers.append(("Content-Encoding", encoding))
+                headers.append(("Vary", "Accept-Encoding"))
+
+            write = start_response(status, headers, exc_info)
+            if response.compressor is None:
+                return write
+            return lambda data: write(response.compressor.compress(data))
+
+        response.app_iter = self._app(environ, _start_response)
+        return response
+
+    def _decompress(self, environ: Dict[str, Any], content_encoding: str):
+        stream = environ["wsgi.input"]
+        if not environ.get("wsgi.input_terminated"):
+            # The raw input does not necessarily end at the end of the body, but the decompressor reads until it does
+            stream = LimitedStream(stream, int(environ.get("CONTENT_LENGTH") or 0))
+
+        if content_encoding in ("gzip", "x-gzip"):
+            return gzip.GzipFile(fileobj=stream, mode="rb")
+        if content_encoding == "zstd" and zstandard is not None:
+            return zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+
+        return None
+
+    def _should_compress(self, status: str, headers: List[Tuple[str, str]]) -> bool:
+        if int(status.split(" ", 1)[0]) in (HTTPStatus.NO_CONTENT.value, HTTPStatus.NOT_MODIFIED.value):
+            return False
+
+        values = {k.lower(): v for k, v in headers}
+        if "content-encoding" in values:
+            return False
+        if not values.get("content-type", "").startswith(_COMPRESSIBLE_TYPES):
+            return False
+
+        content_length = values.get("content-length")
+        return content_length is None or int(content_length) >= self._min_size
+
+
+class _DecompressingStream(io.RawIOBase):
+    """Turns errors of the wrapped decompressing stream and too large bodies into HTTP errors."""
+
+    def __init__(self, stream, max_size: Optional[int]):
+        self._stream = stream
+        self._max_size = max_size
+        self._size = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        try:
+            data = self._stream.read(len(buffer))
+        except _DECOMPRESSION_ERRORS as e:
+            raise BadRequest(f"Corrupt compressed request body: {e}") from e
+
+        self._size += len(data)
+        if self._max_size is not None and self._size > self._max_size:
+            raise RequestEntityTooLarge(f"Decompressed request body is larger than [{self._max_size}] bytes")
+
+        buffer[: len(data)] = data
+        return len(data)
+
+
+class _CompressedResponse:
+    """Compresses the chunks of the wrapped response once `start_response` decided to compress it."""
+
+    def __init__(self):
+        self.app_iter: Iterable[bytes] = ()
+        self.compressor = None
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.app_iter:
+            if self.compressor is None:
+                yield chunk
+                continue
+
+            data = self.compressor.compress(chunk)
+            if data:
+                yield data
+
+        if self.compressor is not None:
+            yield self.compressor.flush()
+
+    def close(self):
+        close = getattr(self.app_iter, "close", None)
+        if close is not None:
+            close()
+
+
+def supported_encodings() -> List[str]:
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def _negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+
+    return None
+
+
+def _create_compressor(encoding: str, level: int):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor().compressobj()
+
+    # Window bits of 16 + 15 produce the gzip format
+    return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
@@ -32,6 +32,7 @@ import torch
 import numpy as np
 
 from ariadne.contrib.inception_util import create_prediction, SENTENCE_TYPE, TOKEN_TYPE
+from ariadne.protocol import PredictionRequest
 
 
 class AdapterSequenceTagger(Classifier):
@@ -67,21 +68,31 @@ class AdapterSequenceTagger(Classifier):
         self._tokenizer = AutoTokenizer.from_pretrained(self._model_name)
 
     def predict(self, cas: Cas, layer: str, feature: str, project_id: str, document_id: str, user_id: str):
-        for sentence in cas.select(SENTENCE_TYPE):
-            cas_tokens = list(cas.select_covered(TOKEN_TYPE, sentence))
-            tokens = [t.get_covered_text() for t in cas_tokens]
+        self.predict_batch([PredictionRequest(cas, layer, feature, project_id, document_id, user_id)])
 
-            grouped_bert_tokens = self._tokenize_bert(tokens)
-            predictions = self._predict(grouped_bert_tokens)
+    def predict_batch(self, requests: List[PredictionRequest]):
+        # Collect the sentences of all requests so that they can be tagged in a single forward pass
+        sentences = []
+        for req in requests:
+            for sentence in req.cas.select(SENTENCE_TYPE):
+                cas_tokens = list(req.cas.select_covered(TOKEN_TYPE, sentence))
+                tokens = [t.get_covered_text() for t in cas_tokens]
+                sentences.append((req, cas_tokens, tokens, self._tokenize_bert(tokens)))
 
+        if not sentences:
+            return
+
+        all_predictions = self._predict_batch([grouped_bert_tokens for _, _, _, grouped_bert_tokens in sentences])
+
+        for (req, cas_tokens, tokens, grouped_bert_tokens), predictions in zip(sentences, all_predictions):
             grouped_predictions = self._align_tokens(tokens, grouped_bert_tokens, predictions)
 
             for token, grouped_prediction in zip(cas_tokens, grouped_predictions):
                 begin = token.begin
                 end = token.end
                 label = Counter([self._label_map[pred] for pred in grouped_prediction]).most_common(1)[0][0]
-                prediction = create_prediction(cas, layer, feature, begin, end, label)
-                cas.add(prediction)
+                prediction = create_prediction(req.cas, req.layer, req.feature, begin, end, label)
+                req.cas.add(prediction)
 
     def _tokenize_bert(self, cas_tokens: List[str]) -> List[torch.Tensor]:
         grouped_bert_tokens = [torch.LongTensor([self._tokenizer.cls_token_id])]
@@ -96,15 +107,22 @@ class AdapterSequenceTagger(Classifier):
 
         return grouped_bert_tokens
 
-    def _predict(self, grouped_bert_tokens: List[torch.Tensor]) -> torch.Tensor:
-        flattened_bert_tokens = torch.cat(grouped_bert_tokens)
-        flattened_bert_tokens = torch.unsqueeze(flattened_bert_tokens, 0)
+    def _predict_batch(self, batch: List[List[torch.Tensor]]) -> List[np.ndarray]:
+        sequences = [torch.cat(grouped_bert_tokens) for grouped_bert_tokens in batch]
+        lengths = [len(sequence) for sequence in sequences]
+
+        input_ids = torch.full((len(sequences), max(lengths)), self._tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros_like(input_ids)
+        for i, sequence in enumerate(sequences):
+            input_ids[i, : lengths[i]] = sequence
+            attention_mask[i, : lengths[i]] = 1
 
-        preds = self._model(flattened_bert_tokens, adapter_names=[self._adapter_name])[0]
+        preds = self._model(input_ids, attention_mask=attention_mask, adapter_names=[self._adapter_name])[0]
         preds = preds.detach().numpy()
         preds = np.argmax(preds, axis=2)
 
-        return preds.squeeze()
+        # Strip the padding again
+        return [pred[:length] for pred, length in zip(preds, lengths)]
 
     def _align_tokens(
         self, cas_tokens: List[str], grouped_bert_tokens: List[torch.Tensor], predictions: torch.Tensor
@@ -180,18 +198,33 @@ class AdapterSentenceClassifier(Classifier):
         self._tokenizer = AutoTokenizer.from_pretrained(self._base_model_name)
 
     def predict(self, cas: Cas, layer: str, feature: str, project_id: str, document_id: str, user_id: str):
-        for i, sentence in enumerate(cas.select(SENTENCE_TYPE)):
-            token_ids = self._tokenizer.convert_tokens_to_ids(self._tokenizer.tokenize(sentence.get_covered_text()))
-            input_tensor = torch.tensor([token_ids])
+        self.predict_batch([PredictionRequest(cas, layer, feature, project_id, document_id, user_id)])
+
+    def predict_batch(self, requests: List[PredictionRequest]):
+        sentences = [(req, sentence) for req in requests for sentence in req.cas.select(SENTENCE_TYPE)]
+        if not sentences:
+            return
+
+        encoded = self._tokenizer(
+            [sentence.get_covered_text() for _, sentence in sentences],
+            add_special_tokens=False,
+            padding=True,
+            return_tensors="pt",
+        )
 
-            # predict output tensor
-            outputs = self._model(input_tensor, adapter_names=[self._adapter_internal_name])
+        # predict output tensor for all sentences at once
+        outputs = self._model(
+            encoded["input_ids"],
+            attention_mask=encoded["attention_mask"],
+            adapter_names=[self._adapter_internal_name],
+        )
 
-            # retrieve the predicted class label
-            label_id = torch.argmax(outputs[0]).item()
+        # retrieve the predicted class labels
+        label_ids = torch.argmax(outputs[0], dim=-1).tolist()
+        for (req, sentence), label_id in zip(sentences, label_ids):
             label = self._label_map[label_id]
-            prediction = create_prediction(cas, layer, feature, sentence.begin, sentence.end, label)
-            cas.add(prediction)
+            prediction = create_prediction(req.cas, req.layer, req.feature, sentence.begin, sentence.end, label)
+            req.cas.add(prediction)
 
     def _build_model(self):
         model = AutoModelWithHeads.from_pretrained(self._base_model_name)
@@ -14,6 +14,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from pathlib import Path
+from typing import List
 
 from cassis import Cas
 
@@ -22,6 +23,7 @@ from flair.data import Sentence, Token
 
 from ariadne.classifier import Classifier
 from ariadne.contrib.inception_util import create_prediction, SENTENCE_TYPE, TOKEN_TYPE
+from ariadne.protocol import PredictionRequest
 
 
 def fix_whitespaces(cas_tokens):
@@ -43,38 +45,34 @@ class FlairNERClassifier(Classifier):
         self._split_sentences = split_sentences
 
     def predict(self, cas: Cas, layer: str, feature: str, project_id: str, document_id: str, user_id: str):
-        # Extract the sentences from the CAS
-        if self._split_sentences:
-            sentences = []
-            cas_sents = cas.select(SENTENCE_TYPE)
-            for cas_sent in cas_sents:
-                # transform cas tokens to flair tokens with correct spacing
-                cas_tokens = cas.select_covered(TOKEN_TYPE, cas_sent)
-                tokens = fix_whitespaces(cas_tokens)
-                sentences.append(Sentence(tokens))
+        self.predict_batch([PredictionRequest(cas, layer, feature, project_id, document_id, user_id)])
 
-            # Find the named entities
-            self._model.predict(sentences)
+    def predict_batch(self, requests: List[PredictionRequest]):
+        # Extract the sentences from all CASes so that the model can tag them in a single pass
+        all_sentences = [self._extract_sentences(req.cas) for req in requests]
 
+        # Find the named entities
+        self._model.predict([sentence for sentences in all_sentences for sentence in sentences])
+
+        for req, sentences in zip(requests, all_sentences):
             for sentence in sentences:
-                # For every entity returned by spacy, create an annotation in the CAS
+                # For every entity returned by flair, create an annotation in the CAS
                 for named_entity in sentence.get_spans():
                     begin = named_entity.start_position
                     end = named_entity.end_position
                     label = named_entity.tag
-                    prediction = create_prediction(cas, layer, feature, begin, end, label)
-                    cas.add(prediction)
+                    prediction = create_prediction(req.cas, req.layer, req.feature, begin, end, label)
+                    req.cas.add(prediction)
 
-        else:
-            cas_tokens = cas.select(TOKEN_TYPE)
-            text = fix_whitespaces(cas_tokens)
-            sent = Sentence(text)
+    def _extract_sentences(self, cas: Cas) -> List[Sentence]:
+        if not self._split_sentences:
+            return [Sentence(fix_whitespaces(cas.select(TOKEN_TYPE)))]
 
-            self._model.predict(sent)
+        sentences = []
+        for cas_sent in cas.select(SENTENCE_TYPE):
+            # transform cas tokens to flair tokens with correct spacing
+            cas_tokens = cas.select_covered(TOKEN_TYPE, cas_sent)
+            tokens = fix_whitespaces(cas_tokens)
+            sentences.append(Sentence(tokens))
 
-            for named_entity in sent.get_spans():
-                begin = named_entity.start_position
-                end = named_entity.end_position
-                label = named_entity.tag
-                prediction = create_prediction(cas, layer, feature, begin, end, label)
-                cas.add(prediction)
+        return sentences
@@ -14,7 +14,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import logging
-from typing import List
+from typing import List, Tuple
 
 from cassis import Cas
 from diskcache import Cache
@@ -26,9 +26,10 @@ from lightgbm import LGBMClassifier
 import numpy as np
 
 from ariadne import cache_directory
+from ariadne.cache import resource_cache
 from ariadne.classifier import Classifier
 from ariadne.contrib.inception_util import create_prediction, SENTENCE_TYPE
-from ariadne.protocol import TrainingDocument
+from ariadne.protocol import TrainingDocument, PredictionRequest
 
 
 logger = logging.getLogger(__name__)
@@ -41,56 +42,62 @@ class CachedSentenceTransformer:
         self._cache = Cache(cache_directory / model_name)
 
     def featurize(self, sentences: List[str]) -> np.ndarray:
-        result = []
+        result = {}
         for sentence in sentences:
-            if sentence in self._cache:
-                vec = self._cache[sentence]
-            else:
-                vec = self._model.encode(sentence).squeeze()
-                self._cache[sentence] = vec
+            if sentence not in result and sentence in self._cache:
+                result[sentence] = self._cache[sentence]
 
-            result.append(vec)
+        # Encode all sentences that are not cached yet in a single batch
+        missing = list({sentence: None for sentence in sentences if sentence not in result})
+        if missing:
+            for sentence, vec in zip(missing, self._model.encode(missing)):
+                self._cache[sentence] = vec
+                result[sentence] = vec
 
-        return np.array(result)
+        return np.array([result[sentence] for sentence in sentences])
 
     def get_dimension(self) -> int:
         return self._model.get_sentence_embedding_dimension()
 
 
 class SbertSentenceClassifier(Classifier):
-    def fit(self, documents: List[TrainingDocument], layer: str, feature: str, project_id, user_id: str):
-        logger.debug("Start training for user [%s]", user_id)
+    supports_streaming_training = True
+    supports_sample_store = True
 
-        featurizer = self._get_featurizer()
+    def extract_samples(self, document: TrainingDocument, layer: str, feature: str) -> List[Tuple[str, str]]:
+        cas = document.cas
+        samples = []
+
+        for sentence in cas.select(SENTENCE_TYPE):
+            # Get the first annotation that covers the sentence
+            annotations = cas.select_covered(layer, sentence)
 
-        sentences = []
-        targets = []
+            if len(annotations):
+                annotation = annotations[0]
+            else:
+                continue
 
-        for document in documents:
-            cas = document.cas
+            assert sentence.begin == annotation.begin and sentence.end == annotation.end, (
+                "Annotation should cover sentence fully!"
+            )
 
-            for sentence in cas.select(SENTENCE_TYPE):
-                # Get the first annotation that covers the sentence
-                annotations = cas.select_covered(layer, sentence)
+            label = getattr(annotation, feature)
 
-                if len(annotations):
-                    annotation = annotations[0]
-                else:
-                    continue
+            if label is None:
+                continue
 
-                assert sentence.begin == annotation.begin and sentence.end == annotation.end, (
-                    "Annotation should cover sentence fully!"
-                )
+            samples.append((sentence.get_covered_text(), label))
 
-                label = getattr(annotation, feature)
+        return samples
 
-                if label is None:
-                    continue
+    def fit_samples(self, samples: List[Tuple[str, str]], layer: str, feature: str, project_id: str, user_id: str):
+        logger.debug("Start training for user [%s]", user_id)
 
-                sentences.append(sentence.get_covered_text())
-                targets.append(label)
+        featurizer = self._get_featurizer()
 
-        featurized_sentences = featurizer.featurize(sentences)
+        # The embeddings of sentences seen in earlier trainings are read from the cache of the featurizer
+        featurized_sentences = featurizer.featurize([sentence for sentence, _ in samples])
+        targets = [label for _, label in samples]
 
         logger.debug("Training started for user [%s]", user_id)
         model = LGBMClassifier().fit(featurized_sentences, targets)
@@ -99,20 +106,41 @@ class SbertSentenceClassifier(Classifier):
         self._save_model(user_id, model)
 
     def predict(self, cas: Cas, layer: str, feature: str, project_id: str, document_id: str, user_id: str):
-        model = self._load_model(user_id)
+        self.predict_batch([PredictionRequest(cas, layer, feature, project_id, document_id, user_id)])
 
-        if model is None:
+    def predict_batch(self, requests: List[PredictionRequest]):
+        models = {}
+        for req in requests:
+            if req.user_id not in models:
+                models[req.user_id] = self._load_model(req.user_id)
+
+        requests = [req for req in requests if models[req.user_id] is not None]
+        if not requests:
             logger.debug("No trained model ready yet!")
             return
 
+        # Featurize the sentences of all documents at once, the per-user models are cheap in comparison
+        all_sentences = [req.cas.select(SENTENCE_TYPE) for req in requests]
         featurizer = self._get_featurizer()
-        sentences = cas.select(SENTENCE_TYPE)
-        featurized_sentences = featurizer.featurize([s.get_covered_text() for s in sentences])
-        predictions = model.predict(featurized_sentences)
-
-        for sentence, featurized_sentence, label in zip(sentences, featurized_sentences, predictions):
-            prediction = create_prediction(cas, layer, feature, sentence.begin, sentence.end, label)
-            cas.add(prediction)
-
-    def _get_featurizer(self):
-        return CachedSentenceTransformer("distilbert-base-nli-mean-tokens")
+        featurized_sentences = featurizer.featurize([s.get_covered_text() for ss in all_sentences for s in ss])
+
+        offset = 0
+        for req, sentences in zip(requests, all_sentences):
+            if not sentences:
+                continue
+
+            cas = req.cas
+            features = featurized_sentences[offset : offset + len(sentences)]
+            offset += len(sentences)
+            predictions = models[req.user_id].predict(features)
+
+            for sentence, label in zip(sentences, predictions):
+                prediction = create_prediction(cas, req.layer, req.feature, sentence.begin, sentence.end, label)
+                cas.add(prediction)
+
+    def _get_featurizer(self) -> CachedSentenceTransformer:
+        # Loading the transformer is expensive, it is shared by all instances and loaded only once
+        model_name = "distilbert-base-nli-mean-tokens"
+        return resource_cache.get(
+            (CachedSentenceTransformer, model_name), lambda: CachedSentenceTransformer(model_name)
+        )
@@ -14,7 +14,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import logging
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 import sklearn_crfsuite
 from cassis import Cas
@@ -34,34 +34,39 @@ logger = logging.getLogger(__name__)
 
 
 class SklearnSentenceClassifier(Classifier):
-    def fit(self, documents: List[TrainingDocument], layer: str, feature: str, project_id, user_id: str):
-        logger.debug("Start training for user [%s]", user_id)
-        sentences = []
-        targets = []
+    supports_streaming_training = True
+    supports_sample_store = True
 
-        for document in documents:
-            cas = document.cas
+    def extract_samples(self, document: TrainingDocument, layer: str, feature: str) -> List[Tuple[str, str]]:
+        cas = document.cas
+        samples = []
 
-            for sentence in cas.select(SENTENCE_TYPE):
-                # Get the first annotation that covers the sentence
-                annotations = cas.select_covered(layer, sentence)
+        for sentence in cas.select(SENTENCE_TYPE):
+            # Get the first annotation that covers the sentence
+            annotations = cas.select_covered(layer, sentence)
 
-                if len(annotations):
-                    annotation = annotations[0]
-                else:
-                    continue
+            if len(annotations):
+                annotation = annotations[0]
+            else:
+                continue
 
-                assert sentence.begin == annotation.begin and sentence.end == annotation.end, (
-                    "Annotation should cover sentence fully!"
-                )
+            assert sentence.begin == annotation.begin and sentence.end == annotation.end, (
+                "Annotation should cover sentence fully!"
+            )
 
-                label = getattr(annotation, feature)
+            label = getattr(annotation, feature)
 
-                if label is None:
-                    continue
+            if label is None:
+                continue
 
-                sentences.append(sentence.get_covered_text())
-                targets.append(label)
+            samples.append((sentence.get_covered_text(), label))
+
+        return samples
+
+    def fit_samples(self, samples: List[Tuple[str, str]], layer: str, feature: str, project_id: str, user_id: str):
+        logger.debug("Start training for user [%s]", user_id)
+        sentences = [sentence for sentence, _ in samples]
+        targets = [label for _, label in samples]
 
         model = Pipeline([("vect", CountVectorizer()), ("tfidf", TfidfTransformer()), ("clf", MultinomialNB())])
         model.fit(sentences, targets)
@@ -84,47 +89,51 @@ class SklearnSentenceClassifier(Classifier):
 
 # https://sklearn-crfsuite.readthedocs.io/en/latest/tutorial.html#let-s-use-conll-2002-data-to-build-a-ner-system
 class SklearnMentionDetector(Classifier):
-    def fit(self, documents: List[TrainingDocument], layer: str, feature: str, project_id, user_id: str):
-        logger.debug("Start training for user [%s]", user_id)
-        sentences = []
-        targets = []
+    supports_streaming_training = True
+    supports_sample_store = True
 
-        for document in documents:
-            cas = document.cas
+    def extract_samples(self, document: TrainingDocument, layer: str, feature: str) -> List[Tuple[list, List[str]]]:
+        cas = document.cas
+        samples = []
 
-            for sentence in cas.select(SENTENCE_TYPE):
-                tags = []
-                words = []
+        for sentence in cas.select(SENTENCE_TYPE):
+            tags = []
+            words = []
 
-                tokens = cas.select_covered(TOKEN_TYPE, sentence)
-                annotations = list(cas.select_covered(layer, sentence))
+            tokens = cas.select_covered(TOKEN_TYPE, sentence)
+            annotations = list(cas.select_covered(layer, sentence))
 
-                # Convert to BIO
-                prev_tag = "O"
-                for token in tokens:
-                    is_inside = False
-                    for annotation in annotations:
-                        if token.begin >= annotation.begin and annotation.end:
-                            is_inside = True
-                            break
+            # Convert to BIO
+            prev_tag = "O"
+            for token in tokens:
+                is_inside = False
+                for annotation in annotations:
+                    if token.begin >= annotation.begin and annotation.end:
+                        is_inside = True
+                        break
+
+                if not is_inside:
+                    tag = "O"
+                elif prev_tag == "B-MENTION":
+                    tag = "I-MENTION"
+                else:
+                    tag = "B-MENTION"
 
-                    if not is_inside:
-                        tag = "O"
-                    elif prev_tag == "B-MENTION":
-                        tag = "I-MENTION"
-                    else:
-                        tag = "B-MENTION"
+                prev_tag = tag
 
-                    prev_tag = tag
+                tags.append(tag)
+                words.append(token.get_covered_text())
 
-                    tags.append(tag)
-                    words.append(token.get_covered_text())
+            samples.append((self._sent2features(words), tags))
 
-                sentences.append(words)
-                targets.append(tags)
+        return samples
 
-        X_train = [self._sent2features(s) for s in sentences]
-        y_train = targets
+    def fit_samples(
+        self, samples: List[Tuple[list, List[str]]], layer: str, feature: str, project_id: str, user_id: str
+    ):
+        logger.debug("Start training for user [%s]", user_id)
+        X_train = [features for features, _ in samples]
+        y_train = [tags for _, tags in samples]
 
         crf = sklearn_crfsuite.CRF(algorithm="lbfgs", c1=0.1, c2=0.1)
         crf.fit(X_train, y_train)
@@ -16,7 +16,7 @@
 import logging
 from collections import defaultdict
 from itertools import chain
-from typing import List
+from typing import List, Tuple
 
 from cassis import Cas
 
@@ -35,7 +35,23 @@ logger = logging.getLogger(__name__)
 
 
 class LevenshteinStringMatcher(Classifier):
-    def fit(self, documents: List[TrainingDocument], layer: str, feature: str, project_id, user_id: str):
+    supports_streaming_training = True
+    supports_sample_store = True
+
+    def extract_samples(self, document: TrainingDocument, layer: str, feature: str) -> List[Tuple[str, str]]:
+        samples = []
+        for annotation in document.cas.select(layer):
+            mention = annotation.get_covered_text().lower()
+            label = getattr(annotation, feature)
+
+            if not label:
+                continue
+
+            samples.append((mention, label))
+
+        return samples
+
+    def fit_samples(self, samples: List[Tuple[str, str]], layer: str, feature: str, project_id: str, user_id: str):
         logger.debug("Start training for user [%s]", user_id)
 
         mentions = []
@@ -43,16 +59,8 @@ class LevenshteinStringMatcher(Classifier):
 
         counts = defaultdict(lambda: defaultdict(int))
 
-        for document in documents:
-            cas = document.cas
-            for annotation in cas.select(layer):
-                mention = annotation.get_covered_text().lower()
-                label = getattr(annotation, feature)
-
-                if not label:
-                    continue
-
-                counts[mention][label] += 1
+        for mention, label in samples:
+            counts[mention][label] += 1
 
         # Just use the entity that was most often linked with this mention
         for mention, candidates in counts.items():
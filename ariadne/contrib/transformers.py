@@ -13,10 +13,12 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from typing import List
 
 from transformers import pipeline, AutoTokenizer, AutoModelForTokenClassification
 from ariadne.classifier import Classifier
 from ariadne.contrib.inception_util import create_prediction
+from ariadne.protocol import PredictionRequest
 from cassis import Cas
 
 
@@ -29,11 +31,15 @@ class TransformerNerClassifier(Classifier):
         self.ner_pipeline = pipeline("ner", model=self.model, tokenizer=self.tokenizer, aggregation_strategy="first")
 
     def predict(self, cas: Cas, layer: str, feature: str, project_id: str, document_id: str, user_id: str):
-        document_text = cas.sofa_string
-        predictions = self.ner_pipeline(document_text)
-        for prediction in predictions:
-            start_char = prediction["start"]
-            end_char = prediction["end"]
-            label = prediction["entity_group"]
-            cas_prediction = create_prediction(cas, layer, feature, start_char, end_char, label)
-            cas.add(cas_prediction)
+        self.predict_batch([PredictionRequest(cas, layer, feature, project_id, document_id, user_id)])
+
+    def predict_batch(self, requests: List[PredictionRequest]):
+        document_texts = [req.cas.sofa_string for req in requests]
+        all_predictions = self.ner_pipeline(document_texts, batch_size=len(document_texts))
+        for req, predictions in zip(requests, all_predictions):
+            for prediction in predictions:
+                start_char = prediction["start"]
+                end_char = prediction["end"]
+                label = prediction["entity_group"]
+                cas_prediction = create_prediction(req.cas, req.layer, req.feature, start_char, end_char, label)
+                req.cas.add(cas_prediction)
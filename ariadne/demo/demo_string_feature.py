@@ -13,7 +13,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import List
+from typing import List, Tuple
 
 from cassis import Cas
 
@@ -28,24 +28,32 @@ logger = logging.getLogger(__name__)
 
 
 class DemoStringFeatureRecommender(Classifier):
-    def fit(self, documents: List[TrainingDocument], layer: str, feature: str, project_id, user_id: str):
+    supports_sample_store = True
+
+    def extract_samples(self, document: TrainingDocument, layer: str, feature: str) -> List[Tuple[str, str]]:
+        # Only documents that changed since the last training are passed here, the samples of the others are reused
+        samples = []
+        for annotation in document.cas.select(layer):
+            mention = annotation.get_covered_text().lower()
+            label = annotation.get(feature)
+
+            if not mention or not label:
+                continue
+
+            samples.append((mention, label))
+
+        return samples
+
+    def fit_samples(self, samples: List[Tuple[str, str]], layer: str, feature: str, project_id: str, user_id: str):
         logger.info(
-            f"Training triggered for [{feature}] on [{layer}] in [{len(documents)}] documents from project [{project_id}] for user [{user_id}]"
+            f"Training triggered for [{feature}] on [{layer}] with [{len(samples)}] samples from project [{project_id}] for user [{user_id}]"
         )
 
         # Count how often each mention has been annotated with a given label
         counts = defaultdict(lambda: defaultdict(int))
 
-        for document in documents:
-            cas = document.cas
-            for annotation in cas.select(layer):
-                mention = annotation.get_covered_text().lower()
-                label = annotation.get(feature)
-
-                if not mention or not label:
-                    continue
-
-                counts[mention][label] += 1
+        for mention, label in samples:
+            counts[mention][label] += 1
 
         # Create a new dictionary that contains only the label with the highest count for each mention
         best_labels = {
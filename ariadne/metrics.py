@@ -0,0 +1,239 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TRAINING_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+Labels = Tuple[str, ...]
+Collector = Callable[[], Dict[Labels, float]]
+
+_local = threading.local()
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], collect: Optional[Collector]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._collect = collect
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def samples(self) -> Iterator[Tuple[str, Labels, Labels, float]]:
+        """Yields the name suffix, label names, label values and value of every sample of this metric."""
+        if self._collect is not None:
+            values = self._collect()
+        else:
+            with self._lock:
+                values = dict(self._values)
+
+        for labels, value in sorted(values.items()):
+            yield "", self.labelnames, labels, value
+
+    def _check_labels(self, labels: Labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"Metric [{self.name}] expects labels {self.labelnames} but got {labels}")
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._check_labels(labels)
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, *labels: str):
+        self._check_labels(labels)
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        super().__init__(name, documentation, labelnames, None)
+        self._buckets = tuple(sorted(buckets))
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, *labels: str):
+        self._check_labels(labels)
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self._buckets) + 1)
+                self._sums[labels] = 0.0
+            counts[index] += 1
+            self._sums[labels] += value
+
+    def samples(self) -> Iterator[Tuple[str, Labels, Labels, float]]:
+        with self._lock:
+            counts = {labels: list(values) for labels, values in self._counts.items()}
+            sums = dict(self._sums)
+
+        bucket_labelnames = self.labelnames + ("le",)
+        for labels in sorted(counts):
+            cumulative = 0
+            for bound, count in zip(self._buckets + (math.inf,), counts[labels]):
+                cumulative += count
+                yield "_bucket", bucket_labelnames, labels + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, labels, sums[labels]
+            yield "_count", self.labelnames, labels, cumulative
+
+
+class MetricsRegistry:
+    """Collection of metrics that can be rendered in the Prometheus text exposition format.
+
+    Metrics are kept per process, when running several worker processes each of them reports its own values.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), collect: Optional[Collector] = None
+    ) -> Counter:
+        """Creates a counter.
+
+        Args:
+            name: The name of the metric, by convention ending in `_total`
+            documentation: The help text of the metric
+            labelnames: The names of the labels whose values are passed to `Counter.inc`
+            collect (optional): Called on every render to get the values by label values instead of tracking them
+        """
+        return self._register(Counter(name, documentation, labelnames, collect))
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), collect: Optional[Collector] = None
+    ) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation, False)}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for suffix, labelnames, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labelnames, labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: _Metric):
+        if any(m.name == metric.name for m in self._metrics):
+            raise ValueError(f"Metric [{metric.name}] is already registered")
+
+        self._metrics.append(metric)
+        return metric
+
+
+class PhaseTimer:
+    """Measures how long a request spends in each phase of its processing.
+
+    Phases can be nested, the time spent in a nested phase is not counted for the enclosing phase.
+    """
+
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+        self._stack: List[List] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        if self._stack:
+            self._add(*self._stack[-1], start)
+        self._stack.append([name, start])
+
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._add(*self._stack.pop(), end)
+            if self._stack:
+                self._stack[-1][1] = end
+
+    def _add(self, name: str, start: float, end: float):
+        self.durations[name] = self.durations.get(name, 0.0) + end - start
+
+
+@contextmanager
+def record_phases() -> Iterator[PhaseTimer]:
+    """Records the phases entered via `phase` on this thread until the context is left."""
+    previous = getattr(_local, "timer", None)
+    _local.timer = timer = PhaseTimer()
+    try:
+        yield timer
+    finally:
+        _local.timer = previous
+
+
+@contextmanager
+def phase(name: str):
+    """Attributes the time spent in this context to the given phase, if phases are recorded on this thread."""
+    timer: Optional[PhaseTimer] = getattr(_local, "timer", None)
+    if timer is None:
+        yield
+        return
+
+    with timer.phase(name):
+        yield
+
+
+def _format_labels(labelnames: Labels, labels: Labels) -> str:
+    if not labelnames:
+        return ""
+
+    pairs = ",".join(f'{name}="{_escape(value, True)}"' for name, value in zip(labelnames, labels))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    # The exposition format spells these like Go does, Python would render them as "nan" and "inf"
+    if math.isnan(value):
+        return "NaN"
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str, quote: bool) -> str:
+    value = str(value).replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quote else value
@@ -0,0 +1,166 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+import itertools
+import logging
+import multiprocessing
+import pickle
+import threading
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from cassis import TypeSystem
+from cassis.cas import View
+from cassis.typesystem import FeatureStructure, Type
+
+from ariadne.protocol import TrainingDocument, _parse_training_document, load_typesystem_cached
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[Executor] = None
+_executor_processes = 0
+_executor_lock = threading.Lock()
+
+
+def parse_documents_parallel(
+    typesystem_xml: str,
+    typesystem: TypeSystem,
+    documents_json: Iterable[Dict[str, str]],
+    processes: int,
+    chunk_size: int = 4,
+) -> Iterator[TrainingDocument]:
+    """Parses training documents in a pool of worker processes and yields them in their original order.
+
+    The documents are sent to the workers in chunks of `chunk_size`, at most two chunks per process are in flight
+    at once so that iterating lazily over e.g. a spooled request stays memory bounded. Each worker parses the type
+    system once and keeps it cached. Parsed documents are sent back with their types replaced by references to
+    `typesystem`, so unpickling them is much cheaper than parsing the XMI again.
+
+    Args:
+        typesystem_xml: The type system of the documents
+        typesystem: The parsed type system, it is shared by all returned documents
+        documents_json: The documents as sent by INCEpTION, i.e. with `xmi`, `documentId` and `userId`
+        processes: Number of worker processes
+        chunk_size: Number of documents that are sent to a worker at once
+    """
+    executor = _get_executor(processes)
+    in_flight = deque()
+
+    documents = iter(documents_json)
+    while True:
+        chunk = list(itertools.islice(documents, chunk_size))
+        if chunk:
+            in_flight.append(executor.submit(_parse_chunk, typesystem_xml, chunk))
+
+        if in_flight and (not chunk or len(in_flight) >= 2 * processes):
+            yield from _unpickle_chunk(in_flight.popleft().result(), typesystem)
+        elif not chunk:
+            return
+
+
+def shutdown_executor():
+    """Stops the worker processes, they are started again on the next parallel parse."""
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _get_executor(processes: int) -> Executor:
+    global _executor, _executor_processes
+
+    with _executor_lock:
+        if _executor is None or _executor_processes != processes:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+
+            # Forking a server with running threads is unsafe, a fork server starts from a clean process instead
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _executor = ProcessPoolExecutor(max_workers=processes, mp_context=context)
+            _executor_processes = processes
+
+        return _executor
+
+
+def _parse_chunk(typesystem_xml: str, chunk: List[Dict[str, str]]) -> List[Tuple[bool, Any]]:
+    typesystem = load_typesystem_cached(typesystem_xml)
+    result = []
+    for document in chunk:
+        parsed = _parse_training_document(document, typesystem)
+        try:
+            buffer = io.BytesIO()
+            _CasPickler(buffer).dump(parsed)
+            result.append((True, buffer.getvalue()))
+        except RecursionError:
+            # Deeply nested feature structures, e.g. long linked lists, let the caller parse this one itself
+            result.append((False, document))
+
+    return result
+
+
+def _unpickle_chunk(chunk: List[Tuple[bool, Any]], typesystem: TypeSystem) -> Iterator[TrainingDocument]:
+    for is_pickled, data in chunk:
+        if is_pickled:
+            yield _CasUnpickler(io.BytesIO(data), typesystem).load()
+        else:
+            yield _parse_training_document(data, typesystem)
+
+
+def _new_feature_structure(t: Type) -> FeatureStructure:
+    if t._constructor is None:
+        t._constructor = t._constructor_fn()
+    return object.__new__(t._constructor)
+
+
+def _new_view(sofa: FeatureStructure, indices: Dict[str, List[FeatureStructure]]) -> View:
+    view = View(sofa)
+    for type_name, fs in indices.items():
+        view.type_index[type_name].update(fs)
+    return view
+
+
+class _CasPickler(pickle.Pickler):
+    """Pickles CAS objects, whose feature structure classes are generated at runtime and therefore cannot be
+    pickled by reference. Types are pickled by name and resolved against the receiver's type system."""
+
+    def persistent_id(self, obj: Any) -> Optional[Tuple[str, ...]]:
+        if isinstance(obj, TypeSystem):
+            return ("typesystem",)
+        if isinstance(obj, Type):
+            return ("type", obj.name)
+        return None
+
+    def reducer_override(self, obj: Any) -> Any:
+        if isinstance(obj, View):
+            return _new_view, (obj.sofa, {name: list(fs) for name, fs in obj.type_index.items()})
+        if isinstance(obj, FeatureStructure) and type(obj) is obj.type._constructor:
+            return _new_feature_structure, (obj.type,), obj.__getstate__()
+        return NotImplemented
+
+
+class _CasUnpickler(pickle.Unpickler):
+    def __init__(self, file: io.BytesIO, typesystem: TypeSystem):
+        super().__init__(file)
+        self._typesystem = typesystem
+
+    def persistent_load(self, pid: Tuple[str, ...]) -> Any:
+        if pid[0] == "typesystem":
+            return self._typesystem
+        return self._typesystem.get_type(pid[1])
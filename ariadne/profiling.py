@@ -0,0 +1,145 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import cProfile
+import io
+import json
+import logging
+import pstats
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Ariadne-Profile"
+PROFILE_ID_HEADER = "X-Ariadne-Profile-Id"
+REQUEST_ID_HEADER = "X-Request-Id"
+
+_PROFILE_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+SORT_KEYS = sorted(key.value for key in pstats.SortKey)
+
+
+class ProfileStore:
+    """Profiles single requests with `cProfile` and keeps the results in a directory.
+
+    Every profile is stored as `<id>.prof`, which can be loaded with `pstats` or e.g. snakeviz, next to a
+    `<id>.json` with its metadata. Only the newest `max_profiles` profiles are kept.
+
+    Args:
+        directory: The directory in which the profiles are stored
+        max_profiles: Maximum number of profiles to keep
+    """
+
+    def __init__(self, directory: Path, max_profiles: int = 100):
+        self._directory = Path(directory)
+        self._max_profiles = max_profiles
+        # Only one profiler can be active per process on newer Python versions, so profiles do not overlap
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, profile_id: str, classifier_name: str, endpoint: str) -> Iterator[bool]:
+        """Profiles the code run on this thread in this context and stores the profile under the given id.
+
+        Yields whether the code is actually profiled, which is not the case if another profile is being recorded.
+        """
+        if not self._lock.acquire(blocking=False):
+            logger.warning("Not profiling [%s] as another profile is being recorded", profile_id)
+            yield False
+            return
+
+        try:
+            profiler = cProfile.Profile()
+            start = time.time()
+            profiler.enable()
+            try:
+                yield True
+            finally:
+                profiler.disable()
+                self._store(profiler, profile_id, classifier_name, endpoint, start, time.time())
+        finally:
+            self._lock.release()
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Returns the metadata of all stored profiles, newest first."""
+        profiles = []
+        for path in self._directory.glob("*.json"):
+            try:
+                profiles.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                # Removed or still being written
+                continue
+
+        return sorted(profiles, key=lambda p: p["started"], reverse=True)
+
+    def get_path(self, profile_id: str) -> Optional[Path]:
+        if not is_valid_profile_id(profile_id):
+            return None
+
+        path = self._directory / f"{profile_id}.prof"
+        return path if path.is_file() else None
+
+    def render_text(self, profile_id: str, sort: str = "cumulative", limit: int = 50) -> Optional[str]:
+        """Renders the most expensive functions of a profile, `sort` is one of `SORT_KEYS`."""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key [{sort}], expected one of {SORT_KEYS}")
+
+        path = self.get_path(profile_id)
+        if path is None:
+            return None
+
+        out = io.StringIO()
+        pstats.Stats(str(path), stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def _store(self, profiler: cProfile.Profile, profile_id: str, classifier_name: str, endpoint: str, start, end):
+        self._directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(self._directory / f"{profile_id}.prof")
+
+        metadata = {
+            "id": profile_id,
+            "classifier": classifier_name,
+            "endpoint": endpoint,
+            "started": start,
+            "durationSeconds": end - start,
+        }
+        (self._directory / f"{profile_id}.json").write_text(json.dumps(metadata), encoding="utf-8")
+        logger.info("Stored profile [%s] of [%s] for [%s]", profile_id, endpoint, classifier_name)
+
+        self._prune()
+
+    def _prune(self):
+        profiles = sorted(self._directory.glob("*.prof"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for path in profiles[self._max_profiles :]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".json").unlink(missing_ok=True)
+
+
+def is_valid_profile_id(profile_id: str) -> bool:
+    return _PROFILE_ID_PATTERN.fullmatch(profile_id) is not None
+
+
+def new_profile_id(requested: Optional[str] = None) -> str:
+    """Returns a unique id, prefixed with the requested one, e.g. the request id of the caller, if it can be used as
+    a file name. Clients reusing their ids therefore never overwrite earlier profiles."""
+    unique = uuid.uuid4().hex
+    if requested and is_valid_profile_id(requested):
+        return f"{requested[:48]}-{unique[:12]}"
+    return unique
@@ -13,17 +13,51 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import Dict, Any, List
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, List, Iterator, Optional, BinaryIO, TextIO
 
 import attr
 import cassis
 
-from cassis import load_cas_from_xmi, load_typesystem
+from cassis import load_cas_from_json, load_cas_from_xmi, load_typesystem, TypeSystem
+from cassis.typesystem import TypeSystemMode
+
+from ariadne import metrics
+from ariadne.cache import LruCache
 
 # Types
 
 JsonDict = Dict[str, Any]
 
+_SPOOL_CHUNK_SIZE = 1 << 20
+_JSON_WHITESPACE = " \t\r\n"
+_JSON_DELIMITERS = _JSON_WHITESPACE + ",:]}"
+_JSON_CAS_START = re.compile(r"\s*\{")
+
+# Formats in which documents can be sent, the `xmi` field of a document holds the CAS in either of them
+CAS_FORMAT_XMI = "xmi"
+CAS_FORMAT_JSON = "json"
+CAS_FORMATS = (CAS_FORMAT_XMI, CAS_FORMAT_JSON)
+
+
+class InvalidRequestError(ValueError):
+    """Raised when a request sent by a client is malformed, the server answers it with `400 Bad Request`."""
+
+
+# Caches
+
+# Parsed type systems keyed by the hash of their XML, for a project these stay the same across requests
+typesystem_cache = LruCache(max_entries=32)
+
 # Data classes
 
 
@@ -35,32 +69,136 @@ class PredictionRequest:
     project_id: str = attr.ib()
     document_id: str = attr.ib()
     user_id: str = attr.ib()
+    cas_format: str = attr.ib(default=CAS_FORMAT_XMI)
 
 
 @attr.s
 class TrainingRequest:
+    """Training request whose documents are only parsed when they are needed.
+
+    The documents are parsed at most once by `parse_documents` (or `documents`), afterwards the raw XMI is released
+    so that it is not held in memory next to the parsed CASes.
+    """
+
     layer: str = attr.ib()
     feature: str = attr.ib()
     project_id: str = attr.ib()
     _typesystem_xml: str = attr.ib()
     _documents_json: List[Dict[str, str]] = attr.ib()
+    _documents: Optional[List["TrainingDocument"]] = attr.ib(default=None, init=False, repr=False, eq=False)
+    _lock: threading.Lock = attr.ib(factory=threading.Lock, init=False, repr=False, eq=False)
+
+    def __attrs_post_init__(self):
+        self._user_id = self._documents_json[0]["userId"]
+        self._document_count = len(self._documents_json)
+        self._payload_size = sum(_utf8_length(document["xmi"]) for document in self._documents_json)
 
     @property
     def user_id(self) -> str:
-        return self._documents_json[0]["userId"]
+        return self._user_id
+
+    @property
+    def document_count(self) -> int:
+        return self._document_count
+
+    @property
+    def payload_size(self) -> int:
+        """The size of the XMI of all documents in bytes, known without parsing them."""
+        return self._payload_size
 
     @property
     def documents(self) -> List["TrainingDocument"]:
         # We parse this lazily as sometimes when already training, we just do not need to parse it at all.
-        typesystem = load_typesystem(self._typesystem_xml)
-        training_documents = []
-        for document in self._documents_json:
-            cas = load_cas_from_xmi(document["xmi"], typesystem)
-            document_id = document["documentId"]
-            user_id = document["userId"]
-            training_documents.append(TrainingDocument(cas, document_id, user_id))
+        return self.parse_documents()
+
+    def parse_documents(self, processes: int = 0) -> List["TrainingDocument"]:
+        """Parses all documents on the first call and returns the same documents on every following call.
+
+        Args:
+            processes: Number of worker processes for parsing, see `iter_documents`
+        """
+        with self._lock:
+            if self._documents is None:
+                self._documents = list(self.iter_documents(processes))
+                self._documents_json = []
+
+            return self._documents
+
+    def iter_documents(self, processes: int = 0) -> Iterator["TrainingDocument"]:
+        """Parses the documents one at a time, so that they do not all need to be in memory at once.
+
+        The documents are parsed again on every call unless they have already been parsed by `parse_documents`.
+
+        Args:
+            processes: If larger than zero, the documents are parsed by that many worker processes in parallel,
+                see `ariadne.parallel.parse_documents_parallel`. They are still returned in their original order.
+        """
+        if self._documents is not None:
+            yield from self._documents
+            return
+
+        typesystem = load_typesystem_cached(self._typesystem_xml)
+        if processes > 0:
+            # Imported here as the parallel parsing itself depends on this module
+            from ariadne.parallel import parse_documents_parallel
+
+            yield from parse_documents_parallel(
+                self._typesystem_xml, typesystem, self._iter_documents_json(), processes
+            )
+        else:
+            for document in self._iter_documents_json():
+                yield _parse_training_document(document, typesystem)
 
-        return training_documents
+    def iter_raw_documents(self) -> Iterator[Dict[str, str]]:
+        """Returns the documents as sent, with the serialized CAS in `xmi`, without parsing them. Nothing is returned
+        once the documents have been parsed by `parse_documents`."""
+        return self._iter_documents_json()
+
+    def parse_document(self, document: Dict[str, str]) -> "TrainingDocument":
+        """Parses a single document returned by `iter_raw_documents`."""
+        return _parse_training_document(document, load_typesystem_cached(self._typesystem_xml))
+
+    @property
+    def typesystem_xml(self) -> str:
+        return self._typesystem_xml
+
+    def _iter_documents_json(self) -> Iterator[Dict[str, str]]:
+        return iter(self._documents_json)
+
+    def close(self):
+        """Releases resources held by this request, it cannot be used afterwards."""
+        self._documents = None
+        self._documents_json = []
+
+
+@attr.s
+class SpooledTrainingRequest(TrainingRequest):
+    """Training request whose documents stay in a spool file on disk and are only decoded while iterating over them.
+
+    Use `parse_training_request_stream` to create it.
+    """
+
+    _path: Path = attr.ib(kw_only=True)
+    _user_id: str = attr.ib(kw_only=True)
+    _document_count: int = attr.ib(kw_only=True)
+    _payload_size: int = attr.ib(kw_only=True)
+
+    def __attrs_post_init__(self):
+        self._finalizer = weakref.finalize(self, _unlink_quietly, self._path)
+
+    def _iter_documents_json(self) -> Iterator[Dict[str, str]]:
+        with open(self._path, encoding="utf-8") as f:
+            reader = _JsonStreamReader(f)
+            for key in reader.iter_object():
+                if key != "documents":
+                    reader.read_value()
+                    continue
+
+                yield from reader.iter_array()
+
+    def close(self):
+        super().close()
+        self._finalizer()
 
 
 @attr.s
@@ -71,28 +209,278 @@ class TrainingDocument:
 
 
 def parse_prediction_request(json_object: JsonDict) -> PredictionRequest:
-    metadata = json_object["metadata"]
-    document = json_object["document"]
+    with missing_fields_as_invalid("Prediction"):
+        metadata = json_object["metadata"]
+        document = json_object["document"]
+
+        layer = metadata["layer"]
+        feature = metadata["feature"]
+        project_id = metadata["projectId"]
+        typesystem_xml = json_object["typeSystem"]
+        xmi = document["xmi"]
+        document_id = document["documentId"]
+        user_id = document["userId"]
+
+    with metrics.phase("typesystem_parse"):
+        typesystem = load_typesystem_cached(typesystem_xml)
+    cas_format = detect_cas_format(document)
+    with metrics.phase("xmi_parse"):
+        cas = load_cas(xmi, typesystem, cas_format)
+
+    return PredictionRequest(cas, layer, feature, project_id, document_id, user_id, cas_format)
+
+
+def parse_training_request_stream(stream: BinaryIO, spool_directory: Optional[Path] = None) -> SpooledTrainingRequest:
+    """Parses a training request from a stream of JSON without holding the whole request in memory.
+
+    The stream is copied to a spool file first, of which only the metadata and the type system are kept in memory.
+    The documents are decoded one at a time when iterating over `SpooledTrainingRequest.iter_documents`.
+
+    Args:
+        stream: The body of the training request
+        spool_directory (optional): Directory for the spool file, the default temporary directory if not given
+    """
+    f = tempfile.NamedTemporaryFile(prefix="ariadne_training_", suffix=".json", dir=spool_directory, delete=False)
+    path = Path(f.name)
+    try:
+        # Reading the body can fail halfway, e.g. for corrupt compressed bodies, the spool file is removed then too
+        with f:
+            shutil.copyfileobj(stream, f, _SPOOL_CHUNK_SIZE)
+
+        metadata = None
+        typesystem_xml = None
+        user_id = None
+        document_count = 0
+        payload_size = 0
 
-    layer = metadata["layer"]
-    feature = metadata["feature"]
-    project_id = metadata["projectId"]
+        with open(path, encoding="utf-8") as f:
+            reader = _JsonStreamReader(f)
+            for key in reader.iter_object():
+                if key == "documents":
+                    for document in reader.iter_array():
+                        if user_id is None:
+                            user_id = document["userId"]
+                        document_count += 1
+                        payload_size += _utf8_length(document["xmi"])
+                elif key == "metadata":
+                    metadata = reader.read_value()
+                elif key == "typeSystem":
+                    typesystem_xml = reader.read_value()
+                else:
+                    reader.read_value()
 
-    typesystem = load_typesystem(json_object["typeSystem"])
-    cas = load_cas_from_xmi(document["xmi"], typesystem)
-    document_id = document["documentId"]
-    user_id = document["userId"]
+        if user_id is None:
+            raise InvalidRequestError("Training request does not contain any documents")
+        # Checked here as the request is only used once the training runs, when the client cannot be told anymore
+        if not isinstance(metadata, dict):
+            raise InvalidRequestError("Training request does not contain metadata")
+        if not isinstance(typesystem_xml, str):
+            raise InvalidRequestError("Training request does not contain a type system")
 
-    return PredictionRequest(cas, layer, feature, project_id, document_id, user_id)
+        return SpooledTrainingRequest(
+            metadata["layer"],
+            metadata["feature"],
+            metadata["projectId"],
+            typesystem_xml,
+            [],
+            path=path,
+            user_id=user_id,
+            document_count=document_count,
+            payload_size=payload_size,
+        )
+    except (ValueError, TypeError) as e:
+        _unlink_quietly(path)
+        raise InvalidRequestError(f"Malformed training request: {e}") from e
+    except KeyError as e:
+        _unlink_quietly(path)
+        raise InvalidRequestError(f"Training request is missing the field {e}") from e
+    except Exception:
+        _unlink_quietly(path)
+        raise
 
 
 def parse_training_request(json_object: JsonDict) -> TrainingRequest:
-    metadata = json_object["metadata"]
+    with missing_fields_as_invalid("Training"):
+        metadata = json_object["metadata"]
+
+        layer = metadata["layer"]
+        feature = metadata["feature"]
+        project_id = metadata["projectId"]
+        typesystem_xml = json_object["typeSystem"]
+        documents_json = json_object["documents"]
+
+        if not documents_json:
+            raise InvalidRequestError("Training request does not contain any documents")
+
+        # Reads the user and the XMI of every document
+        return TrainingRequest(layer, feature, project_id, typesystem_xml, documents_json)
+
+
+@contextmanager
+def missing_fields_as_invalid(kind: str):
+    """Turns errors from accessing fields that a request is missing, or that have the wrong type, into
+    `InvalidRequestError`s.
+
+    Args:
+        kind: The kind of request for the error message, e.g. `Prediction`
+    """
+    try:
+        yield
+    except KeyError as e:
+        raise InvalidRequestError(f"{kind} request is missing the field {e}") from e
+    except (TypeError, AttributeError) as e:
+        raise InvalidRequestError(f"Malformed {kind.lower()} request: {e}") from e
+
+
+def load_typesystem_cached(typesystem_xml: str) -> TypeSystem:
+    """Parses the given type system XML or returns the already parsed type system if it has been seen before.
+
+    The returned type system is shared between requests and must therefore not be modified.
+    """
+    key = hashlib.sha256(typesystem_xml.encode("utf-8")).hexdigest()
+    typesystem = typesystem_cache.get(key)
+    if typesystem is None:
+        typesystem = load_typesystem(typesystem_xml)
+        typesystem_cache.put(key, typesystem)
+
+    return typesystem
+
+
+def detect_cas_format(document: Dict[str, str]) -> str:
+    """Returns the format of the CAS in the given document of a request.
+
+    It is either given explicitly in the `format` field of the document or detected from the CAS itself.
+    """
+    cas_format = document.get("format")
+    if cas_format is None:
+        return CAS_FORMAT_JSON if _JSON_CAS_START.match(document["xmi"]) else CAS_FORMAT_XMI
+
+    if cas_format not in CAS_FORMATS:
+        raise InvalidRequestError(f"Unsupported CAS format [{cas_format}], expected one of {list(CAS_FORMATS)}")
+    return cas_format
+
+
+def load_cas(source: str, typesystem: TypeSystem, cas_format: str = CAS_FORMAT_XMI) -> cassis.Cas:
+    if cas_format == CAS_FORMAT_JSON:
+        # The type system of the request is authoritative, merging the one embedded in the JSON would copy it
+        return load_cas_from_json(source, typesystem, merge_typesystem=False)
+
+    return load_cas_from_xmi(source, typesystem)
+
+
+def serialize_cas(cas: cassis.Cas, cas_format: str = CAS_FORMAT_XMI) -> str:
+    if cas_format == CAS_FORMAT_JSON:
+        # Clients have the full type system already, only the types used by the CAS are embedded
+        return cas.to_json(type_system_mode=TypeSystemMode.MINIMAL)
+
+    return cas.to_xmi()
+
+
+def _parse_training_document(document: Dict[str, str], typesystem: TypeSystem) -> "TrainingDocument":
+    cas = load_cas(document["xmi"], typesystem, detect_cas_format(document))
+    return TrainingDocument(cas, document["documentId"], document["userId"])
+
+
+def _utf8_length(s: str) -> int:
+    # Checking for ASCII is cheap and spares encoding the whole string just to measure it
+    return len(s) if s.isascii() else len(s.encode("utf-8"))
+
+
+def _unlink_quietly(path: Path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class _JsonStreamReader:
+    """Minimal pull parser for JSON that decodes one value at a time instead of the whole document.
+
+    Containers can be walked with `iter_object` and `iter_array`, all other values are decoded with `read_value`.
+    Only the value being decoded needs to fit into memory.
+    """
+
+    def __init__(self, f: TextIO, chunk_size: int = _SPOOL_CHUNK_SIZE):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def iter_object(self) -> Iterator[str]:
+        """Yields the keys of an object, the caller has to consume the value of each key before continuing."""
+        self._expect("{")
+        if self._consume("}"):
+            return
+
+        while True:
+            key = self.read_value()
+            self._expect(":")
+            yield key
+
+            if not self._consume(","):
+                self._expect("}")
+                return
+
+    def iter_array(self) -> Iterator[Any]:
+        self._expect("[")
+        if self._consume("]"):
+            return
+
+        while True:
+            yield self.read_value()
+
+            if not self._consume(","):
+                self._expect("]")
+                return
+
+    def read_value(self) -> Any:
+        self._peek()
+        size = self._chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # Numbers can be decoded before they are read completely, so the value has to be followed by a delimiter
+                if self._eof or (end < len(self._buffer) and self._buffer[end] in _JSON_DELIMITERS):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+
+            # Read exponentially more so that decoding stays linear in the size of the value
+            self._read(size)
+            size *= 2
+
+    def _peek(self) -> str:
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _JSON_WHITESPACE:
+                self._pos += 1
+
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+
+            if not self._read(self._chunk_size):
+                raise ValueError("Unexpected end of JSON")
+
+    def _expect(self, char: str):
+        if not self._consume(char):
+            raise ValueError(f"Expected [{char}] but found [{self._peek()}]")
+
+    def _consume(self, char: str) -> bool:
+        if self._peek() == char:
+            self._pos += 1
+            return True
+
+        return False
 
-    layer = metadata["layer"]
-    feature = metadata["feature"]
-    project_id = metadata["projectId"]
-    typesystem_xml = json_object["typeSystem"]
-    documents_json = json_object["documents"]
+    def _read(self, size: int) -> bool:
+        data = self._f.read(size)
+        if not data:
+            self._eof = True
+            return False
 
-    return TrainingRequest(layer, feature, project_id, typesystem_xml, documents_json)
+        self._buffer = self._buffer[self._pos :] + data
+        self._pos = 0
+        return True
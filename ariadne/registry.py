@@ -0,0 +1,220 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+import importlib.util
+import logging
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+from ariadne.classifier import Classifier
+
+logger = logging.getLogger(__name__)
+
+ClassifierFactory = Callable[..., Classifier]
+ClassifierSource = Union[Classifier, ClassifierFactory, str]
+
+
+class _Entry:
+    def __init__(self, name: str, source: ClassifierSource, args: Sequence[Any], kwargs: Mapping[str, Any]):
+        self.name = name
+        self.source = source
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs)
+        self.lock = threading.Lock()
+        self.classifier: Optional[Classifier] = source if isinstance(source, Classifier) else None
+        self.load_seconds: Optional[float] = None
+        self.modules_imported: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def describe_source(self) -> str:
+        if isinstance(self.source, str):
+            return self.source
+        if isinstance(self.source, Classifier):
+            return type(self.source).__module__ + ":" + type(self.source).__qualname__
+        return getattr(self.source, "__module__", "?") + ":" + getattr(self.source, "__qualname__", repr(self.source))
+
+
+class ClassifierRegistry:
+    """Classifiers of a server by name, classifiers registered as a factory or import path are created on first use.
+
+    Creating classifiers lazily keeps the heavy dependencies of e.g. the contrib classifiers (torch, transformers,
+    spaCy, ...) out of worker processes that never use them and lets workers start quickly.
+
+    Args:
+        on_load (optional): Called with the name and the classifier once a classifier has been created or, for
+            classifiers registered as themselves, registered
+    """
+
+    def __init__(self, on_load: Optional[Callable[[str, Classifier], None]] = None):
+        self._entries: Dict[str, _Entry] = {}
+        self._on_load = on_load
+
+    def register(
+        self,
+        name: str,
+        classifier: ClassifierSource,
+        args: Sequence[Any] = (),
+        kwargs: Optional[Mapping[str, Any]] = None,
+    ):
+        """Registers a classifier under the given name.
+
+        Args:
+            name: The name of the classifier
+            classifier: Either the classifier itself, a callable creating it (e.g. its class) or the import path of
+                such a callable as `package.module:attribute`
+            args: Positional arguments for creating the classifier
+            kwargs (optional): Keyword arguments for creating the classifier
+        """
+        if isinstance(classifier, Classifier) and (args or kwargs):
+            raise ValueError(f"Arguments given for classifier [{name}] which has already been created")
+        if not isinstance(classifier, (Classifier, str)) and not callable(classifier):
+            raise TypeError(f"Classifier [{name}] must be a classifier, a factory or an import path")
+
+        entry = self._entries[name] = _Entry(name, classifier, args, kwargs or {})
+        if entry.classifier is not None and self._on_load is not None:
+            self._on_load(name, entry.classifier)
+
+    def get(self, name: str) -> Classifier:
+        """Returns the classifier with the given name, creating it if it has not been used before."""
+        entry = self._entries[name]
+        if entry.classifier is not None:
+            return entry.classifier
+
+        with entry.lock:
+            if entry.classifier is None:
+                classifier = self._create(entry)
+                if self._on_load is not None:
+                    self._on_load(name, classifier)
+                entry.classifier = classifier
+
+        return entry.classifier
+
+    def is_loaded(self, name: str) -> bool:
+        return self._entries[name].classifier is not None
+
+    def warmup(self, names: Optional[Sequence[str]] = None):
+        """Creates the given classifiers, or all of them, right away and logs what has been loaded."""
+        for name in self._entries if names is None else names:
+            self.get(name)
+
+        self.log_report()
+
+    def log_report(self):
+        """Logs which classifiers are registered and loaded. For classifiers given by an import path that have not
+        been loaded yet, it checks that the module exists without importing it and warns if it does not."""
+        for level, line in self._format_report():
+            logger.log(level, line)
+
+    def report(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": entry.name,
+                "source": entry.describe_source(),
+                "loaded": entry.classifier is not None,
+                "loadSeconds": entry.load_seconds,
+                "modulesImported": entry.modules_imported,
+                "error": entry.error,
+            }
+            for entry in self._entries.values()
+        ]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def __getitem__(self, name: str) -> Classifier:
+        return self.get(name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _create(self, entry: _Entry) -> Classifier:
+        logger.info("Loading classifier [%s] from [%s]", entry.name, entry.describe_source())
+        modules_before = len(sys.modules)
+        start = time.perf_counter()
+
+        try:
+            factory = import_from_path(entry.source) if isinstance(entry.source, str) else entry.source
+            classifier = factory(*entry.args, **entry.kwargs)
+            if not isinstance(classifier, Classifier):
+                raise TypeError(f"Factory of classifier [{entry.name}] returned [{type(classifier).__name__}]")
+        except Exception as e:
+            entry.error = repr(e)
+            logger.exception("Loading classifier [%s] failed", entry.name)
+            raise
+
+        entry.load_seconds = time.perf_counter() - start
+        entry.modules_imported = len(sys.modules) - modules_before
+        entry.error = None
+        logger.info(
+            "Loaded classifier [%s] in [%.2f]s, [%d] modules imported",
+            entry.name,
+            entry.load_seconds,
+            entry.modules_imported,
+        )
+        return classifier
+
+    def _format_report(self) -> Iterator[Tuple[int, str]]:
+        loaded = sum(entry.classifier is not None for entry in self._entries.values())
+        yield logging.INFO, f"Classifiers: [{loaded}] of [{len(self)}] loaded"
+        for entry, item in zip(self._entries.values(), self.report()):
+            level = logging.INFO
+            if item["loaded"] and item["loadSeconds"] is not None:
+                state = f"loaded in {item['loadSeconds']:.2f}s, {item['modulesImported']} modules imported"
+            elif item["loaded"]:
+                state = "loaded"
+            elif item["error"] is not None:
+                level, state = logging.WARNING, f"failed: {item['error']}"
+            elif isinstance(entry.source, str) and not module_exists(entry.source):
+                level, state = logging.WARNING, "not loaded yet, its module cannot be found"
+            else:
+                state = "not loaded yet"
+            yield level, f"  {item['name']} ({item['source']}): {state}"
+
+
+def import_from_path(path: str) -> Any:
+    """Imports the object at the given path, either `package.module:attribute` or `package.module.attribute`."""
+    module_name, attribute = _split_import_path(path)
+
+    obj = importlib.import_module(module_name)
+    for part in attribute.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+
+def module_exists(path: str) -> bool:
+    """Returns whether the module of the given import path can be found. The module itself is not imported, only the
+    packages containing it, e.g. `ariadne.contrib` for `ariadne.contrib.spacy:SpacyNerClassifier`."""
+    try:
+        return importlib.util.find_spec(_split_import_path(path)[0]) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _split_import_path(path: str) -> Tuple[str, str]:
+    if ":" in path:
+        module_name, _, attribute = path.partition(":")
+    else:
+        module_name, _, attribute = path.rpartition(".")
+
+    if not module_name or not attribute:
+        raise ValueError(f"Invalid import path [{path}], expected [package.module:attribute]")
+
+    return module_name, attribute
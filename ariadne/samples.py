@@ -0,0 +1,173 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import attr
+import joblib
+
+from ariadne.classifier import Classifier
+from ariadne.protocol import TrainingDocument, TrainingRequest, load_typesystem_cached
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(frozen=True)
+class CollectedSamples:
+    samples: List[Any] = attr.ib()
+    reused_documents: int = attr.ib()
+    extracted_documents: int = attr.ib()
+
+
+class SampleStore:
+    """Keeps the training samples classifiers extracted from each document, so that retraining only needs to parse
+    and extract the documents that changed since the last training.
+
+    Samples are stored per classifier, user and project in one file per document, keyed by the document id and a
+    hash of everything they were extracted from: the serialized CAS, the type system, layer, feature and the
+    `sample_version` of the classifier. Files of documents that are not part of a training request of the project
+    anymore are deleted. Trainings of the same classifier and user must not run concurrently, which the server
+    ensures.
+
+    Args:
+        directory: The directory the samples are kept in
+    """
+
+    def __init__(self, directory: Path):
+        self._directory = Path(directory)
+
+    def collect(self, classifier: Classifier, req: TrainingRequest, processes: int = 0) -> CollectedSamples:
+        """Returns the samples of all documents of the request in their original order, reusing stored ones.
+
+        Raises `TrainingCancelledError` between documents once the training has been cancelled.
+
+        Args:
+            classifier: The classifier that extracts the samples, it must support the sample store
+            req: The training request
+            processes: Parse changed documents in this many worker processes, see `TrainingRequest.iter_documents`
+        """
+        directory = self._get_directory(classifier.name, req.user_id, req.project_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        request_hash = _hash_request(classifier, req)
+
+        samples_per_document: List[Optional[List[Any]]] = []
+        changed: List[Tuple[int, Dict[str, str], str]] = []
+        document_files = set()
+        for document in req.iter_raw_documents():
+            classifier._check_cancelled()
+            path = self._get_path(directory, document["documentId"])
+            content_hash = _hash_document(request_hash, document)
+            document_files.add(path.name)
+            samples_per_document.append(_read_samples(path, content_hash))
+            if samples_per_document[-1] is None:
+                changed.append((len(samples_per_document) - 1, document, content_hash))
+
+        for (index, _, content_hash), document in zip(changed, self._parse(req, [c[1] for c in changed], processes)):
+            classifier._check_cancelled()
+            samples = list(classifier.extract_samples(document, req.layer, req.feature))
+            _write_samples(self._get_path(directory, document.document_id), content_hash, samples)
+            samples_per_document[index] = samples
+
+        for file_name in os.listdir(directory):
+            if file_name.endswith(".joblib") and file_name not in document_files:
+                (directory / file_name).unlink(missing_ok=True)
+
+        reused = len(samples_per_document) - len(changed)
+        logger.debug(
+            "Reused samples of [%d] documents and extracted [%d] for [%s] of user [%s]",
+            reused,
+            len(changed),
+            classifier.name,
+            req.user_id,
+        )
+        samples = [sample for document_samples in samples_per_document for sample in document_samples]
+        return CollectedSamples(samples, reused, len(changed))
+
+    def clear(self, name: str, user_id: str, project_id: Optional[str] = None):
+        """Deletes the samples of the given project or, without one, of all projects of the user."""
+        if project_id is not None:
+            directories = [self._get_directory(name, user_id, project_id)]
+        else:
+            directories = list(self._get_user_directory(name, user_id).glob("project_*"))
+
+        for directory in directories:
+            if directory.is_dir():
+                for path in directory.iterdir():
+                    path.unlink(missing_ok=True)
+
+    def _parse(
+        self, req: TrainingRequest, documents: List[Dict[str, str]], processes: int
+    ) -> Iterator[TrainingDocument]:
+        if processes > 0 and len(documents) > 1:
+            # Imported here as the parallel parsing itself depends on the protocol module
+            from ariadne.parallel import parse_documents_parallel
+
+            typesystem = load_typesystem_cached(req.typesystem_xml)
+            yield from parse_documents_parallel(req.typesystem_xml, typesystem, documents, processes)
+        else:
+            for document in documents:
+                yield req.parse_document(document)
+
+    def _get_user_directory(self, name: str, user_id: str) -> Path:
+        return self._directory / name / f"samples_{user_id}"
+
+    def _get_directory(self, name: str, user_id: str, project_id: Any) -> Path:
+        # Cleaning up after a training only affects the documents of its project
+        return self._get_user_directory(name, user_id) / f"project_{project_id}"
+
+    def _get_path(self, directory: Path, document_id: Any) -> Path:
+        # Document ids are chosen by the client and therefore not used as file names directly
+        return directory / (hashlib.sha256(str(document_id).encode("utf-8")).hexdigest() + ".joblib")
+
+
+def _hash_request(classifier: Classifier, req: TrainingRequest) -> bytes:
+    h = hashlib.sha256()
+    for part in (type(classifier).__qualname__, str(classifier.sample_version), req.layer, req.feature):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    h.update(req.typesystem_xml.encode("utf-8"))
+    return h.digest()
+
+
+def _hash_document(request_hash: bytes, document: Dict[str, str]) -> str:
+    h = hashlib.sha256(request_hash)
+    h.update(document["xmi"].encode("utf-8"))
+    return h.hexdigest()
+
+
+def _read_samples(path: Path, content_hash: str) -> Optional[List[Any]]:
+    try:
+        stored_hash, samples = joblib.load(path)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning("Ignoring unreadable samples [%s]", path, exc_info=True)
+        return None
+
+    return samples if stored_hash == content_hash else None
+
+
+def _write_samples(path: Path, content_hash: str, samples: List[Any]):
+    tmp_path = path.with_name(f".{uuid.uuid4().hex}.tmp")
+    try:
+        joblib.dump((content_hash, samples), tmp_path, compress=0)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
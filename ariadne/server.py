@@ -13,33 +13,277 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import functools
+import gc
+import hashlib
 import logging
+import os
+import sys
+from contextlib import contextmanager, nullcontext
 import tempfile
+import time
+import uuid
+from collections import Counter, deque
 from http import HTTPStatus
 import threading
 from pathlib import Path
-from typing import Dict
+from typing import Any, Callable, ContextManager, Deque, Dict, Iterator, List, Optional, Sequence, Set, Tuple
 
-from filelock import Timeout, FileLock
-from flask import Flask, request, jsonify
+import attr
+from cassis import Cas
+from filelock import FileLock, Timeout
+from flask import Flask, Response, request, jsonify, send_file
 
-from ariadne.classifier import Classifier
-from ariadne.protocol import parse_prediction_request, parse_training_request
+import ariadne
+from ariadne import cache, metrics, splice
+from ariadne.admission import ConcurrencyLimiter, OverloadedError
+from ariadne.cache import LruCache
+from ariadne.capture import CaptureMiddleware, TrafficRecorder
+from ariadne.compression import CompressionMiddleware
+from ariadne.classifier import Classifier, TrainingCancelledError, cancellable_training
+from ariadne.protocol import (
+    CAS_FORMAT_XMI,
+    InvalidRequestError,
+    detect_cas_format,
+    missing_fields_as_invalid,
+    serialize_cas,
+    parse_prediction_request,
+    parse_training_request,
+    parse_training_request_stream,
+    PredictionRequest,
+    TrainingDocument,
+    TrainingRequest,
+)
+from ariadne.metrics import CONTENT_TYPE, TRAINING_BUCKETS, MetricsRegistry
+from ariadne.profiling import (
+    PROFILE_HEADER,
+    PROFILE_ID_HEADER,
+    REQUEST_ID_HEADER,
+    SORT_KEYS,
+    ProfileStore,
+    new_profile_id,
+)
+from ariadne.registry import ClassifierRegistry, ClassifierSource
+from ariadne.store import ModelChange
+from ariadne.samples import SampleStore
+from ariadne.splice import XmiSplicer
+from ariadne.util import RssSampler, get_memory_usage
 
 logger = logging.getLogger(__name__)
 
+JobKey = Tuple[str, str]
+
 
 class Server:
-    def __init__(self):
+    def __init__(
+        self,
+        training_workers: int = 2,
+        max_concurrent_trainings: int = 1,
+        training_history: int = 100,
+        splice_responses: bool = False,
+        verify_spliced_responses: bool = False,
+        training_spool_threshold: Optional[int] = None,
+        training_parse_processes: int = 0,
+        profile_directory: Optional[Path] = None,
+        max_profiles: int = 100,
+        retry_after: int = 1,
+        prediction_cache_entries: int = 1024,
+        prediction_cache_bytes: Optional[int] = 256 * 1024 * 1024,
+        compression_min_size: Optional[int] = 1024,
+        compression_max_request_size: Optional[int] = 1024 * 1024 * 1024,
+        sample_directory: Optional[Path] = None,
+        capture_directory: Optional[Path] = None,
+        capture_sample_rate: float = 0.01,
+        capture_max_request_bytes: int = 16 * 1024 * 1024,
+        capture_max_bytes: int = 1024 * 1024 * 1024,
+        training_lock_timeout: float = 60.0,
+        model_store_poll_interval: Optional[float] = None,
+    ):
+        """Server hosting the registered classifiers.
+
+        Args:
+            training_workers: Number of threads that run trainings, i.e. the maximum number of trainings at once
+            max_concurrent_trainings: Default for the maximum number of trainings at once per classifier
+            training_history: Number of finished trainings that are kept for the training status
+            splice_responses: Build prediction responses by splicing the predictions into the request XMI instead
+                of serializing the whole CAS again, see `XmiSplicer`
+            verify_spliced_responses: Compare spliced responses against a full serialization and use the latter if
+                they differ, this is slow and meant for testing
+            training_spool_threshold (optional): Training requests with a body of at least this many bytes are
+                spooled to disk and their documents are only parsed while training, see `SpooledTrainingRequest`
+            training_parse_processes: Parse the documents of training requests in this many worker processes,
+                `0` parses them in the training thread
+            profile_directory (optional): Enables profiling of requests that send the header `X-Ariadne-Profile: true`,
+                their profiles are stored in this directory and served at `/profiles`, see `ProfileStore`
+            max_profiles: Maximum number of profiles to keep
+            retry_after: Seconds after which clients are asked to retry requests rejected because a classifier is
+                overloaded, see the `max_concurrent_predictions` of `add_classifier`
+            prediction_cache_entries: Maximum number of responses kept for classifiers with `cache_predictions`
+            prediction_cache_bytes (optional): Maximum memory taken by the responses kept in the prediction cache
+            compression_min_size (optional): Compress responses of at least this many bytes for clients accepting it,
+                `None` disables compressing responses. Compressed requests are accepted regardless.
+            compression_max_request_size (optional): Compressed requests that decompress to more than this many bytes
+                are rejected, `None` for no limit
+            sample_directory (optional): Where the training samples of classifiers supporting the sample store are
+                kept between trainings, defaults to `samples` in `ariadne.cache_directory`, see `SampleStore`
+            capture_directory (optional): Records a sample of the prediction and training requests to compressed
+                archives in this directory, which `scripts/replay.py` can send to a server again, see
+                `TrafficRecorder`
+            capture_sample_rate: Fraction of the requests to record
+            capture_max_request_bytes: Requests larger than this are not recorded
+            capture_max_bytes: Each process stops recording once its archive reached this size
+            training_lock_timeout: Seconds a training waits for a training of the same classifier and user in another
+                worker process to finish, it ends in the state `lock_timeout` afterwards and should be retried
+            model_store_poll_interval (optional): Watch the model stores of the classifiers, polling them every this
+                many seconds, and look up the latest model of a user from the versions they notified about instead of
+                asking the store on every request. Models trained in other processes or on other nodes are then used
+                after at most this many seconds, see `ModelStore.watch`
+        """
         self._app = Flask(__name__)
-        self._classifiers: Dict[str, Classifier] = {}
+        self._recorder = None
+        if capture_directory is not None:
+            self._recorder = TrafficRecorder(
+                capture_directory, capture_sample_rate, capture_max_request_bytes, capture_max_bytes
+            )
+            self._app.wsgi_app = CaptureMiddleware(self._app.wsgi_app, self._recorder)
+        # Outermost, so that requests are recorded decompressed
+        self._app.wsgi_app = CompressionMiddleware(
+            self._app.wsgi_app, compression_min_size, max_request_size=compression_max_request_size
+        )
+        self._model_store_poll_interval = model_store_poll_interval
+        self._classifiers = ClassifierRegistry(on_load=self._watch_model_store)
+        self._batchers: Dict[str, PredictionBatcher] = {}
+        self._limiters: Dict[str, ConcurrencyLimiter] = {}
+        self._retry_after = retry_after
+        self._cached_classifiers: Set[str] = set()
+        self._prediction_cache = LruCache(prediction_cache_entries, prediction_cache_bytes)
         self._lock_directory: Path = Path(tempfile.gettempdir()) / ".ariadne_locks"
+        self._training_lock_timeout = training_lock_timeout
+        self._splice_responses = splice_responses
+        self._verify_spliced_responses = verify_spliced_responses
+        self._training_spool_threshold = training_spool_threshold
+        self._training_parse_processes = training_parse_processes
+        self._sample_store = SampleStore(
+            ariadne.cache_directory / "samples" if sample_directory is None else sample_directory
+        )
+        self._scheduler = TrainingScheduler(self, training_workers, max_concurrent_trainings, training_history)
+        self._metrics = ServerMetrics(self._scheduler, self._limiters, self._prediction_cache)
+        self._profiles = ProfileStore(profile_directory, max_profiles) if profile_directory is not None else None
 
         self._app.add_url_rule("/<classifier_name>/predict", "predict", self._predict, methods=["POST"])
         self._app.add_url_rule("/<classifier_name>/train", "train", self._train, methods=["POST"])
+        self._app.add_url_rule("/<classifier_name>/train/status", "train_status", self._train_status, methods=["GET"])
+        self._app.add_url_rule("/<classifier_name>/train/cancel", "train_cancel", self._train_cancel, methods=["POST"])
+        self._app.add_url_rule("/train/status", "train_status_all", self._train_status, methods=["GET"])
+        self._app.add_url_rule("/metrics", "metrics", self._render_metrics, methods=["GET"])
+        self._app.register_error_handler(OverloadedError, self._handle_overloaded)
+        self._app.register_error_handler(InvalidRequestError, self._handle_invalid_request)
+        self._app.add_url_rule("/classifiers", "classifiers", self._list_classifiers, methods=["GET"])
+        self._app.add_url_rule("/memory", "memory", self._report_memory, methods=["GET"])
+        if self._profiles is not None:
+            self._app.add_url_rule("/profiles", "profiles", self._list_profiles, methods=["GET"])
+            self._app.add_url_rule("/profiles/<profile_id>", "profile", self._get_profile, methods=["GET"])
+
+    def add_classifier(
+        self,
+        name: str,
+        classifier: ClassifierSource,
+        max_concurrent_trainings: Optional[int] = None,
+        max_batch_size: int = 1,
+        max_batch_wait: float = 0.01,
+        classifier_args: Sequence[Any] = (),
+        classifier_kwargs: Optional[Dict[str, Any]] = None,
+        max_concurrent_predictions: Optional[int] = None,
+        max_queued_predictions: int = 0,
+        max_queue_wait: Optional[float] = None,
+        cache_predictions: bool = False,
+    ):
+        """Registers a classifier under the given name.
+
+        Classifiers given as a factory or import path are only created when they are first used, or when
+        `warmup` is called, so that their dependencies are not imported by workers that never use them.
+
+        Args:
+            name: The name under which the classifier is reachable, e.g. `/<name>/predict`
+            classifier: The classifier, a callable creating it (e.g. its class) or the import path of such a callable,
+                e.g. `"ariadne.contrib.spacy:SpacyNerClassifier"`
+            max_concurrent_trainings (optional): Maximum number of trainings at once for this classifier
+            max_batch_size: Concurrent prediction requests are predicted together in batches of up to this size via
+                `Classifier.predict_batch`, `1` disables batching. Only useful with threaded workers.
+            max_batch_wait: Maximum time in seconds a prediction request waits for further requests to batch with
+            classifier_args: Positional arguments for creating the classifier
+            classifier_kwargs (optional): Keyword arguments for creating the classifier
+            max_concurrent_predictions (optional): Maximum number of prediction requests processed at once by this
+                classifier, unlimited by default. With batching, this should be at least `max_batch_size`.
+            max_queued_predictions: Maximum number of prediction requests waiting for one of the above, further
+                requests are rejected with `503 Service Unavailable` and a `Retry-After` header
+            max_queue_wait (optional): Maximum time in seconds a prediction request waits before it is rejected
+            cache_predictions: Keep the responses of this classifier and answer repeated requests for the same
+                document, user and model version from the cache without predicting again. Only enable this for
+                classifiers whose predictions depend on nothing but the request and the model of the user.
+        """
+        self._classifiers.register(name, classifier, classifier_args, classifier_kwargs)
+        if max_concurrent_trainings is not None:
+            self._scheduler.set_max_concurrent_trainings(name, max_concurrent_trainings)
+        if max_concurrent_predictions is not None:
+            self._limiters[name] = ConcurrencyLimiter(
+                max_concurrent_predictions, max_queued_predictions, max_queue_wait
+            )
+        else:
+            self._limiters.pop(name, None)
+        if cache_predictions:
+            self._cached_classifiers.add(name)
+        else:
+            self._cached_classifiers.discard(name)
+        if max_batch_size > 1:
+            self._batchers[name] = PredictionBatcher(
+                functools.partial(self._classifiers.get, name), max_batch_size, max_batch_wait
+            )
+        else:
+            self._batchers.pop(name, None)
+
+    def warmup(self, names: Optional[Sequence[str]] = None):
+        """Creates the given classifiers, or all of them, right away and logs which classifiers have been loaded.
+
+        Call this before e.g. gunicorn forks its workers so that they share the loaded classifiers.
+        """
+        self._classifiers.warmup(names)
+
+    def log_classifiers(self):
+        """Logs which classifiers are registered and loaded, and warns about classifiers given by an import path whose
+        module cannot be found, without importing them. `warmup` and `preload` log the same."""
+        self._classifiers.log_report()
 
-    def add_classifier(self, name: str, classifier: Classifier):
-        self._classifiers[name] = classifier
+    def preload(self, names: Optional[Sequence[str]] = None):
+        """Loads the given classifiers, or all of them, in a process that is about to fork its workers.
+
+        Meant for running gunicorn with `--preload`, where `wsgi.py` is imported once in the master process.
+        The workers then share the memory of the loaded models copy-on-write. All objects existing so far are
+        moved out of the reach of the garbage collector, otherwise collections in the workers would write to
+        every object and thereby copy the pages holding them into each worker.
+        """
+        self.warmup(names)
+
+        gc.collect()
+        gc.freeze()
+        logger.info("Froze [%d] objects before forking", gc.get_freeze_count())
+
+    def _watch_model_store(self, name: str, classifier: Classifier):
+        if self._model_store_poll_interval is None:
+            return
+
+        classifier.model_store.subscribe(functools.partial(self._on_model_change, name, classifier))
+        classifier.model_store.watch(self._model_store_poll_interval)
+
+    def _on_model_change(self, name: str, classifier: Classifier, change: ModelChange):
+        if change.name != classifier.name:
+            return
+
+        # Old models and the responses predicted with them are never used again, free their memory right away
+        cache.model_cache.discard_older(classifier._get_model_key(change.user_id), change.version)
+        self._prediction_cache.remove_if(
+            lambda key, _: key[0] == name and key[4] == change.user_id and key[5] != change.version
+        )
 
     def start(self, debug: bool = False, host: str = "0.0.0.0", port: int = 5000):
         self._app.run(debug=debug, host=host, port=port)
@@ -50,14 +294,88 @@ class Server:
         if classifier_name not in self._classifiers:
             return "Classifier with name [{0}] not found!".format(classifier_name), HTTPStatus.NOT_FOUND.value
 
-        json_data = request.get_json()
+        profile_id = self._get_requested_profile_id()
+        with self._metrics.track_request(classifier_name, "predict"):
+            with self._profile(profile_id, classifier_name, "predict") as profiled:
+                with metrics.phase("json_decode"):
+                    json_data = request.get_json()
+
+                xmi = cache_key = None
+                if classifier_name in self._cached_classifiers:
+                    with metrics.phase("cache_lookup"):
+                        cache_key = self._get_prediction_cache_key(classifier_name, json_data)
+                        xmi = self._prediction_cache.get(cache_key)
+                    self._metrics.count_prediction_cache_access(classifier_name, xmi is not None)
+
+                if xmi is None:
+                    # Only requests that are not answered from the cache need a slot of the classifier
+                    with self._admit(classifier_name):
+                        xmi = self._predict_document(classifier_name, json_data)
+                    if cache_key is not None:
+                        # The memory the string takes, non-ASCII documents take up to four bytes per character
+                        self._prediction_cache.put(cache_key, xmi, weight=sys.getsizeof(xmi))
 
+                # Documents are answered in the format they have been sent in, only non-XMI ones say so
+                cas_format = detect_cas_format(json_data["document"])
+                if cas_format == CAS_FORMAT_XMI:
+                    result = jsonify(document=xmi)
+                else:
+                    result = jsonify(document=xmi, format=cas_format)
+
+            if profiled:
+                result.headers[PROFILE_ID_HEADER] = profile_id
+            return result
+
+    def _predict_document(self, classifier_name: str, json_data: Dict[str, Any]) -> str:
         req = parse_prediction_request(json_data)
-        classifier = self._classifiers[classifier_name]
-        classifier.predict(req.cas, req.layer, req.feature, req.project_id, req.document_id, req.user_id)
+        splicer = None
+        if self._splice_responses and req.cas_format == CAS_FORMAT_XMI:
+            splicer = XmiSplicer(json_data["document"]["xmi"], req.cas)
+
+        with metrics.phase("predict"):
+            batcher = self._batchers.get(classifier_name)
+            if batcher is not None:
+                batcher.predict(req)
+            else:
+                classifier = self._classifiers[classifier_name]
+                classifier.predict(req.cas, req.layer, req.feature, req.project_id, req.document_id, req.user_id)
+
+        with metrics.phase("serialize"):
+            return self._serialize_response(req.cas, splicer, req.cas_format)
+
+    def _get_prediction_cache_key(self, classifier_name: str, json_data: Dict[str, Any]) -> Tuple:
+        # The XMI covers the text and all annotations the classifier could base its predictions on
+        with missing_fields_as_invalid("Prediction"):
+            metadata = json_data["metadata"]
+            document = json_data["document"]
+            user_id = document["userId"]
+            digest = hashlib.sha256(json_data["typeSystem"].encode("utf-8"))
+            digest.update(b"\0")
+            digest.update(document["xmi"].encode("utf-8"))
+            layer, feature, project_id = metadata["layer"], metadata["feature"], metadata["projectId"]
+
+        model_version = self._classifiers[classifier_name].get_model_version(user_id)
+
+        return (
+            classifier_name,
+            layer,
+            feature,
+            project_id,
+            user_id,
+            model_version,
+            digest.hexdigest(),
+        )
+
+    def _serialize_response(self, cas: Cas, splicer: Optional[XmiSplicer], cas_format: str) -> str:
+        if splicer is not None:
+            xmi = splicer.splice()
+            if xmi is not None and self._verify_spliced_responses and not splicer.verify(xmi):
+                logger.warning("Spliced response differs from full serialization, using the latter")
+                splice.record_fallback(splice.FALLBACK_MISMATCH)
+            elif xmi is not None:
+                return xmi
 
-        result = jsonify(document=req.cas.to_xmi())
-        return result
+        return serialize_cas(cas, cas_format)
 
     def _train(self, classifier_name: str):
         logger.info("Got training request for [%s]", classifier_name)
@@ -65,33 +383,610 @@ class Server:
         if classifier_name not in self._classifiers:
             return "Classifier with name [{0}] not found!".format(classifier_name), HTTPStatus.NOT_FOUND.value
 
-        json_data = request.get_json()
-        req = parse_training_request(json_data)
-        user_id = req.user_id
-        classifier = self._classifiers[classifier_name]
+        with self._metrics.track_request(classifier_name, "train"):
+            threshold = self._training_spool_threshold
+            if threshold is not None and (request.content_length is None or request.content_length >= threshold):
+                with metrics.phase("spool"):
+                    req = parse_training_request_stream(request.stream)
+            else:
+                with metrics.phase("json_decode"):
+                    req = parse_training_request(request.get_json())
+
+            # The training itself is profiled once it runs, the training status reports the id of its profile
+            self._scheduler.submit(classifier_name, req, self._get_requested_profile_id())
+
+        return HTTPStatus.NO_CONTENT.description, HTTPStatus.NO_CONTENT.value
+
+    def _train_status(self, classifier_name: Optional[str] = None):
+        if classifier_name is not None and classifier_name not in self._classifiers:
+            return "Classifier with name [{0}] not found!".format(classifier_name), HTTPStatus.NOT_FOUND.value
+
+        return jsonify(self._scheduler.status(classifier_name, request.args.get("userId")))
+
+    def _train_cancel(self, classifier_name: str):
+        if classifier_name not in self._classifiers:
+            return "Classifier with name [{0}] not found!".format(classifier_name), HTTPStatus.NOT_FOUND.value
+
+        user_id = request.args.get("userId")
+        if user_id is None:
+            return "Parameter [userId] is required!", HTTPStatus.BAD_REQUEST.value
+
+        jobs = self._scheduler.cancel(classifier_name, user_id)
+        if not jobs:
+            return "No training for user [{0}] found!".format(user_id), HTTPStatus.NOT_FOUND.value
+
+        return jsonify(cancelled=[job.to_json() for job in jobs])
+
+    def _admit(self, classifier_name: str) -> ContextManager:
+        limiter = self._limiters.get(classifier_name)
+        return limiter.acquire() if limiter is not None else nullcontext()
+
+    def _handle_overloaded(self, e: OverloadedError):
+        logger.warning("Rejected request: %s", e)
+        headers = {"Retry-After": str(self._retry_after)}
+        return "Too many requests for this classifier, retry later", HTTPStatus.SERVICE_UNAVAILABLE.value, headers
+
+    def _handle_invalid_request(self, e: InvalidRequestError):
+        logger.warning("Rejected invalid request: %s", e)
+        return str(e), HTTPStatus.BAD_REQUEST.value
+
+    def _list_classifiers(self):
+        return jsonify(classifiers=self._classifiers.report())
+
+    def _report_memory(self):
+        usage = get_memory_usage()
+        report = usage.to_json() if usage is not None else {}
+        return jsonify(pid=os.getpid(), frozenObjects=gc.get_freeze_count(), **report)
+
+    def _list_profiles(self):
+        return jsonify(profiles=self._profiles.list())
+
+    def _get_profile(self, profile_id: str):
+        if request.args.get("format") == "text":
+            sort = request.args.get("sort", "cumulative")
+            if sort not in SORT_KEYS:
+                return "Parameter [sort] must be one of {0}!".format(", ".join(SORT_KEYS)), HTTPStatus.BAD_REQUEST.value
+
+            text = self._profiles.render_text(profile_id, sort)
+            if text is not None:
+                return Response(text, content_type="text/plain; charset=utf-8")
+        else:
+            path = self._profiles.get_path(profile_id)
+            if path is not None:
+                return send_file(path, mimetype="application/octet-stream", as_attachment=True)
+
+        return "Profile [{0}] not found!".format(profile_id), HTTPStatus.NOT_FOUND.value
+
+    def _get_requested_profile_id(self) -> Optional[str]:
+        if self._profiles is None or request.headers.get(PROFILE_HEADER, "").lower() not in ("1", "true", "yes"):
+            return None
+
+        return new_profile_id(request.headers.get(REQUEST_ID_HEADER))
+
+    def _profile(self, profile_id: Optional[str], classifier_name: str, endpoint: str) -> ContextManager[bool]:
+        if profile_id is None:
+            return nullcontext(False)
 
+        return self._profiles.profile(profile_id, classifier_name, endpoint)
+
+    def _render_metrics(self):
+        return Response(self._metrics.registry.render(), content_type=CONTENT_TYPE)
+
+    def _run_training(self, job: "TrainingJob"):
+        classifier = self._classifiers[job.classifier_name]
+        user_id = job.user_id
+
+        # Trainings of the same user can also be running in other worker processes
+        lock = self._get_lock(classifier.name, user_id)
+        logger.debug(f"Acquiring lock for [{user_id}, {classifier.name}]")
+        self._acquire_lock(lock, job)
         try:
-            # The lock needs to be acquired out here, not in the fn scope, else it would
-            # just throw the Timeout inside fn.
-            lock = self._get_lock(classifier.name, user_id)
-            logger.debug(f"Acquiring lock for [{user_id}, {classifier.name}]")
-            lock.acquire()
-
-            def _fn():
-                try:
-                    classifier.fit(req.documents, req.layer, req.feature, req.project_id, user_id)
-                finally:
-                    logger.debug(f"Releasing lock for [{user_id}, {classifier.name}]")
-                    lock.release()
-
-            # We spawn a thread and run the training in there so that this HTTP request can return directly
-            threading.Thread(target=_fn, daemon=True).start()
-            return HTTPStatus.NO_CONTENT.description, HTTPStatus.NO_CONTENT.value
-        except Timeout:
-            logger.info("Already training [%s] for user [%s], skipping!", classifier_name, user_id)
-            return HTTPStatus.TOO_MANY_REQUESTS.description, HTTPStatus.TOO_MANY_REQUESTS.value
+            # The job may have been cancelled while waiting for the lock
+            if job.cancelled.is_set():
+                raise TrainingCancelledError()
+
+            job.state = TrainingJob.RUNNING
+            job.started = time.time()
+
+            sampler = RssSampler()
+            try:
+                with sampler:
+                    if classifier.supports_sample_store:
+                        self._fit_samples(classifier, job)
+                    else:
+                        self._fit_documents(classifier, job)
+            finally:
+                job.peak_rss_bytes = sampler.peak_bytes
+                job.rss_increase_bytes = sampler.increase_bytes
+        finally:
+            lock.release()
+        logger.debug(f"Released lock for [{user_id}, {classifier.name}]")
+
+    def _acquire_lock(self, lock: FileLock, job: "TrainingJob"):
+        """Waits for the lock in short steps, so that cancelling the job also stops the waiting."""
+        deadline = time.monotonic() + self._training_lock_timeout
+        while True:
+            if job.cancelled.is_set():
+                raise TrainingCancelledError()
+            try:
+                lock.acquire(timeout=max(min(0.5, deadline - time.monotonic()), 0))
+                return
+            except Timeout:
+                if time.monotonic() >= deadline:
+                    raise TrainingLockTimeout(
+                        f"Another training of [{job.classifier_name}] for user [{job.user_id}] did not finish within "
+                        f"[{self._training_lock_timeout}]s"
+                    )
+
+    def _fit_documents(self, classifier: Classifier, job: "TrainingJob"):
+        req = job.request
+        with cancellable_training(job.cancelled), self._profile_training(job):
+            if classifier.supports_streaming_training:
+                documents = _count_samples(req.iter_documents(self._training_parse_processes), req.layer, job)
+            else:
+                documents = req.parse_documents(self._training_parse_processes)
+                job.sample_count = sum(len(document.cas.select(req.layer)) for document in documents)
+                classifier._check_cancelled()
+
+            classifier.fit(documents, req.layer, req.feature, req.project_id, job.user_id)
+
+    def _fit_samples(self, classifier: Classifier, job: "TrainingJob"):
+        req = job.request
+        with cancellable_training(job.cancelled), self._profile_training(job):
+            collected = self._sample_store.collect(classifier, req, self._training_parse_processes)
+            job.sample_count = len(collected.samples)
+            job.reused_documents = collected.reused_documents
+            classifier._check_cancelled()
+            classifier.fit_samples(collected.samples, req.layer, req.feature, req.project_id, job.user_id)
+
+    @contextmanager
+    def _profile_training(self, job: "TrainingJob") -> Iterator[None]:
+        profiled = False
+        try:
+            with self._profile(job.requested_profile_id, job.classifier_name, "train") as profiled:
+                yield
+        finally:
+            # Only reported once the profile has been stored, it is skipped while another one is recorded
+            if profiled:
+                job.profile_id = job.requested_profile_id
 
     def _get_lock(self, classifier_name: str, user_id: str) -> FileLock:
         self._lock_directory.mkdir(parents=True, exist_ok=True)
         lock_path = self._lock_directory / f"{classifier_name}_{user_id}.lock"
-        return FileLock(lock_path, timeout=1, thread_local=False)
+        return FileLock(lock_path, thread_local=False)
+
+
+class TrainingLockTimeout(Exception):
+    """Raised when a training of the same classifier and user in another process holds the lock for too long."""
+
+
+class ServerMetrics:
+    """Metrics of a server in the Prometheus format, they are served at `/metrics`.
+
+    Prediction requests are broken down into the phases `queue_wait`, `json_decode`, `cache_lookup`,
+    `typesystem_parse`, `xmi_parse`, `model_load`, `predict` and `serialize`, where `predict` does not include the
+    time spent loading models. `queue_wait` and `cache_lookup` are only recorded for classifiers using them.
+    """
+
+    def __init__(
+        self, scheduler: "TrainingScheduler", limiters: Dict[str, ConcurrencyLimiter], prediction_cache: LruCache
+    ):
+        self.registry = registry = MetricsRegistry()
+        labels = ["classifier", "endpoint"]
+
+        self.requests = registry.counter("ariadne_requests_total", "Number of requests", labels)
+        self.request_errors = registry.counter("ariadne_request_errors_total", "Number of failed requests", labels)
+        self.requests_rejected = registry.counter(
+            "ariadne_requests_rejected_total", "Number of requests rejected because a classifier is overloaded", labels
+        )
+        self.request_duration = registry.histogram("ariadne_request_duration_seconds", "Request latency", labels)
+        self.phase_duration = registry.histogram(
+            "ariadne_request_phase_duration_seconds", "Time spent in each phase of a request", labels + ["phase"]
+        )
+        self.training_duration = registry.histogram(
+            "ariadne_training_duration_seconds", "Duration of trainings", ["classifier", "state"], TRAINING_BUCKETS
+        )
+        self.training_queue_duration = registry.histogram(
+            "ariadne_training_queue_seconds",
+            "Time trainings waited before they started",
+            ["classifier"],
+            TRAINING_BUCKETS,
+        )
+        self.training_documents = registry.counter(
+            "ariadne_training_documents_total",
+            "Number of trained documents by whether their samples were reused from the sample store or extracted",
+            ["classifier", "samples"],
+        )
+        registry.gauge(
+            "ariadne_training_queue_depth",
+            "Number of queued trainings",
+            ["classifier"],
+            lambda: {(name,): count for name, count in scheduler.pending_per_classifier().items()},
+        )
+        registry.gauge(
+            "ariadne_trainings_running",
+            "Number of running trainings",
+            ["classifier"],
+            lambda: {(name,): count for name, count in scheduler.running_per_classifier().items()},
+        )
+        registry.gauge(
+            "ariadne_predictions_active",
+            "Number of prediction requests being processed by classifiers with a concurrency limit",
+            ["classifier"],
+            lambda: {(name,): limiter.active for name, limiter in list(limiters.items())},
+        )
+        registry.gauge(
+            "ariadne_predictions_queued",
+            "Number of prediction requests waiting for classifiers with a concurrency limit",
+            ["classifier"],
+            lambda: {(name,): limiter.queued for name, limiter in list(limiters.items())},
+        )
+        self.prediction_cache_accesses = registry.counter(
+            "ariadne_prediction_cache_requests_total",
+            "Prediction requests for classifiers with cached predictions by whether they were answered from the cache",
+            ["classifier", "result"],
+        )
+        registry.counter(
+            "ariadne_prediction_cache_evictions_total",
+            "Responses evicted from the prediction cache",
+            collect=lambda: {(): prediction_cache.stats().evictions},
+        )
+        registry.gauge(
+            "ariadne_prediction_cache_bytes",
+            "Summed size of the responses in the prediction cache",
+            collect=lambda: {(): prediction_cache.stats().weight},
+        )
+        registry.gauge("ariadne_process_memory_bytes", "Memory of this process", ["kind"], _collect_memory_usage)
+        registry.counter(
+            "ariadne_splice_fallbacks_total",
+            "Prediction responses serialized fully because splicing them was not possible, failed or differed",
+            ["reason"],
+            collect=lambda: {(reason,): count for reason, count in splice.get_fallback_counts().items()},
+        )
+        registry.counter(
+            "ariadne_model_cache_hits_total",
+            "Models found in the model cache",
+            collect=lambda: {(): cache.model_cache.stats().hits},
+        )
+        registry.counter(
+            "ariadne_model_cache_misses_total",
+            "Models not found in the model cache",
+            collect=lambda: {(): cache.model_cache.stats().misses},
+        )
+        registry.counter(
+            "ariadne_model_cache_shared_loads_total",
+            "Model loads that waited for the same model being loaded by another request instead of loading it again",
+            collect=lambda: {(): cache.model_cache.shared_loads},
+        )
+        registry.counter(
+            "ariadne_model_cache_installs_total",
+            "Freshly trained models put into the model cache directly instead of being loaded from the model store",
+            collect=lambda: {(): cache.model_cache.installs},
+        )
+
+    @contextmanager
+    def track_request(self, classifier_name: str, endpoint: str):
+        self.requests.inc(classifier_name, endpoint)
+        start = time.perf_counter()
+
+        with metrics.record_phases() as timer:
+            try:
+                yield
+            except OverloadedError:
+                self.requests_rejected.inc(classifier_name, endpoint)
+                raise
+            except Exception:
+                self.request_errors.inc(classifier_name, endpoint)
+                raise
+            finally:
+                self.request_duration.observe(time.perf_counter() - start, classifier_name, endpoint)
+                for phase, seconds in timer.durations.items():
+                    self.phase_duration.observe(seconds, classifier_name, endpoint, phase)
+
+    def count_prediction_cache_access(self, classifier_name: str, hit: bool):
+        self.prediction_cache_accesses.inc(classifier_name, "hit" if hit else "miss")
+
+    def observe_training(self, job: "TrainingJob"):
+        if job.started is None:
+            return
+
+        self.training_queue_duration.observe(job.queue_seconds, job.classifier_name)
+        self.training_duration.observe(job.duration_seconds, job.classifier_name, job.state)
+        if job.reused_documents is not None:
+            extracted = job.request.document_count - job.reused_documents
+            self.training_documents.inc(job.classifier_name, "reused", amount=job.reused_documents)
+            self.training_documents.inc(job.classifier_name, "extracted", amount=extracted)
+
+
+def _collect_memory_usage() -> Dict[Tuple[str, ...], float]:
+    usage = get_memory_usage()
+    if usage is None:
+        return {}
+
+    return {("rss",): usage.rss, ("pss",): usage.pss, ("shared",): usage.shared, ("private",): usage.private}
+
+
+def _count_samples(documents: Iterator[TrainingDocument], layer: str, job: "TrainingJob") -> Iterator[TrainingDocument]:
+    job.sample_count = 0
+    for document in documents:
+        # Streaming classifiers see the cancellation when asking for their next document
+        if job.cancelled.is_set():
+            raise TrainingCancelledError()
+        job.sample_count += len(document.cas.select(layer))
+        yield document
+
+
+@attr.s
+class _BatchItem:
+    request: PredictionRequest = attr.ib()
+    done: threading.Event = attr.ib(factory=threading.Event)
+    error: Optional[BaseException] = attr.ib(default=None)
+
+
+class PredictionBatcher:
+    """Collects concurrent prediction requests for one classifier and predicts them with a single call.
+
+    The first request of a batch waits for at most `max_wait` seconds or until the batch is full and then runs
+    `Classifier.predict_batch` for the whole batch on its own thread, the other requests wait for it to finish.
+    """
+
+    def __init__(self, get_classifier: Callable[[], Classifier], max_batch_size: int, max_wait: float):
+        self._get_classifier = get_classifier
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+
+        self._condition = threading.Condition()
+        self._batch: List[_BatchItem] = []
+
+    def predict(self, req: PredictionRequest):
+        item = _BatchItem(req)
+
+        with self._condition:
+            batch = self._batch
+            batch.append(item)
+            is_leader = len(batch) == 1
+            if len(batch) >= self._max_batch_size:
+                self._batch = []
+                self._condition.notify_all()
+
+            if is_leader:
+                self._condition.wait_for(lambda: self._batch is not batch, self._max_wait)
+                if self._batch is batch:
+                    self._batch = []
+
+        if is_leader:
+            self._run(batch)
+        else:
+            item.done.wait()
+
+        if item.error is not None:
+            raise item.error
+
+    def _run(self, batch: List[_BatchItem]):
+        try:
+            classifier = self._get_classifier()
+            logger.debug("Predicting batch of [%d] requests with [%s]", len(batch), classifier.name)
+            classifier.predict_batch([item.request for item in batch])
+        except Exception as e:
+            # The CASes might already be partially modified, therefore the whole batch fails
+            for item in batch:
+                item.error = e
+        finally:
+            for item in batch:
+                item.done.set()
+
+
+@attr.s
+class TrainingJob:
+    QUEUED = "queued"
+    WAITING_FOR_LOCK = "waiting_for_lock"
+    LOCK_TIMEOUT = "lock_timeout"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    SUPERSEDED = "superseded"
+
+    classifier_name: str = attr.ib()
+    user_id: str = attr.ib()
+    request: TrainingRequest = attr.ib(repr=False)
+    job_id: str = attr.ib(factory=lambda: uuid.uuid4().hex)
+    state: str = attr.ib(default=QUEUED)
+    submitted: float = attr.ib(factory=time.time)
+    started: Optional[float] = attr.ib(default=None)
+    finished: Optional[float] = attr.ib(default=None)
+    sample_count: Optional[int] = attr.ib(default=None)
+    reused_documents: Optional[int] = attr.ib(default=None)
+    peak_rss_bytes: Optional[int] = attr.ib(default=None)
+    rss_increase_bytes: Optional[int] = attr.ib(default=None)
+    error: Optional[str] = attr.ib(default=None)
+    requested_profile_id: Optional[str] = attr.ib(default=None)
+    profile_id: Optional[str] = attr.ib(default=None)
+    cancelled: threading.Event = attr.ib(factory=threading.Event, repr=False)
+
+    @property
+    def queue_seconds(self) -> float:
+        end = self.started or self.finished or time.time()
+        return end - self.submitted
+
+    @property
+    def duration_seconds(self) -> Optional[float]:
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "jobId": self.job_id,
+            "classifier": self.classifier_name,
+            "userId": self.user_id,
+            "projectId": self.request.project_id,
+            "state": self.state,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "queueSeconds": self.queue_seconds,
+            "durationSeconds": self.duration_seconds,
+            "documents": self.request.document_count,
+            "samples": self.sample_count,
+            "reusedDocuments": self.reused_documents,
+            "peakRssBytes": self.peak_rss_bytes,
+            "rssIncreaseBytes": self.rss_increase_bytes,
+            "error": self.error,
+            "profileId": self.profile_id,
+        }
+
+
+class TrainingScheduler:
+    """Runs trainings on a bounded pool of worker threads.
+
+    Requests are coalesced per classifier and user: a request arriving while a training for the same
+    classifier and user is queued replaces the queued request, a request arriving while such a training is
+    running is trained exactly once after the running training finished. Only the latest request is kept.
+    """
+
+    def __init__(self, server: Server, max_workers: int, max_concurrent_per_classifier: int, history: int = 100):
+        self._server = server
+        self._max_workers = max_workers
+        self._default_max_concurrent = max_concurrent_per_classifier
+        self._max_concurrent: Dict[str, int] = {}
+
+        self._condition = threading.Condition()
+        self._queue: Deque[JobKey] = deque()
+        self._pending: Dict[JobKey, TrainingJob] = {}
+        self._running: Dict[JobKey, TrainingJob] = {}
+        self._running_per_classifier: Counter = Counter()
+        self._finished: Deque[TrainingJob] = deque(maxlen=history)
+        self._workers: List[threading.Thread] = []
+
+    def set_max_concurrent_trainings(self, classifier_name: str, limit: int):
+        with self._condition:
+            self._max_concurrent[classifier_name] = limit
+            self._condition.notify_all()
+
+    def submit(self, classifier_name: str, req: TrainingRequest, profile_id: Optional[str] = None) -> TrainingJob:
+        key = (classifier_name, req.user_id)
+        job = TrainingJob(classifier_name, req.user_id, req, requested_profile_id=profile_id)
+
+        with self._condition:
+            if key in self._pending:
+                logger.info("Training for [%s] of user [%s] already queued, replacing it", *key)
+                self._retire(self._pending[key], TrainingJob.SUPERSEDED)
+            elif key in self._running:
+                logger.info("Already training [%s] for user [%s], retraining afterwards", *key)
+            else:
+                self._queue.append(key)
+
+            self._pending[key] = job
+            # Workers are started lazily so that no threads exist before e.g. gunicorn forks
+            self._ensure_workers()
+            self._condition.notify_all()
+
+        return job
+
+    def cancel(self, classifier_name: str, user_id: str) -> List[TrainingJob]:
+        key = (classifier_name, user_id)
+        cancelled = []
+
+        with self._condition:
+            job = self._pending.pop(key, None)
+            if job is not None:
+                if key in self._queue:
+                    self._queue.remove(key)
+                self._retire(job, TrainingJob.CANCELLED)
+                cancelled.append(job)
+
+            job = self._running.get(key)
+            if job is not None:
+                # Running trainings stop at the latest when they try to save their model, their state tells whether
+                # they did or had already saved it
+                job.cancelled.set()
+                cancelled.append(job)
+
+            self._condition.notify_all()
+
+        for job in cancelled:
+            logger.info("Cancelled training [%s] of [%s] for user [%s]", job.job_id, *key)
+
+        return cancelled
+
+    def status(self, classifier_name: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
+        def matches(job: TrainingJob) -> bool:
+            return (classifier_name is None or job.classifier_name == classifier_name) and (
+                user_id is None or job.user_id == user_id
+            )
+
+        with self._condition:
+            queued = [job.to_json() for job in self._pending.values() if matches(job)]
+            running = [job.to_json() for job in self._running.values() if matches(job)]
+            finished = [job.to_json() for job in reversed(self._finished) if matches(job)]
+
+        return {"queued": queued, "running": running, "finished": finished}
+
+    def pending_per_classifier(self) -> Dict[str, int]:
+        with self._condition:
+            return dict(Counter(key[0] for key in self._pending))
+
+    def running_per_classifier(self) -> Dict[str, int]:
+        with self._condition:
+            return {name: count for name, count in self._running_per_classifier.items() if count}
+
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and not self._running, timeout)
+
+    def _ensure_workers(self):
+        while len(self._workers) < self._max_workers:
+            worker = threading.Thread(target=self._work, name=f"ariadne-training-{len(self._workers)}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                key = self._condition.wait_for(self._next_runnable)
+                self._queue.remove(key)
+                job = self._pending.pop(key)
+                job.state = TrainingJob.WAITING_FOR_LOCK
+                self._running[key] = job
+                self._running_per_classifier[key[0]] += 1
+
+            state = TrainingJob.FINISHED
+            try:
+                self._server._run_training(job)
+            except TrainingCancelledError:
+                state = TrainingJob.CANCELLED
+            except TrainingLockTimeout as e:
+                logger.warning("%s", e)
+                job.error = str(e)
+                state = TrainingJob.LOCK_TIMEOUT
+            except Exception as e:
+                logger.exception("Training [%s] for user [%s] failed", *key)
+                job.error = repr(e)
+                state = TrainingJob.FAILED
+            finally:
+                with self._condition:
+                    del self._running[key]
+                    self._running_per_classifier[key[0]] -= 1
+                    # Only cancelled if it actually stopped, a cancellation after the model was saved is too late
+                    self._retire(job, state)
+                    self._server._metrics.observe_training(job)
+                    if key in self._pending:
+                        self._queue.append(key)
+                    self._condition.notify_all()
+
+            logger.info("Training [%s] for user [%s] %s after [%.2f]s", *key, job.state, job.duration_seconds or 0.0)
+
+    def _retire(self, job: TrainingJob, state: str):
+        job.state = state
+        job.finished = time.time()
+        job.request.close()
+        self._finished.append(job)
+
+    def _next_runnable(self) -> Optional[JobKey]:
+        for key in self._queue:
+            limit = self._max_concurrent.get(key[0], self._default_max_concurrent)
+            if key not in self._running and self._running_per_classifier[key[0]] < limit:
+                return key
+
+        return None
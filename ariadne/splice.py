@@ -0,0 +1,190 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+from cassis import Cas, load_cas_from_xmi
+from cassis.cas import View
+from cassis.typesystem import FeatureStructure
+from cassis.xmi import CasXmiSerializer
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+_XMI_NAMESPACE = "http://www.omg.org/XMI"
+_CAS_NAMESPACE = "http:///uima/cas.ecore"
+_ROOT_START_TAG = re.compile(r"<([\w.-]+):XMI\b[^>]*>")
+_NAMESPACE_DECLARATION = re.compile(r'xmlns:([\w.-]+)="([^"]*)"')
+_MEMBERS = re.compile(r'\bmembers="([^"]*)"')
+
+# Reasons for falling back to a full serialization
+FALLBACK_UNSUPPORTED = "unsupported"
+FALLBACK_ERROR = "error"
+FALLBACK_MISMATCH = "mismatch"
+
+_fallbacks: Counter = Counter()
+_fallbacks_lock = threading.Lock()
+
+
+class XmiSplicer:
+    """Creates the XMI of a CAS after prediction by splicing the newly added feature structures into the XMI
+    the CAS was loaded from, instead of serializing the whole CAS again.
+
+    Splicing relies on the classifier only adding feature structures. If it is not possible, e.g. because feature
+    structures were removed or views were added, `splice` returns `None` and the CAS needs to be serialized fully.
+    Modifications of existing feature structures cannot be detected, classifiers doing that must not use splicing.
+
+    Splicing uses private parts of cassis. If they changed, e.g. after upgrading cassis, every splice fails and falls
+    back to a full serialization, which is logged as a warning and counted by `get_fallback_counts`.
+
+    Args:
+        xmi: The XMI the CAS was loaded from
+        cas: The CAS, it must not have been modified yet
+    """
+
+    def __init__(self, xmi: str, cas: Cas):
+        self._xmi = xmi
+        self._cas = cas
+        self._sofa_count = len(cas.sofas)
+
+        self._first_new_id: Optional[int] = None
+        self._member_count = 0
+        self._error: Optional[Exception] = None
+
+        views = cas.views
+        if len(views) == 1:
+            try:
+                # Ids of feature structures loaded from XMI are kept, new ones are assigned ids above all of them
+                self._first_new_id = cas._xmi_id_generator._next_id
+                self._member_count = len(_get_all_fs(views[0]))
+            except Exception as e:
+                self._error = e
+
+    def splice(self) -> Optional[str]:
+        try:
+            if self._error is not None:
+                raise self._error
+            xmi = self._splice()
+        except Exception:
+            logger.warning("Splicing XMI failed, falling back to full serialization", exc_info=True)
+            record_fallback(FALLBACK_ERROR)
+            return None
+
+        if xmi is None:
+            record_fallback(FALLBACK_UNSUPPORTED)
+        return xmi
+
+    def verify(self, xmi: str) -> bool:
+        """Checks whether the given (spliced) XMI contains exactly the same CAS as a full serialization."""
+        return load_cas_from_xmi(xmi, self._cas.typesystem).to_xmi() == self._cas.to_xmi()
+
+    def _splice(self) -> Optional[str]:
+        cas = self._cas
+        first_new_id = self._first_new_id
+        if first_new_id is None or len(cas.views) != 1 or len(cas.sofas) != self._sofa_count:
+            return None
+
+        members = _get_all_fs(cas.views[0])
+        new_members = [fs for fs in members if fs.xmiID >= first_new_id]
+        if len(members) - len(new_members) != self._member_count:
+            return None
+
+        if not new_members:
+            return self._xmi
+
+        # Also serialize new feature structures that are only referenced, e.g. arrays
+        new_fs = [fs for fs in cas._find_all_fs(seeds=new_members) if fs.xmiID >= first_new_id]
+
+        root_start_tag = _ROOT_START_TAG.search(self._xmi)
+        if root_start_tag is None:
+            return None
+
+        namespaces = dict(_NAMESPACE_DECLARATION.findall(root_start_tag.group(0)))
+        cas_prefix = next((p for p, url in namespaces.items() if url == _CAS_NAMESPACE), None)
+        if cas_prefix is None or namespaces.get(root_start_tag.group(1)) != _XMI_NAMESPACE:
+            return None
+
+        view_tags = list(re.finditer(rf"<{re.escape(cas_prefix)}:View\b[^>]*>", self._xmi))
+        if len(view_tags) != 1:
+            return None
+        view_tag = view_tags[0]
+
+        # The first pass finds the namespaces of types that did not occur in the document yet
+        all_namespaces = self._serialize(cas, new_fs, namespaces)[1]
+        if any(all_namespaces[prefix] != url for prefix, url in namespaces.items()):
+            return None
+        added_namespaces = {p: url for p, url in all_namespaces.items() if p not in namespaces}
+        new_elements = self._serialize(cas, new_fs, all_namespaces)[0]
+
+        if added_namespaces:
+            declarations = "".join(f' xmlns:{p}="{url}"' for p, url in added_namespaces.items())
+            new_root_start_tag = root_start_tag.group(0)[:-1] + declarations + ">"
+        else:
+            new_root_start_tag = root_start_tag.group(0)
+
+        new_member_ids = " ".join(str(fs.xmiID) for fs in sorted(new_members, key=lambda fs: fs.xmiID))
+        members_attribute = _MEMBERS.search(view_tag.group(0))
+        if members_attribute is None:
+            new_view_tag = view_tag.group(0).replace(" ", f' members="{new_member_ids}" ', 1)
+        elif members_attribute.group(1):
+            new_view_tag = _MEMBERS.sub(f'members="{members_attribute.group(1)} {new_member_ids}"', view_tag.group(0))
+        else:
+            new_view_tag = _MEMBERS.sub(f'members="{new_member_ids}"', view_tag.group(0))
+
+        return "".join(
+            [
+                self._xmi[: root_start_tag.start()],
+                new_root_start_tag,
+                self._xmi[root_start_tag.end() : view_tag.start()],
+                new_elements,
+                new_view_tag,
+                self._xmi[view_tag.end() :],
+            ]
+        )
+
+    def _serialize(self, cas: Cas, fs: List[FeatureStructure], namespaces: Dict[str, str]):
+        serializer = CasXmiSerializer()
+        serializer._nsmap = dict(namespaces)
+        serializer._urls_to_prefixes = {url: prefix for prefix, url in namespaces.items()}
+
+        root = etree.Element(etree.QName(_XMI_NAMESPACE, "XMI"), nsmap=namespaces)
+        for f in fs:
+            serializer._serialize_feature_structure(cas, root, f)
+
+        # All namespaces are declared on the root element, so cutting it off leaves just the elements
+        xml = etree.tostring(root, encoding="unicode")
+        return xml[xml.index(">") + 1 : xml.rindex("</")], serializer._nsmap
+
+
+def record_fallback(reason: str):
+    with _fallbacks_lock:
+        _fallbacks[reason] += 1
+
+
+def get_fallback_counts() -> Dict[str, int]:
+    """Returns how often splicing fell back to a full serialization in this process, by reason."""
+    with _fallbacks_lock:
+        return dict(_fallbacks)
+
+
+def _get_all_fs(view: View) -> List[FeatureStructure]:
+    # Called `get_all_annotations` before cassis 0.11, it returns all indexed feature structures nonetheless
+    if hasattr(view, "get_all_fs"):
+        return view.get_all_fs()
+    return view.get_all_annotations()
@@ -0,0 +1,348 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import attr
+from filelock import FileLock
+
+logger = logging.getLogger(__name__)
+
+_VERSION_FILE_PATTERN = re.compile(r"^(\d+)\.joblib$")
+
+ModelWriter = Callable[[Path], None]
+
+
+@attr.s(frozen=True)
+class ModelChange:
+    name: str = attr.ib()
+    user_id: str = attr.ib()
+    version: int = attr.ib()
+
+
+ModelListener = Callable[[ModelChange], None]
+
+
+class ModelStore:
+    """Keeps the trained models of all classifiers and users, every published model gets a version number one higher
+    than the latest one of the same classifier and user.
+
+    Listeners are notified about models published by this store right away, models published by other processes or
+    nodes are noticed by `poll`, which `watch` calls periodically in a background thread. While it is watched,
+    `current_version` answers from the versions it has been notified about instead of asking the store.
+    """
+
+    def __init__(self):
+        self._listeners: List[ModelListener] = []
+        self._listeners_lock = threading.Lock()
+        self._known_versions: Optional[Dict[Tuple[str, str], int]] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+
+    @property
+    def location(self) -> str:
+        """Identifies the store, e.g. in the keys of cached models."""
+        raise NotImplementedError()
+
+    def latest_version(self, name: str, user_id: str) -> Optional[int]:
+        """Returns the version of the latest model of the given classifier and user, `None` if there is none."""
+        raise NotImplementedError()
+
+    def latest_versions(self) -> Dict[Tuple[str, str], int]:
+        """Returns the latest version of every model in the store, keyed by classifier name and user."""
+        raise NotImplementedError()
+
+    def current_version(self, name: str, user_id: str) -> Optional[int]:
+        """Returns the latest version known from watching the store, which lags behind models published by other
+        processes by at most one poll interval, or asks the store via `latest_version` if it is not watched."""
+        with self._listeners_lock:
+            if self._watcher is not None and self._known_versions is not None:
+                return self._known_versions.get((name, user_id))
+
+        return self.latest_version(name, user_id)
+
+    def fetch(self, name: str, user_id: str, version: int) -> Path:
+        """Returns a local path the given model version can be read from, the file does not exist if the version has
+        been removed from the store in the meantime."""
+        raise NotImplementedError()
+
+    def publish(self, name: str, user_id: str, write: ModelWriter) -> int:
+        """Stores a new model version, which becomes visible to readers only once it has been written completely.
+
+        Args:
+            name: The name of the classifier
+            user_id: The user the model has been trained for
+            write: Called with a temporary path the model should be written to
+
+        Returns:
+            The version of the published model
+        """
+        raise NotImplementedError()
+
+    def subscribe(self, listener: ModelListener):
+        with self._listeners_lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: ModelListener):
+        with self._listeners_lock:
+            self._listeners.remove(listener)
+
+    def poll(self) -> List[ModelChange]:
+        """Notifies the listeners about all models that changed since the last poll, the first poll only records the
+        current versions."""
+        versions = self.latest_versions()
+        with self._listeners_lock:
+            known = self._known_versions
+            self._known_versions = versions
+        if known is None:
+            return []
+
+        changes = [
+            ModelChange(name, user_id, version)
+            for (name, user_id), version in sorted(versions.items())
+            if known.get((name, user_id)) != version
+        ]
+        for change in changes:
+            self._notify(change)
+        return changes
+
+    def watch(self, interval: float = 5.0):
+        """Polls the store for changes every `interval` seconds until `close` is called."""
+        if self._watcher is not None:
+            return
+
+        self.poll()
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="model-store-watcher", daemon=True)
+        self._watcher.start()
+
+    def close(self):
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self, interval: float):
+        while not self._stop_watching.wait(interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Polling the model store [%s] failed", self.location)
+
+    def _published(self, change: ModelChange):
+        with self._listeners_lock:
+            if self._known_versions is not None:
+                key = (change.name, change.user_id)
+                self._known_versions[key] = max(change.version, self._known_versions.get(key, 0))
+        self._notify(change)
+
+    def _notify(self, change: ModelChange):
+        with self._listeners_lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(change)
+            except Exception:
+                logger.exception("Model listener failed for [%s]", change)
+
+
+class LocalModelStore(ModelStore):
+    """Stores models in a local directory, all processes of a node using the same directory share the models.
+
+    Every version is an immutable file `<name>/model_<user>.versions/<version>.joblib`, a new version is written to a
+    temporary file and hard linked to the next free version number, so publishing never overwrites a model, also not
+    when several processes publish at the same time. `<name>/model_<user>.joblib` always links to the latest version,
+    models saved there by older versions of ariadne are served as version `0`.
+
+    Args:
+        directory: The directory the models are kept in
+        keep_versions: How many versions per classifier and user to keep, older ones are deleted on publish
+    """
+
+    def __init__(self, directory: Path, keep_versions: int = 2):
+        super().__init__()
+        self._directory = Path(directory)
+        self._keep_versions = max(keep_versions, 1)
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    @property
+    def location(self) -> str:
+        return str(self._directory)
+
+    def latest_version(self, name: str, user_id: str) -> Optional[int]:
+        return self._latest_version(self._directory, name, user_id)
+
+    def latest_versions(self) -> Dict[Tuple[str, str], int]:
+        result = {}
+        if not self._directory.is_dir():
+            return result
+
+        for classifier_directory in self._directory.iterdir():
+            if not classifier_directory.is_dir():
+                continue
+            name = classifier_directory.name
+            for entry in classifier_directory.iterdir():
+                user_id = _parse_user_id(entry.name)
+                if user_id is None or (name, user_id) in result:
+                    continue
+                version = self._latest_version(self._directory, name, user_id)
+                if version is not None:
+                    result[(name, user_id)] = version
+        return result
+
+    def fetch(self, name: str, user_id: str, version: int) -> Path:
+        return _get_version_path(self._directory, name, user_id, version)
+
+    def publish(self, name: str, user_id: str, write: ModelWriter) -> int:
+        versions_directory = _get_versions_directory(self._directory, name, user_id)
+        versions_directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = versions_directory / f".{uuid.uuid4().hex}.tmp"
+        try:
+            write(tmp_path)
+            version = _link_next_version(self._directory, name, user_id, tmp_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+        self._update_latest(self._directory, name, user_id)
+        logger.debug("Published version [%d] of model [%s] for user [%s]", version, name, user_id)
+        self._published(ModelChange(name, user_id, version))
+        return version
+
+    def _latest_version(self, directory: Path, name: str, user_id: str) -> Optional[int]:
+        versions = _list_versions(directory, name, user_id)
+        if versions:
+            return versions[-1]
+        if _get_latest_path(directory, name, user_id).exists():
+            return 0
+        return None
+
+    def _update_latest(self, directory: Path, name: str, user_id: str):
+        """Points the latest model file to the latest version and deletes old versions. Publishers that finish out of
+        order serialize here, so the latest model file never goes back to an older version."""
+        latest_path = _get_latest_path(directory, name, user_id)
+        with FileLock(str(latest_path.with_suffix(".lock")), thread_local=False):
+            versions = _list_versions(directory, name, user_id)
+            tmp_path = latest_path.with_suffix(".joblib.linking")
+            tmp_path.unlink(missing_ok=True)
+            os.link(_get_version_path(directory, name, user_id, versions[-1]), tmp_path)
+            os.replace(tmp_path, latest_path)
+
+            # Processes that already loaded an old version keep reading it after it has been deleted
+            for version in versions[: -self._keep_versions]:
+                _get_version_path(directory, name, user_id, version).unlink(missing_ok=True)
+
+
+class DirectoryModelStore(LocalModelStore):
+    """Stand-in for a store shared by several nodes, e.g. an object storage bucket, that keeps the models in a
+    directory such as a network file system mount.
+
+    Models are only ever read from a node-local cache directory, like a remote store they are copied there when a
+    node first needs a version and are uploaded with a temporary name before being published under their version.
+
+    Args:
+        directory: The shared directory the models are kept in
+        cache_directory: Node-local directory the models are copied to for loading them
+        keep_versions: How many versions per classifier and user to keep, older ones are deleted on publish
+    """
+
+    def __init__(self, directory: Path, cache_directory: Path, keep_versions: int = 2):
+        super().__init__(directory, keep_versions)
+        self._cache_directory = Path(cache_directory)
+
+    def fetch(self, name: str, user_id: str, version: int) -> Path:
+        cached_path = _get_versions_directory(self._cache_directory, name, user_id) / f"{version:08d}.joblib"
+        if cached_path.exists():
+            return cached_path
+
+        source_path = _get_version_path(self._directory, name, user_id, version)
+        cached_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cached_path.parent / f".{uuid.uuid4().hex}.tmp"
+        try:
+            shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, cached_path)
+        except FileNotFoundError:
+            logger.debug("Version [%d] of model [%s] for user [%s] is gone", version, name, user_id)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+        for old_version in _list_versions(self._cache_directory, name, user_id):
+            if old_version <= version - self._keep_versions:
+                cached_path.with_name(f"{old_version:08d}.joblib").unlink(missing_ok=True)
+
+        return cached_path
+
+    def publish(self, name: str, user_id: str, write: ModelWriter) -> int:
+        local_directory = _get_versions_directory(self._cache_directory, name, user_id)
+        local_directory.mkdir(parents=True, exist_ok=True)
+        local_path = local_directory / f".{uuid.uuid4().hex}.tmp"
+        try:
+            write(local_path)
+            version = super().publish(name, user_id, lambda upload_path: shutil.copyfile(local_path, upload_path))
+        finally:
+            local_path.unlink(missing_ok=True)
+        return version
+
+
+def _parse_user_id(file_name: str) -> Optional[str]:
+    if not file_name.startswith("model_"):
+        return None
+    for suffix in (".versions", ".joblib"):
+        if file_name.endswith(suffix):
+            return file_name[len("model_") : -len(suffix)]
+    return None
+
+
+def _get_latest_path(directory: Path, name: str, user_id: str) -> Path:
+    return directory / name / f"model_{user_id}.joblib"
+
+
+def _get_versions_directory(directory: Path, name: str, user_id: str) -> Path:
+    return directory / name / f"model_{user_id}.versions"
+
+
+def _get_version_path(directory: Path, name: str, user_id: str, version: int) -> Path:
+    if version == 0:
+        return _get_latest_path(directory, name, user_id)
+    return _get_versions_directory(directory, name, user_id) / f"{version:08d}.joblib"
+
+
+def _list_versions(directory: Path, name: str, user_id: str) -> List[int]:
+    try:
+        file_names = os.listdir(_get_versions_directory(directory, name, user_id))
+    except FileNotFoundError:
+        return []
+
+    return sorted(int(m.group(1)) for m in map(_VERSION_FILE_PATTERN.match, file_names) if m)
+
+
+def _link_next_version(directory: Path, name: str, user_id: str, tmp_path: Path) -> int:
+    version = (_list_versions(directory, name, user_id) or [0])[-1] + 1
+    while True:
+        try:
+            # Unlike a rename, linking fails if another process published the same version in the meantime
+            os.link(tmp_path, _get_version_path(directory, name, user_id, version))
+            return version
+        except FileExistsError:
+            version += 1
@@ -15,6 +15,11 @@
 # limitations under the License.
 
 import logging
+import os
+import threading
+from typing import Optional, Union
+
+import attr
 
 
 def setup_logging(level=logging.DEBUG):
@@ -23,3 +28,94 @@ def setup_logging(level=logging.DEBUG):
 
     filelock_logger = logging.getLogger("filelock")
     filelock_logger.setLevel(logging.WARNING)
+
+
+def get_rss_bytes() -> Optional[int]:
+    """Returns the current resident set size of this process or `None` if it cannot be determined."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RssSampler:
+    """Samples the resident set size of this process in a background thread to find its peak while e.g. a training
+    runs. The memory of other threads, such as concurrent trainings, is included as it cannot be told apart.
+
+    Args:
+        interval: Seconds between two samples
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.start_bytes: Optional[int] = None
+        self.peak_bytes: Optional[int] = None
+
+    @property
+    def increase_bytes(self) -> Optional[int]:
+        """How much the peak exceeded the resident set size at the start."""
+        if self.start_bytes is None or self.peak_bytes is None:
+            return None
+        return self.peak_bytes - self.start_bytes
+
+    def __enter__(self) -> "RssSampler":
+        self.start_bytes = self.peak_bytes = get_rss_bytes()
+        if self.start_bytes is not None:
+            self._thread = threading.Thread(target=self._sample, name="ariadne-rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._update()
+
+    def _sample(self):
+        while not self._stopped.wait(self._interval):
+            self._update()
+
+    def _update(self):
+        rss = get_rss_bytes()
+        if rss is not None and (self.peak_bytes is None or rss > self.peak_bytes):
+            self.peak_bytes = rss
+
+
+@attr.s(frozen=True)
+class MemoryUsage:
+    """Memory of a process, private memory is only used by this process while shared memory, e.g. pages inherited
+    from the parent process before forking, is also mapped by others. `pss` splits shared pages evenly among the
+    processes sharing them."""
+
+    rss: int = attr.ib()
+    pss: int = attr.ib()
+    shared: int = attr.ib()
+    private: int = attr.ib()
+
+    def to_json(self):
+        return {"rssBytes": self.rss, "pssBytes": self.pss, "sharedBytes": self.shared, "privateBytes": self.private}
+
+
+def get_memory_usage(pid: Union[int, str] = "self") -> Optional[MemoryUsage]:
+    """Returns the memory usage of the given process from `/proc/<pid>/smaps_rollup` or `None` if unavailable."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    values = {}
+    for line in lines[1:]:
+        parts = line.split()
+        if len(parts) == 3 and parts[2] == "kB":
+            values[parts[0].rstrip(":")] = int(parts[1]) * 1024
+
+    return MemoryUsage(
+        rss=values.get("Rss", 0),
+        pss=values.get("Pss", 0),
+        shared=values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0),
+        private=values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    )
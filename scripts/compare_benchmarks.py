@@ -0,0 +1,69 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import argparse
+import json
+import sys
+from typing import Any, Dict, Tuple
+
+
+def load_results(path: str) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        results = json.load(f)
+
+    return {(b["name"], json.dumps(b["params"], sort_keys=True)): b for b in results["benchmarks"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compares two benchmark results files written by `pytest -m performance`."
+    )
+    parser.add_argument("baseline", help="Results of the baseline, e.g. the main branch.")
+    parser.add_argument("results", help="Results to compare against the baseline.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative increase of the median latency reported as regression, 0.1 is 10%%.",
+    )
+    args = parser.parse_args()
+
+    baseline = load_results(args.baseline)
+    results = load_results(args.results)
+
+    print(f"{'benchmark':<60}{'baseline p50 ms':>16}{'p50 ms':>10}{'change':>10}")
+    regressions = 0
+    for key in sorted(baseline.keys() | results.keys()):
+        name = f"{key[0]} {key[1]}" if key[1] != "{}" else key[0]
+        if key not in baseline or key not in results:
+            print(f"{name:<60}{'only in ' + ('results' if key in results else 'baseline'):>36}")
+            continue
+
+        old = baseline[key]["p50_seconds"]
+        new = results[key]["p50_seconds"]
+        change = (new - old) / old if old > 0 else 0.0
+        marker = ""
+        if change > args.threshold:
+            marker = "  regression"
+            regressions += 1
+        print(f"{name:<60}{old * 1000:>16.1f}{new * 1000:>10.1f}{change:>+10.1%}{marker}")
+
+    if regressions:
+        print(f"[{regressions}] benchmarks regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import argparse
+import os
+from typing import List
+
+from ariadne.util import get_memory_usage
+
+
+def find_children(pid: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+
+        try:
+            with open(f"/proc/{entry}/stat", encoding="ascii") as f:
+                stat = f.read()
+        except OSError:
+            continue
+
+        # The process name is in parentheses and may contain spaces, the parent pid is the second field after it
+        if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+            children.append(int(entry))
+
+    return sorted(children)
+
+
+def print_report(master_pid: int):
+    print(f"{'process':<16}{'rss MB':>10}{'pss MB':>10}{'shared MB':>12}{'private MB':>12}")
+
+    total_pss = 0
+    for label, pid in [("master", master_pid)] + [(f"worker {pid}", pid) for pid in find_children(master_pid)]:
+        usage = get_memory_usage(pid)
+        if usage is None:
+            print(f"{label:<16}{'n/a':>10}")
+            continue
+
+        total_pss += usage.pss
+        rss, pss, shared, private = (
+            value / (1024 * 1024) for value in (usage.rss, usage.pss, usage.shared, usage.private)
+        )
+        print(f"{label:<16}{rss:>10.1f}{pss:>10.1f}{shared:>12.1f}{private:>12.1f}")
+
+    print(f"Total memory (sum of pss): {total_pss / (1024 * 1024):.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shows unique and shared memory of a gunicorn master and its workers.")
+    parser.add_argument("pid", type=int, help="The pid of the gunicorn master process.")
+    args = parser.parse_args()
+
+    print_report(args.pid)
+
+
+if __name__ == "__main__":
+    main()
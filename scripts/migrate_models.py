@@ -0,0 +1,47 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import argparse
+from pathlib import Path
+
+import ariadne
+from ariadne.classifier import migrate_model_file
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rewrites saved models so that they can be memory mapped. Stop the server before running this."
+    )
+    parser.add_argument(
+        "model_directory", nargs="?", type=Path, default=ariadne.model_directory, help="The model directory."
+    )
+    parser.add_argument("--force", action="store_true", help="Rewrite all models, also those already migrated.")
+    args = parser.parse_args()
+
+    migrated = 0
+    model_paths = [
+        *args.model_directory.glob("*/model_*.joblib"),
+        *args.model_directory.glob("*/model_*.versions/*.joblib"),
+    ]
+    for model_path in sorted(model_paths):
+        if migrate_model_file(model_path, args.force):
+            print(f"Migrated [{model_path}]")
+            migrated += 1
+
+    print(f"Migrated [{migrated}] models")
+
+
+if __name__ == "__main__":
+    main()
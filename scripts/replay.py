@@ -0,0 +1,141 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import argparse
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from ariadne.capture import CapturedRequest, read_archives
+from tester import LoadReport
+
+
+def find_archives(paths: List[Path]) -> List[Path]:
+    archives = []
+    for path in paths:
+        archives.extend(sorted(path.glob("capture-*.jsonl.gz")) if path.is_dir() else [path])
+    return archives
+
+
+def send(url: str, captured: CapturedRequest, classifier: Optional[str], timeout: float) -> str:
+    path = captured.path
+    if classifier is not None:
+        path = f"/{classifier}/{captured.endpoint}"
+    if captured.query:
+        path = f"{path}?{captured.query}"
+
+    req = urllib.request.Request(
+        url.rstrip("/") + path,
+        data=captured.body.encode("utf-8"),
+        headers={"content-type": captured.content_type or "application/json"},
+        method=captured.method,
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            return str(response.status)
+    except urllib.error.HTTPError as e:
+        return str(e.code)
+    except (urllib.error.URLError, OSError) as e:
+        return type(getattr(e, "reason", e)).__name__
+
+
+def replay(
+    url: str,
+    requests: List[CapturedRequest],
+    speed: float,
+    concurrency: int,
+    classifier: Optional[str],
+    timeout: float,
+) -> LoadReport:
+    report = LoadReport()
+
+    def _send(captured: CapturedRequest, scheduled: float):
+        status = send(url, captured, classifier, timeout)
+        report.record(captured.endpoint, status, time.perf_counter() - scheduled)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        first = requests[0].timestamp if requests else 0.0
+        for captured in requests:
+            # Latencies are measured from when a request should have been sent, also if all connections were busy
+            scheduled = start + (captured.timestamp - first) / speed if speed > 0 else time.perf_counter()
+            time.sleep(max(scheduled - time.perf_counter(), 0))
+            executor.submit(_send, captured, scheduled)
+
+    report.finished = time.perf_counter()
+    return report
+
+
+def print_recorded(requests: List[CapturedRequest]):
+    recorded = LoadReport()
+    for captured in requests:
+        if captured.duration_seconds is not None:
+            recorded.record(captured.endpoint, str(captured.status), captured.duration_seconds)
+    # The throughput is that over the recorded time span, which is at least a second so that it stays meaningful
+    recorded.finished = recorded.started + max(requests[-1].timestamp - requests[0].timestamp, 1.0)
+
+    print("Recorded:")
+    recorded.print()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sends requests recorded by a server with `capture_directory` to a server again."
+    )
+    parser.add_argument("archives", nargs="+", type=Path, help="Archives or directories containing them.")
+    parser.add_argument("--url", default="http://localhost:5000", help="Base URL of the recommender.")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Replay speed relative to the recorded timing, e.g. 2 for twice as fast, 0 for as fast as possible.",
+    )
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum number of requests in flight.")
+    parser.add_argument("-c", "--classifier", help="Send all requests to this classifier instead of the recorded one.")
+    parser.add_argument(
+        "--endpoint", choices=["predict", "train"], action="append", help="Only replay these endpoints."
+    )
+    parser.add_argument("--limit", type=int, help="Replay at most this many requests.")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds after which a request fails.")
+    parser.add_argument("--report", type=Path, help="Also write the report as JSON to this file.")
+    args = parser.parse_args()
+
+    requests = read_archives(find_archives(args.archives))
+    if args.endpoint:
+        requests = [captured for captured in requests if captured.endpoint in args.endpoint]
+    if args.limit is not None:
+        requests = requests[: args.limit]
+    if not requests:
+        print("No requests found")
+        return
+
+    print_recorded(requests)
+    span = requests[-1].timestamp - requests[0].timestamp
+    print(f"\nReplaying [{len(requests)}] requests recorded over [{span:.1f}]s to [{args.url}] at speed [{args.speed}]")
+    report = replay(args.url, requests, args.speed, args.concurrency, args.classifier, args.timeout)
+    report.print()
+
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report.to_json(), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
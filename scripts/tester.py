@@ -15,31 +15,44 @@
 # limitations under the License.
 import argparse
 import json
+import math
+import random
+import threading
+import time
+import urllib.error
 import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from http.client import HTTPResponse
-from typing import Any
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 
 from cassis import load_typesystem, load_cas_from_xmi
 
+DEFAULT_URL = "http://localhost:5000"
+DEFAULT_CLASSIFIER = "sklearn_sentence"
+TRAIN_REQUEST = "examples/requests/training_sentence_sentiment.json"
+PREDICT_REQUEST = "examples/requests/predict_sentence_sentiment.json"
 
-def send_train_request(path_to_json: str, user: str):
+
+def send_train_request(path_to_json: str, user: str, url: str = DEFAULT_URL, classifier: str = DEFAULT_CLASSIFIER):
     with open(path_to_json) as f:
         json_data = json.load(f)
 
     for document in json_data["documents"]:
         document["userId"] = user
 
-    response = _send_json("http://localhost:5000/sklearn_sentence/train", json_data)
+    response = _send_json(f"{url}/{classifier}/train", json_data)
     print(response.status)
     print(response.reason)
 
 
-def send_predict_request(path_to_json: str, user: str):
+def send_predict_request(path_to_json: str, user: str, url: str = DEFAULT_URL, classifier: str = DEFAULT_CLASSIFIER):
     with open(path_to_json) as f:
         json_data = json.load(f)
 
     json_data["document"]["userId"] = user
-    response = _send_json("http://localhost:5000/sklearn_sentence/predict", json_data)
+    response = _send_json(f"{url}/{classifier}/predict", json_data)
     body = json.load(response)
 
     typesystem = load_typesystem(json_data["typeSystem"])
@@ -59,18 +72,291 @@ def _send_json(url: str, body: Any) -> HTTPResponse:
     return urllib.request.urlopen(req)
 
 
+class Workload:
+    """The requests the simulated annotators send, each annotator is a user of its own.
+
+    Predictions are requested for a random document of the user, trainings send all documents of the user, as
+    INCEpTION does.
+    """
+
+    def __init__(self, metadata: Dict[str, Any], typesystem_xml: str, documents: List[str]):
+        self._metadata = metadata
+        self._typesystem_xml = typesystem_xml
+        self._documents = documents
+        self._train_bodies: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_examples(cls, train_path: str, predict_path: str) -> "Workload":
+        with open(train_path, encoding="utf-8") as f:
+            train_data = json.load(f)
+        with open(predict_path, encoding="utf-8") as f:
+            predict_data = json.load(f)
+
+        documents = [document["xmi"] for document in train_data["documents"]] + [predict_data["document"]["xmi"]]
+        return cls(predict_data["metadata"], predict_data["typeSystem"], documents)
+
+    @classmethod
+    def from_directory(cls, directory: Path, typesystem_path: Path, layer: str, feature: str) -> "Workload":
+        documents = [path.read_text(encoding="utf-8") for path in sorted(directory.glob("*.xmi"))]
+        if not documents:
+            raise ValueError(f"No XMI files found in [{directory}]")
+
+        metadata = {"layer": layer, "feature": feature, "projectId": 0}
+        return cls(metadata, typesystem_path.read_text(encoding="utf-8"), documents)
+
+    def predict_body(self, user: str, rng: random.Random) -> bytes:
+        document_id = rng.randrange(len(self._documents))
+        body = {
+            "metadata": self._metadata,
+            "typeSystem": self._typesystem_xml,
+            "document": {"xmi": self._documents[document_id], "documentId": document_id, "userId": user},
+        }
+        return json.dumps(body).encode("utf-8")
+
+    def train_body(self, user: str) -> bytes:
+        with self._lock:
+            if user not in self._train_bodies:
+                body = {
+                    "metadata": self._metadata,
+                    "typeSystem": self._typesystem_xml,
+                    "documents": [
+                        {"xmi": xmi, "documentId": i, "userId": user} for i, xmi in enumerate(self._documents)
+                    ],
+                }
+                self._train_bodies[user] = json.dumps(body).encode("utf-8")
+            return self._train_bodies[user]
+
+
+class LoadReport:
+    """Collects the outcome of every request of a load test."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, List[float]] = defaultdict(list)
+        self._statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def record(self, endpoint: str, status: str, latency: float):
+        with self._lock:
+            self._latencies[endpoint].append(latency)
+            self._statuses[endpoint][status] += 1
+
+    def to_json(self) -> Dict[str, Any]:
+        duration = (self.finished or time.perf_counter()) - self.started
+        with self._lock:
+            endpoints = {}
+            for endpoint, latencies in sorted(self._latencies.items()):
+                statuses = dict(self._statuses[endpoint])
+                count = len(latencies)
+                errors = sum(n for status, n in statuses.items() if not status.startswith("2"))
+                latencies = sorted(latencies)
+                endpoints[endpoint] = {
+                    "requests": count,
+                    "throughput": count / duration,
+                    "p50_seconds": _percentile(latencies, 50),
+                    "p95_seconds": _percentile(latencies, 95),
+                    "p99_seconds": _percentile(latencies, 99),
+                    "error_rate": errors / count,
+                    "rate_429": statuses.get("429", 0) / count,
+                    "rate_503": statuses.get("503", 0) / count,
+                    "statuses": statuses,
+                }
+        return {"duration_seconds": duration, "endpoints": endpoints}
+
+    def print(self):
+        report = self.to_json()
+        print(f"Duration: {report['duration_seconds']:.1f}s")
+        print(
+            f"{'endpoint':<10}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            f"{'errors':>10}{'429':>8}{'503':>8}"
+        )
+        for endpoint, stats in report["endpoints"].items():
+            print(
+                f"{endpoint:<10}{stats['requests']:>10}{stats['throughput']:>10.1f}"
+                f"{stats['p50_seconds'] * 1000:>10.0f}{stats['p95_seconds'] * 1000:>10.0f}"
+                f"{stats['p99_seconds'] * 1000:>10.0f}{stats['error_rate']:>10.1%}{stats['rate_429']:>8.1%}"
+                f"{stats['rate_503']:>8.1%}"
+            )
+            print(f"{'':<10}statuses: {stats['statuses']}")
+
+
+class LoadGenerator:
+    """Simulates annotators that request predictions and, every now and then, trainings.
+
+    In a closed loop every annotator sends its next request `think_time` seconds after the previous one returned, so
+    the load adapts to how fast the server answers. In an open loop requests arrive at `rate` per second regardless
+    of the responses, like a large number of independent users; their latency is measured from when they should
+    have been sent, so that a saturated load generator does not hide queueing.
+
+    Args:
+        url: Base URL of the server
+        classifier: The classifier to send the requests to
+        workload: The requests to send
+        annotators: Number of simulated annotators, in an open loop also the maximum number of concurrent requests
+        train_ratio: Fraction of the requests that are trainings
+        think_time: Seconds an annotator waits between two requests in a closed loop
+        rate (optional): Requests per second of an open loop, `None` runs a closed loop
+        timeout: Seconds after which a request is counted as failed
+        seed: Seed for choosing documents and request types
+    """
+
+    def __init__(
+        self,
+        url: str,
+        classifier: str,
+        workload: Workload,
+        annotators: int = 4,
+        train_ratio: float = 0.1,
+        think_time: float = 1.0,
+        rate: Optional[float] = None,
+        timeout: float = 60.0,
+        seed: int = 0,
+    ):
+        self._url = url.rstrip("/")
+        self._classifier = classifier
+        self._workload = workload
+        self._annotators = annotators
+        self._train_ratio = train_ratio
+        self._think_time = think_time
+        self._rate = rate
+        self._timeout = timeout
+        self._seed = seed
+
+    def run(self, duration: float) -> LoadReport:
+        report = LoadReport()
+        deadline = time.perf_counter() + duration
+        if self._rate is None:
+            self._run_closed_loop(report, deadline)
+        else:
+            self._run_open_loop(report, deadline)
+        report.finished = time.perf_counter()
+        return report
+
+    def _run_closed_loop(self, report: LoadReport, deadline: float):
+        def annotate(index: int):
+            rng = random.Random(self._seed * 1000003 + index)
+            # Annotators start spread out instead of all at once
+            time.sleep(rng.uniform(0, self._think_time))
+            while time.perf_counter() < deadline:
+                self._send(report, f"annotator-{index}", rng, time.perf_counter())
+                time.sleep(rng.expovariate(1 / self._think_time) if self._think_time > 0 else 0)
+
+        threads = [threading.Thread(target=annotate, args=(i,), daemon=True) for i in range(self._annotators)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _run_open_loop(self, report: LoadReport, deadline: float):
+        rng = random.Random(self._seed)
+        with ThreadPoolExecutor(max_workers=self._annotators) as executor:
+            scheduled = time.perf_counter()
+            while True:
+                # Poisson arrivals
+                scheduled += rng.expovariate(self._rate)
+                if scheduled >= deadline:
+                    break
+                time.sleep(max(scheduled - time.perf_counter(), 0))
+
+                user = f"annotator-{rng.randrange(self._annotators)}"
+                request_rng = random.Random(rng.random())
+                executor.submit(self._send, report, user, request_rng, scheduled)
+
+    def _send(self, report: LoadReport, user: str, rng: random.Random, scheduled: float):
+        if rng.random() < self._train_ratio:
+            endpoint, body = "train", self._workload.train_body(user)
+        else:
+            endpoint, body = "predict", self._workload.predict_body(user, rng)
+
+        req = urllib.request.Request(
+            f"{self._url}/{self._classifier}/{endpoint}", data=body, headers={"content-type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self._timeout) as response:
+                response.read()
+                status = str(response.status)
+        except urllib.error.HTTPError as e:
+            status = str(e.code)
+        except (urllib.error.URLError, OSError) as e:
+            status = type(getattr(e, "reason", e)).__name__
+
+        report.record(endpoint, status, time.perf_counter() - scheduled)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(math.ceil(q / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def run_load_test(args: argparse.Namespace):
+    if args.documents is not None:
+        if args.typesystem is None or args.layer is None or args.feature is None:
+            raise ValueError("--documents requires --typesystem, --layer and --feature")
+        workload = Workload.from_directory(args.documents, args.typesystem, args.layer, args.feature)
+    else:
+        workload = Workload.from_examples(TRAIN_REQUEST, PREDICT_REQUEST)
+
+    generator = LoadGenerator(
+        args.url,
+        args.classifier,
+        workload,
+        annotators=args.annotators,
+        train_ratio=args.train_ratio,
+        think_time=args.think_time,
+        rate=args.rate,
+        timeout=args.timeout,
+        seed=args.seed,
+    )
+    mode = f"open loop at {args.rate} requests/s" if args.rate is not None else "closed loop"
+    print(f"Running {mode} with {args.annotators} annotators against [{args.url}/{args.classifier}]")
+    report = generator.run(args.duration)
+    report.print()
+
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report.to_json(), f, indent=2)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Test your INCEpTION external recommender.")
-    parser.add_argument("request_type", choices=["train", "predict"], help="The request type you want to use.")
+    parser.add_argument(
+        "request_type",
+        choices=["train", "predict", "load"],
+        help="The request type you want to use, `load` simulates annotators sending both.",
+    )
     parser.add_argument("-u", "--user", default="admin", help="The user issuing the request.")
+    parser.add_argument("--url", default=DEFAULT_URL, help="Base URL of the recommender.")
+    parser.add_argument("-c", "--classifier", default=DEFAULT_CLASSIFIER, help="The classifier to send requests to.")
+
+    load = parser.add_argument_group("load test")
+    load.add_argument("-n", "--annotators", type=int, default=4, help="Number of simulated annotators.")
+    load.add_argument("-d", "--duration", type=float, default=60.0, help="Seconds to run the load test.")
+    load.add_argument("--train-ratio", type=float, default=0.1, help="Fraction of requests that are trainings.")
+    load.add_argument(
+        "--think-time", type=float, default=1.0, help="Mean seconds between requests of an annotator (closed loop)."
+    )
+    load.add_argument(
+        "--rate", type=float, help="Requests per second arriving regardless of responses (open loop) instead."
+    )
+    load.add_argument("--timeout", type=float, default=60.0, help="Seconds after which a request fails.")
+    load.add_argument("--seed", type=int, default=0, help="Seed for choosing documents and request types.")
+    load.add_argument("--documents", type=Path, help="Directory of XMI files to use instead of the examples.")
+    load.add_argument("--typesystem", type=Path, help="Type system of the XMI files in --documents.")
+    load.add_argument("--layer", help="Layer to predict for the XMI files in --documents.")
+    load.add_argument("--feature", help="Feature to predict for the XMI files in --documents.")
+    load.add_argument("--report", type=Path, help="Also write the report as JSON to this file.")
     args = parser.parse_args()
 
     if args.request_type == "train":
-        path_to_json = "examples/requests/training_sentence_sentiment.json"
-        send_train_request(path_to_json, args.user)
+        send_train_request(TRAIN_REQUEST, args.user, args.url, args.classifier)
     elif args.request_type == "predict":
-        path_to_json = "examples/requests/predict_sentence_sentiment.json"
-        send_predict_request(path_to_json, args.user)
+        send_predict_request(PREDICT_REQUEST, args.user, args.url, args.classifier)
+    elif args.request_type == "load":
+        run_load_test(args)
     else:
         raise ValueError(f"Invalid request type: [{args.request_type}]")
 
@@ -0,0 +1,132 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import pytest
+
+from tests.performance.synthetic import SyntheticConfig
+
+# Results of all benchmarks of a session are written to this file, compare two of them with
+# `python scripts/compare_benchmarks.py <baseline> <results>`
+RESULTS_FILE = Path(os.environ.get("ARIADNE_BENCHMARK_RESULTS", "benchmark-results.json"))
+REPETITIONS = int(os.environ.get("ARIADNE_BENCHMARK_REPETITIONS", "10"))
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    # Nearest rank, which is what people expect for the small sample sizes of benchmarks
+    index = max(math.ceil(q / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+class BenchmarkRecorder:
+    def __init__(self, config: SyntheticConfig):
+        self.config = config
+        self.results: List[Dict[str, Any]] = []
+
+    def measure(
+        self,
+        name: str,
+        fn: Callable[[], Any],
+        items: int = 1,
+        unit: str = "calls",
+        repetitions: Optional[int] = None,
+        setup: Optional[Callable[[], Any]] = None,
+        **params: Any,
+    ) -> Dict[str, Any]:
+        """Runs `fn` repeatedly after a warm-up run and records its latency percentiles and throughput.
+
+        Args:
+            name: Identifies the benchmark in the results, together with `params`
+            fn: The code to measure, called with the result of `setup` if given
+            items: How many `unit`s one call of `fn` processes, e.g. documents or tokens
+            unit: What is counted by the throughput
+            repetitions (optional): Number of measured runs
+            setup (optional): Called before each run without being measured, e.g. to create fresh input
+        """
+        repetitions = repetitions or REPETITIONS
+        durations = []
+        for i in range(repetitions + 1):
+            args = (setup(),) if setup is not None else ()
+            start = time.perf_counter()
+            fn(*args)
+            duration = time.perf_counter() - start
+            if i > 0:
+                durations.append(duration)
+
+        durations.sort()
+        mean = sum(durations) / len(durations)
+        result = {
+            "name": name,
+            "params": params,
+            "repetitions": repetitions,
+            "unit": unit,
+            "items": items,
+            "throughput": items / mean if mean > 0 else None,
+            "mean_seconds": mean,
+            "min_seconds": durations[0],
+            "p50_seconds": percentile(durations, 50),
+            "p95_seconds": percentile(durations, 95),
+            "p99_seconds": percentile(durations, 99),
+        }
+        self.results.append(result)
+        print(
+            f"{name} {params}: p50 {result['p50_seconds'] * 1000:.1f} ms, p99 {result['p99_seconds'] * 1000:.1f} ms, "
+            f"{result['throughput']:.1f} {unit}/s"
+        )
+        return result
+
+    def write(self, path: Path):
+        results = {
+            "commit": _get_commit(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": self.config.to_json(),
+            "benchmarks": self.results,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+def _get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@pytest.fixture(scope="session")
+def synthetic_config() -> SyntheticConfig:
+    return SyntheticConfig.from_environment()
+
+
+@pytest.fixture(scope="session")
+def benchmark(synthetic_config):
+    recorder = BenchmarkRecorder(synthetic_config)
+    yield recorder
+    if recorder.results:
+        recorder.write(RESULTS_FILE)
+        print(f"\nWrote {len(recorder.results)} benchmark results to [{RESULTS_FILE}]")
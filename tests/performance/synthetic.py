@@ -0,0 +1,150 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Generates synthetic documents of configurable size for the benchmarks."""
+
+import os
+import random
+from typing import Any, Dict
+
+import attr
+from cassis import Cas, TypeSystem
+from cassis.typesystem import TYPE_NAME_BOOLEAN, TYPE_NAME_STRING
+
+from ariadne.contrib.inception_util import IS_PREDICTION, SENTENCE_TYPE, TOKEN_TYPE
+from ariadne.protocol import CAS_FORMAT_XMI, serialize_cas
+
+LAYER = "webanno.custom.SyntheticSpan"
+SENTENCE_LAYER = "webanno.custom.SyntheticSentence"
+FEATURE = "value"
+PROJECT_ID = "benchmark"
+USER_ID = "benchmark_user"
+
+_WORDS = [f"w{i}" for i in range(2000)]
+
+
+@attr.s(frozen=True)
+class SyntheticConfig:
+    """Size of the generated documents, the defaults can be changed via `ARIADNE_BENCHMARK_<FIELD>` variables.
+
+    Args:
+        tokens: Tokens per document
+        tokens_per_sentence: Length of each sentence, sentences are not split across documents
+        annotation_density: Fraction of tokens annotated on the benchmarked layer
+        extra_types: Additional types in the type system that are not used by the documents
+        labels: Number of distinct labels of the annotations
+        documents: Number of documents of training requests
+        seed: Seed for the random choice of words and labels
+    """
+
+    tokens: int = attr.ib(default=2000)
+    tokens_per_sentence: int = attr.ib(default=20)
+    annotation_density: float = attr.ib(default=0.1)
+    extra_types: int = attr.ib(default=50)
+    labels: int = attr.ib(default=8)
+    documents: int = attr.ib(default=5)
+    seed: int = attr.ib(default=0)
+
+    @classmethod
+    def from_environment(cls) -> "SyntheticConfig":
+        overrides = {}
+        for field in attr.fields(cls):
+            value = os.environ.get(f"ARIADNE_BENCHMARK_{field.name.upper()}")
+            if value is not None:
+                overrides[field.name] = type(field.default)(value)
+        return cls(**overrides)
+
+    def to_json(self) -> Dict[str, Any]:
+        return attr.asdict(self)
+
+
+def build_typesystem(config: SyntheticConfig) -> TypeSystem:
+    typesystem = TypeSystem()
+    typesystem.create_type(SENTENCE_TYPE)
+    typesystem.create_type(TOKEN_TYPE)
+
+    for layer in (LAYER, SENTENCE_LAYER):
+        span_type = typesystem.create_type(layer)
+        typesystem.create_feature(span_type, FEATURE, TYPE_NAME_STRING)
+        typesystem.create_feature(span_type, IS_PREDICTION, TYPE_NAME_BOOLEAN)
+
+    for i in range(config.extra_types):
+        extra_type = typesystem.create_type(f"synthetic.Type{i}")
+        typesystem.create_feature(extra_type, "value", TYPE_NAME_STRING)
+
+    return typesystem
+
+
+def generate_cas(config: SyntheticConfig, typesystem: TypeSystem, index: int = 0) -> Cas:
+    """Generates a document with sentences and tokens. Depending on the annotation density, tokens are labelled on
+    `LAYER` and sentences on `SENTENCE_LAYER`."""
+    rng = random.Random(config.seed * 1000003 + index)
+    Sentence = typesystem.get_type(SENTENCE_TYPE)
+    Token = typesystem.get_type(TOKEN_TYPE)
+    Span = typesystem.get_type(LAYER)
+    SentenceSpan = typesystem.get_type(SENTENCE_LAYER)
+
+    words = [rng.choice(_WORDS) for _ in range(config.tokens)]
+    cas = Cas(typesystem=typesystem)
+    cas.sofa_string = " ".join(words)
+
+    offset = 0
+    sentence_begin = 0
+    sentence_first_word = words[0] if words else None
+    for i, word in enumerate(words):
+        end = offset + len(word)
+        cas.add(Token(begin=offset, end=end))
+        if rng.random() < config.annotation_density:
+            # Labels depend on the word, so that recommenders have something to learn
+            cas.add(Span(begin=offset, end=end, value=f"L{int(word[1:]) % config.labels}"))
+        if (i + 1) % config.tokens_per_sentence == 0 or i == len(words) - 1:
+            cas.add(Sentence(begin=sentence_begin, end=end))
+            if rng.random() < config.annotation_density:
+                label = f"S{int(sentence_first_word[1:]) % config.labels}"
+                cas.add(SentenceSpan(begin=sentence_begin, end=end, value=label))
+            sentence_begin = end + 1
+            sentence_first_word = words[i + 1] if i + 1 < len(words) else None
+        offset = end + 1
+
+    return cas
+
+
+def generate_training_request(config: SyntheticConfig, cas_format: str = CAS_FORMAT_XMI) -> Dict[str, Any]:
+    """Returns the JSON of a training request with `config.documents` synthetic documents."""
+    typesystem = build_typesystem(config)
+    documents = [
+        {
+            "xmi": serialize_cas(generate_cas(config, typesystem, i), cas_format),
+            "documentId": i,
+            "userId": USER_ID,
+        }
+        for i in range(config.documents)
+    ]
+    return {
+        "metadata": {"layer": LAYER, "feature": FEATURE, "projectId": PROJECT_ID},
+        "typeSystem": typesystem.to_xml(),
+        "documents": documents,
+    }
+
+
+def generate_prediction_request(config: SyntheticConfig, cas_format: str = CAS_FORMAT_XMI) -> Dict[str, Any]:
+    """Returns the JSON of a prediction request for a synthetic document without annotations on the layer."""
+    typesystem = build_typesystem(config)
+    cas = generate_cas(attr.evolve(config, annotation_density=0.0), typesystem, config.documents)
+    return {
+        "metadata": {"layer": LAYER, "feature": FEATURE, "projectId": PROJECT_ID},
+        "typeSystem": typesystem.to_xml(),
+        "document": {"xmi": serialize_cas(cas, cas_format), "documentId": config.documents, "userId": USER_ID},
+    }
@@ -0,0 +1,48 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+
+from ariadne.parallel import shutdown_executor
+from ariadne.protocol import parse_training_request
+from tests.performance.synthetic import generate_training_request
+
+pytestmark = pytest.mark.performance
+
+
+@pytest.fixture(scope="module", autouse=True)
+def executor():
+    yield
+    shutdown_executor()
+
+
+@pytest.mark.parametrize("processes", [0, 2, 4])
+def test_parse_documents(benchmark, synthetic_config, processes: int):
+    # The speedup depends on the machine and on the size of the documents, it is recorded rather than asserted,
+    # compare it between runs with scripts/compare_benchmarks.py
+    req = parse_training_request(generate_training_request(synthetic_config))
+    expected = [document.cas.to_xmi() for document in req.iter_documents()]
+
+    parsed = []
+    benchmark.measure(
+        "parse_documents",
+        lambda: parsed.append(list(req.iter_documents(processes))),
+        items=synthetic_config.documents,
+        unit="documents",
+        repetitions=3,
+        processes=processes,
+    )
+
+    assert [document.cas.to_xmi() for document in parsed[-1]] == expected
@@ -0,0 +1,112 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+from cassis import load_typesystem
+
+from ariadne.contrib.inception_util import TOKEN_TYPE, create_span_prediction
+from ariadne.protocol import (
+    CAS_FORMATS,
+    load_cas,
+    load_typesystem_cached,
+    parse_prediction_request,
+    parse_training_request,
+    serialize_cas,
+)
+from tests.performance.synthetic import (
+    FEATURE,
+    LAYER,
+    build_typesystem,
+    generate_cas,
+    generate_prediction_request,
+    generate_training_request,
+)
+
+pytestmark = pytest.mark.performance
+
+
+@pytest.mark.parametrize("cas_format", CAS_FORMATS)
+def test_parse_prediction_request(benchmark, synthetic_config, cas_format):
+    json_data = generate_prediction_request(synthetic_config, cas_format)
+
+    benchmark.measure(
+        "parse_prediction_request",
+        lambda: parse_prediction_request(json_data),
+        items=synthetic_config.tokens,
+        unit="tokens",
+        cas_format=cas_format,
+    )
+
+
+def test_parse_training_request(benchmark, synthetic_config):
+    json_data = generate_training_request(synthetic_config)
+
+    benchmark.measure(
+        "parse_training_request",
+        lambda: parse_training_request(json_data).parse_documents(),
+        items=synthetic_config.documents,
+        unit="documents",
+        repetitions=3,
+    )
+
+
+def test_load_typesystem(benchmark, synthetic_config):
+    typesystem_xml = build_typesystem(synthetic_config).to_xml()
+
+    # Uncached, as for a new project or a changed layer configuration
+    benchmark.measure("load_typesystem", lambda: load_typesystem(typesystem_xml))
+    benchmark.measure("load_typesystem_cached", lambda: load_typesystem_cached(typesystem_xml))
+
+
+@pytest.mark.parametrize("cas_format", CAS_FORMATS)
+def test_serialize_cas(benchmark, synthetic_config, cas_format):
+    # Compare the results of both formats to choose the one to send documents in
+    typesystem = build_typesystem(synthetic_config)
+    cas = generate_cas(synthetic_config, typesystem)
+    source = serialize_cas(cas, cas_format)
+    assert load_cas(source, typesystem, cas_format).to_xmi() == cas.to_xmi()
+
+    benchmark.measure(
+        "serialize_cas",
+        lambda: serialize_cas(cas, cas_format),
+        items=synthetic_config.tokens,
+        unit="tokens",
+        cas_format=cas_format,
+    )
+    benchmark.measure(
+        "load_cas",
+        lambda: load_cas(source, typesystem, cas_format),
+        items=synthetic_config.tokens,
+        unit="tokens",
+        cas_format=cas_format,
+    )
+
+
+def test_create_predictions(benchmark, synthetic_config):
+    typesystem = build_typesystem(synthetic_config)
+    cas = generate_cas(synthetic_config, typesystem)
+    tokens = cas.select(TOKEN_TYPE)
+
+    def create_predictions(target):
+        for token in tokens:
+            target.add(create_span_prediction(target, LAYER, FEATURE, token.begin, token.end, "L0"))
+
+    benchmark.measure(
+        "create_span_prediction",
+        create_predictions,
+        setup=lambda: load_cas(cas.to_xmi(), typesystem),
+        items=len(tokens),
+        unit="predictions",
+    )
@@ -0,0 +1,83 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+
+import attr
+import pytest
+
+from ariadne.protocol import TrainingDocument, load_cas
+from ariadne.store import LocalModelStore
+from tests.performance.synthetic import (
+    FEATURE,
+    LAYER,
+    PROJECT_ID,
+    SENTENCE_LAYER,
+    USER_ID,
+    build_typesystem,
+    generate_cas,
+)
+
+pytestmark = pytest.mark.performance
+
+# Recommenders that can be trained on the synthetic documents without downloading models, those whose dependencies
+# are not installed are skipped
+RECOMMENDERS = [
+    ("ariadne.demo.demo_string_feature:DemoStringFeatureRecommender", LAYER),
+    ("ariadne.contrib.sklearn:SklearnSentenceClassifier", SENTENCE_LAYER),
+    ("ariadne.contrib.sklearn:SklearnMentionDetector", LAYER),
+    ("ariadne.contrib.stringmatcher:LevenshteinStringMatcher", LAYER),
+]
+
+
+def _create_recommender(path: str, tmp_path):
+    module_name, class_name = path.split(":")
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as e:
+        pytest.skip(f"Dependencies of [{path}] are not installed: {e}")
+
+    return getattr(module, class_name)(model_store=LocalModelStore(tmp_path / "models"))
+
+
+@pytest.mark.parametrize("path, layer", RECOMMENDERS)
+def test_recommender_fit_and_predict(benchmark, synthetic_config, tmp_path, path, layer):
+    recommender = _create_recommender(path, tmp_path)
+    typesystem = build_typesystem(synthetic_config)
+    documents = [
+        TrainingDocument(generate_cas(synthetic_config, typesystem, i), i, USER_ID)
+        for i in range(synthetic_config.documents)
+    ]
+    name = path.split(":")[1]
+
+    benchmark.measure(
+        "fit",
+        lambda: recommender.fit(documents, layer, FEATURE, PROJECT_ID, USER_ID),
+        items=len(documents),
+        unit="documents",
+        repetitions=3,
+        recommender=name,
+    )
+
+    # Predict on unannotated copies so that every run creates the same predictions
+    xmi = generate_cas(attr.evolve(synthetic_config, annotation_density=0.0), typesystem).to_xmi()
+    benchmark.measure(
+        "predict",
+        lambda cas: recommender.predict(cas, layer, FEATURE, PROJECT_ID, "document", USER_ID),
+        setup=lambda: load_cas(xmi, typesystem),
+        items=synthetic_config.tokens,
+        unit="tokens",
+        recommender=name,
+    )
@@ -0,0 +1,73 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+
+import pytest
+
+from ariadne.admission import ConcurrencyLimiter, OverloadedError
+
+
+def test_requests_beyond_queue_are_rejected():
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_queued=1)
+    entered = threading.Event()
+    release = threading.Event()
+    admitted = []
+
+    def _hold():
+        with limiter.acquire():
+            entered.set()
+            release.wait(10)
+
+    def _wait():
+        with limiter.acquire():
+            admitted.append(True)
+
+    holder = threading.Thread(target=_hold)
+    holder.start()
+    assert entered.wait(10)
+
+    waiter = threading.Thread(target=_wait)
+    waiter.start()
+    while limiter.queued == 0:
+        pass
+
+    with pytest.raises(OverloadedError):
+        with limiter.acquire():
+            pass
+
+    release.set()
+    holder.join(10)
+    waiter.join(10)
+    assert admitted == [True]
+    assert limiter.active == 0
+    assert limiter.queued == 0
+
+
+def test_requests_waiting_too_long_are_rejected():
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_queued=1, max_wait=0.01)
+
+    with limiter.acquire():
+        with pytest.raises(OverloadedError):
+            with limiter.acquire():
+                pass
+
+    with limiter.acquire():
+        assert limiter.active == 1
+
+
+def test_invalid_limit():
+    with pytest.raises(ValueError):
+        ConcurrencyLimiter(max_concurrent=0)
@@ -0,0 +1,261 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import threading
+import time
+
+from ariadne.cache import LruCache, ModelCache, ResourceCache, SingleFlight
+
+
+def test_lru_cache_evicts_least_recently_used():
+    sut = LruCache(max_entries=2)
+    sut.put("a", 1)
+    sut.put("b", 2)
+    assert sut.get("a") == 1
+
+    sut.put("c", 3)
+
+    assert "a" in sut
+    assert "b" not in sut
+    assert "c" in sut
+    assert sut.stats().evictions == 1
+
+
+def test_lru_cache_respects_weight_budget():
+    sut = LruCache(max_entries=10, max_weight=10)
+    sut.put("a", 1, weight=6)
+    sut.put("b", 2, weight=6)
+    sut.put("too_big", 3, weight=11)
+
+    assert "a" not in sut
+    assert "b" in sut
+    assert "too_big" not in sut
+    assert sut.stats().weight == 6
+
+
+def test_lru_cache_configure_keeps_limits_not_passed():
+    sut = LruCache(max_entries=10, max_weight=100)
+
+    sut.configure(max_entries=2)
+    for i in range(3):
+        sut.put(i, i, weight=60)
+    assert sut.stats().weight <= 100
+
+    sut.configure(max_weight=None)
+    for i in range(3):
+        sut.put(i, i, weight=60)
+    assert len(sut) == 2
+    assert sut.stats().weight == 120
+
+
+def test_lru_cache_remove_if():
+    sut = LruCache(max_weight=10)
+    for i in range(4):
+        sut.put(i, str(i), weight=2)
+
+    assert sut.remove_if(lambda key, value: key % 2 == 0 or value == "3") == 3
+    assert [key for key in range(4) if key in sut] == [1]
+    assert sut.stats().weight == 2
+
+
+def test_lru_cache_counts_hits_and_misses():
+    sut = LruCache()
+    sut.put("a", 1)
+    sut.get("a")
+    sut.get("b")
+
+    stats = sut.stats()
+    assert stats.hits == 1
+    assert stats.misses == 1
+
+
+def test_model_cache_reloads_when_file_changes(tmp_path):
+    path = tmp_path / "model"
+    path.write_text("first")
+    loads = []
+
+    def loader(p):
+        loads.append(p)
+        return p.read_text()
+
+    sut = ModelCache()
+    assert sut.load("key", path, loader) == "first"
+    assert sut.load("key", path, loader) == "first"
+    assert len(loads) == 1
+
+    tmp = tmp_path / "model.tmp"
+    tmp.write_text("second")
+    os.replace(tmp, path)
+
+    assert sut.load("key", path, loader) == "second"
+    assert len(loads) == 2
+
+
+def test_model_cache_returns_none_for_missing_file(tmp_path):
+    sut = ModelCache()
+    assert sut.load("key", tmp_path / "missing", lambda p: "model") is None
+
+
+def test_model_cache_install_replaces_model_without_loading_it(tmp_path):
+    old_path = tmp_path / "00000001"
+    old_path.write_text("old")
+    new_path = tmp_path / "00000002"
+    new_path.write_text("new")
+
+    sut = ModelCache()
+    old = sut.load("key", old_path, lambda p: p.read_text(), version=1)
+    assert sut.install("key", new_path, "trained", version=2)
+
+    assert sut.load("key", new_path, lambda p: "loaded", version=2) == "trained"
+    assert old == "old"
+    assert sut.installs == 1
+
+
+def test_model_cache_keeps_newer_version_when_older_load_finishes(tmp_path):
+    old_path = tmp_path / "00000001"
+    old_path.write_text("old")
+    new_path = tmp_path / "00000002"
+    new_path.write_text("new")
+    sut = ModelCache()
+
+    def slow_loader(p):
+        # A training publishes a newer model while the old one is still being loaded
+        assert sut.install("key", new_path, "trained", version=2)
+        return p.read_text()
+
+    assert sut.load("key", old_path, slow_loader, version=1) == "old"
+    assert not sut.install("key", old_path, "stale", version=1)
+    assert sut.load("key", new_path, lambda p: "loaded", version=2) == "trained"
+
+
+def test_model_cache_discard_older_keeps_current_version(tmp_path):
+    path = tmp_path / "00000002"
+    path.write_text("model")
+    sut = ModelCache()
+    sut.install("key", path, "model", version=2)
+
+    sut.discard_older("key", 2)
+    assert sut.stats().entries == 1
+
+    sut.discard_older("key", 3)
+    assert sut.stats().entries == 0
+
+
+def test_single_flight_shares_result_of_concurrent_calls():
+    sut = SingleFlight()
+    started = threading.Event()
+    may_finish = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        assert may_finish.wait(10)
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(sut.do("key", slow)))
+    leader.start()
+    assert started.wait(10)
+    followers = [threading.Thread(target=lambda: results.append(sut.do("key", slow))) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while sut.shared < 3:
+        time.sleep(0.001)
+    may_finish.set()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert results == ["result"] * 4
+    assert len(calls) == 1
+    # Once finished, the next call runs again
+    assert sut.do("key", lambda: "again") == "again"
+
+
+def test_single_flight_shares_exceptions():
+    sut = SingleFlight()
+    started = threading.Event()
+    may_finish = threading.Event()
+
+    def failing():
+        started.set()
+        assert may_finish.wait(10)
+        raise ValueError("broken model")
+
+    errors = []
+
+    def call():
+        try:
+            sut.do("key", failing)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    assert started.wait(10)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    while sut.shared < 1:
+        time.sleep(0.001)
+    may_finish.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 2
+
+
+def test_model_cache_loads_model_once_for_concurrent_requests(tmp_path):
+    path = tmp_path / "model"
+    path.write_text("model")
+    loading = threading.Event()
+    may_finish = threading.Event()
+    loads = []
+
+    def loader(p):
+        loads.append(p)
+        loading.set()
+        assert may_finish.wait(10)
+        return p.read_text()
+
+    sut = ModelCache()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(sut.load("key", path, loader))) for _ in range(4)]
+    threads[0].start()
+    assert loading.wait(10)
+    for thread in threads[1:]:
+        thread.start()
+    while sut.shared_loads < 3:
+        time.sleep(0.001)
+    may_finish.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["model"] * 4
+    assert len(loads) == 1
+
+
+def test_resource_cache_loads_resource_once():
+    sut = ResourceCache()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return object()
+
+    first = sut.get("featurizer", loader)
+
+    assert sut.get("featurizer", loader) is first
+    assert len(loads) == 1
@@ -0,0 +1,135 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gzip
+import json
+
+import pytest
+from flask import Flask, request
+
+from ariadne.capture import CaptureMiddleware, TrafficRecorder, read_archives
+from ariadne.compression import CompressionMiddleware
+
+
+def _create_client(recorder: TrafficRecorder):
+    app = Flask(__name__)
+
+    @app.route("/<classifier_name>/predict", methods=["POST"])
+    def predict(classifier_name):
+        return {"received": request.get_json()}
+
+    @app.route("/<classifier_name>/train", methods=["POST"])
+    def train(classifier_name):
+        request.get_json()
+        return "", 204
+
+    app.wsgi_app = CompressionMiddleware(CaptureMiddleware(app.wsgi_app, recorder))
+    return app.test_client()
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    recorder = TrafficRecorder(tmp_path, sample_rate=1.0, max_request_bytes=1000)
+    yield recorder
+    recorder.close()
+
+
+def test_requests_are_recorded(recorder, tmp_path):
+    client = _create_client(recorder)
+
+    assert client.post("/classifier/predict?x=1", json={"document": "a"}).get_json() == {"received": {"document": "a"}}
+    assert client.post("/classifier/train", json={"documents": ["b"]}).status_code == 204
+    recorder.close()
+
+    captured = read_archives(list(tmp_path.glob("capture-*.jsonl.gz")))
+    assert [c.endpoint for c in captured] == ["predict", "train"]
+    assert [json.loads(c.body) for c in captured] == [{"document": "a"}, {"documents": ["b"]}]
+    assert [c.status for c in captured] == [200, 204]
+    assert captured[0].path == "/classifier/predict"
+    assert captured[0].query == "x=1"
+    assert captured[0].duration_seconds >= 0
+
+
+def test_compressed_requests_are_recorded_decompressed(recorder, tmp_path):
+    client = _create_client(recorder)
+    body = gzip.compress(json.dumps({"document": "a"}).encode("utf-8"))
+
+    response = client.post(
+        "/classifier/predict", data=body, headers={"Content-Encoding": "gzip", "Content-Type": "application/json"}
+    )
+    recorder.close()
+
+    assert response.get_json() == {"received": {"document": "a"}}
+    assert json.loads(read_archives(list(tmp_path.iterdir()))[0].body) == {"document": "a"}
+
+
+def test_corrupt_compressed_requests_are_rejected_and_not_recorded(recorder, tmp_path):
+    client = _create_client(recorder)
+    body = gzip.compress(json.dumps({"document": "a"}).encode("utf-8"))[:-5]
+
+    response = client.post(
+        "/classifier/predict", data=body, headers={"Content-Encoding": "gzip", "Content-Type": "application/json"}
+    )
+    recorder.close()
+
+    assert response.status_code == 400
+    assert read_archives(list(tmp_path.iterdir())) == []
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_large_requests_are_not_recorded(recorder, tmp_path, compressed):
+    client = _create_client(recorder)
+    body = json.dumps({"document": "x" * 5000}).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if compressed:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+
+    response = client.post("/classifier/predict", data=body, headers=headers)
+
+    assert response.get_json() == {"received": {"document": "x" * 5000}}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_requests_are_sampled(tmp_path):
+    recorder = TrafficRecorder(tmp_path, sample_rate=0.0)
+    client = _create_client(recorder)
+
+    client.post("/classifier/predict", json={"document": "a"})
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_recording_stops_when_archive_is_full(tmp_path):
+    recorder = TrafficRecorder(tmp_path, sample_rate=1.0, max_bytes=1)
+    client = _create_client(recorder)
+
+    client.post("/classifier/predict", json={"document": "a"})
+    client.post("/classifier/predict", json={"document": "b"})
+
+    assert len(read_archives(list(tmp_path.iterdir()))) == 1
+
+
+def test_truncated_archive_can_be_read(recorder, tmp_path):
+    client = _create_client(recorder)
+    client.post("/classifier/predict", json={"document": "a"})
+    client.post("/classifier/predict", json={"document": "b"})
+
+    # Not closed, as if the process had been killed
+    (archive,) = tmp_path.iterdir()
+    copy = tmp_path / "copy.jsonl.gz"
+    copy.write_bytes(archive.read_bytes())
+
+    assert len(read_archives([copy])) == 2
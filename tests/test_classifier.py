@@ -0,0 +1,141 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+from ariadne import cache
+from ariadne.classifier import Classifier, migrate_model_file
+from ariadne.store import DirectoryModelStore
+
+
+class _DummyClassifier(Classifier):
+    pass
+
+
+def test_load_model_is_cached(tmpdir_factory, monkeypatch):
+    sut = _DummyClassifier(Path(tmpdir_factory.mktemp("models")))
+    sut._save_model("user", {"label": "PER"})
+    cache.model_cache.clear()
+
+    loads = []
+    original_load = joblib.load
+
+    def counting_load(path, **kwargs):
+        loads.append(path)
+        return original_load(path, **kwargs)
+
+    monkeypatch.setattr(joblib, "load", counting_load)
+
+    assert sut._load_model("user") == {"label": "PER"}
+    assert sut._load_model("user") == {"label": "PER"}
+    assert len(loads) == 1
+
+
+def test_save_model_invalidates_cached_model(tmpdir_factory):
+    sut = _DummyClassifier(Path(tmpdir_factory.mktemp("models")))
+    sut._save_model("user", "first")
+    assert sut._load_model("user") == "first"
+
+    sut._save_model("user", "second")
+    assert sut._load_model("user") == "second"
+
+
+def test_saved_model_is_served_without_loading_it(tmpdir_factory, monkeypatch):
+    sut = _DummyClassifier(Path(tmpdir_factory.mktemp("models")))
+    sut._save_model("user", {"label": "PER"})
+    running_prediction = sut._load_model("user")
+
+    def failing_load(path, **kwargs):
+        raise AssertionError(f"Model loaded from [{path}]")
+
+    monkeypatch.setattr(joblib, "load", failing_load)
+    trained = {"label": "ORG"}
+    sut._save_model("user", trained)
+
+    assert sut._load_model("user") is trained
+    assert running_prediction == {"label": "PER"}
+
+
+def test_load_model_without_model(tmpdir_factory):
+    sut = _DummyClassifier(Path(tmpdir_factory.mktemp("models")))
+    assert sut._load_model("user") is None
+
+
+def test_model_cache_can_be_disabled(tmpdir_factory):
+    sut = _DummyClassifier(Path(tmpdir_factory.mktemp("models")))
+    sut._save_model("user", "model")
+
+    cache.model_cache.configure(max_entries=0)
+    try:
+        assert sut._load_model("user") == "model"
+        assert cache.model_cache.stats().entries == 0
+    finally:
+        cache.model_cache.configure(max_entries=32)
+
+
+def test_model_arrays_are_memory_mapped(tmpdir_factory):
+    sut = _DummyClassifier(Path(tmpdir_factory.mktemp("models")))
+    sut._save_model("user", {"weights": np.arange(1000, dtype=np.float64)})
+    cache.model_cache.clear()
+
+    model = sut._load_model("user")
+
+    assert isinstance(model["weights"], np.memmap)
+    # Copy-on-write, changes stay private to the loaded model
+    model["weights"][0] = 42
+    model_path = sut.model_store.fetch(sut.name, "user", sut.get_model_version("user"))
+    assert joblib.load(model_path)["weights"][0] == 0
+
+
+def test_migrate_compressed_model(tmpdir_factory):
+    sut = _DummyClassifier(Path(tmpdir_factory.mktemp("models")))
+    # Written by an older version of ariadne, before models were versioned
+    model_path = sut.model_directory / sut.name / "model_user.joblib"
+    model_path.parent.mkdir(parents=True)
+    joblib.dump({"weights": np.arange(1000, dtype=np.float64)}, model_path, compress=3)
+
+    assert migrate_model_file(model_path)
+    assert not migrate_model_file(model_path)
+
+    model = sut._load_model("user")
+    assert isinstance(model["weights"], np.memmap)
+    assert model["weights"][999] == 999
+
+
+def test_model_version_changes_when_model_is_saved(tmpdir_factory):
+    sut = _DummyClassifier(Path(tmpdir_factory.mktemp("models")))
+    assert sut.get_model_version("user") is None
+
+    sut._save_model("user", "first")
+    first = sut.get_model_version("user")
+    sut._save_model("user", "second")
+
+    assert first is not None
+    assert sut.get_model_version("user") != first
+
+
+def test_models_are_shared_through_the_model_store(tmp_path):
+    first = _DummyClassifier(model_store=DirectoryModelStore(tmp_path / "shared", tmp_path / "first"))
+    second = _DummyClassifier(model_store=DirectoryModelStore(tmp_path / "shared", tmp_path / "second"))
+
+    first._save_model("user", "first")
+    assert second._load_model("user") == "first"
+    assert second.get_model_version("user") == 1
+
+    first._save_model("user", "second")
+    assert second._load_model("user") == "second"
@@ -0,0 +1,119 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gzip
+import json
+import zlib
+
+import pytest
+from flask import Flask, Response, request
+
+from ariadne.compression import CompressionMiddleware, _negotiate_encoding
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route("/echo", methods=["POST"])
+    def echo():
+        return {"received": request.get_json(), "terminated": request.environ.get("wsgi.input_terminated", False)}
+
+    @app.route("/large")
+    def large():
+        return {"text": "x" * 10000}
+
+    @app.route("/small")
+    def small():
+        return {"text": "x"}
+
+    @app.route("/stream")
+    def stream():
+        return Response((chunk for chunk in ["a" * 5000, "b" * 5000]), content_type="text/plain")
+
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=1024)
+    return app.test_client()
+
+
+def test_gzip_request_is_decompressed(client):
+    body = gzip.compress(json.dumps({"xmi": "<xmi/>" * 1000}).encode("utf-8"))
+
+    response = client.post("/echo", data=body, headers={"Content-Encoding": "gzip", "Content-Type": "application/json"})
+
+    assert response.status_code == 200
+    assert response.get_json() == {"received": {"xmi": "<xmi/>" * 1000}, "terminated": True}
+
+
+def test_unsupported_request_encoding_is_rejected(client):
+    response = client.post("/echo", data=b"...", headers={"Content-Encoding": "br", "Content-Type": "application/json"})
+
+    assert response.status_code == 415
+
+
+def test_large_responses_are_compressed(client):
+    response = client.get("/large", headers={"Accept-Encoding": "gzip, deflate"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert len(response.data) < 1000
+    assert json.loads(gzip.decompress(response.data)) == {"text": "x" * 10000}
+
+
+def test_small_or_unaccepted_responses_are_not_compressed(client):
+    assert "Content-Encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "Content-Encoding" not in client.get("/large").headers
+    assert "Content-Encoding" not in client.get("/large", headers={"Accept-Encoding": "gzip;q=0"}).headers
+
+
+def test_streamed_responses_are_compressed(client):
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert zlib.decompress(response.data, 16 + zlib.MAX_WBITS) == b"a" * 5000 + b"b" * 5000
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [("gzip", "gzip"), ("GZIP;q=0.5", "gzip"), ("*", "gzip"), ("gzip;q=0", None), ("br", None), ("", None)],
+)
+def test_negotiate_encoding(accept_encoding, expected, monkeypatch):
+    monkeypatch.setattr("ariadne.compression.zstandard", None)
+
+    assert _negotiate_encoding(accept_encoding) == expected
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b"not gzip at all", gzip.compress(b'{"text": "truncated"}')[:-10], gzip.compress(b"{}")[:10] + b"\x00" * 20],
+)
+def test_corrupt_gzip_request_is_rejected(client, body):
+    response = client.post("/echo", data=body, headers={"Content-Encoding": "gzip", "Content-Type": "application/json"})
+
+    assert response.status_code == 400
+
+
+def test_request_decompressing_to_more_than_limit_is_rejected():
+    app = Flask(__name__)
+
+    @app.route("/size", methods=["POST"])
+    def size():
+        return {"size": len(request.get_data())}
+
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, max_request_size=1000)
+    client = app.test_client()
+    headers = {"Content-Encoding": "gzip"}
+
+    assert client.post("/size", data=gzip.compress(b"a" * 1000), headers=headers).get_json() == {"size": 1000}
+    assert client.post("/size", data=gzip.compress(b"a" * 100000), headers=headers).status_code == 413
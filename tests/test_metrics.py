@@ -0,0 +1,101 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import math
+import time
+
+import pytest
+
+from ariadne import metrics
+from ariadne.metrics import MetricsRegistry
+
+
+def test_render_counter_and_gauge():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Number of requests", ["classifier"])
+    registry.gauge("queue_depth", "Queued jobs", ["classifier"], lambda: {("a",): 2})
+
+    counter.inc('say "hi"')
+    counter.inc('say "hi"', amount=2)
+
+    assert registry.render() == (
+        "# HELP requests_total Number of requests\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{classifier="say \\"hi\\""} 3\n'
+        "# HELP queue_depth Queued jobs\n"
+        "# TYPE queue_depth gauge\n"
+        'queue_depth{classifier="a"} 2\n'
+    )
+
+
+def test_render_histogram():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=[0.1, 1.0])
+
+    histogram.observe(0.05)
+    histogram.observe(0.1)
+    histogram.observe(5)
+
+    lines = registry.render().splitlines()[2:]
+    assert lines == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_sum 5.15",
+        "latency_seconds_count 3",
+    ]
+
+
+def test_render_special_values():
+    registry = MetricsRegistry()
+    values = {("nan",): math.nan, ("inf",): math.inf, ("-inf",): -math.inf, ("half",): 0.5}
+    registry.gauge("ratio", "Ratio", ["value"], lambda: values)
+
+    assert registry.render().splitlines()[2:] == [
+        'ratio{value="-inf"} -Inf',
+        'ratio{value="half"} 0.5',
+        'ratio{value="inf"} +Inf',
+        'ratio{value="nan"} NaN',
+    ]
+
+
+def test_metrics_check_labels_and_names():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Number of requests", ["classifier"])
+
+    with pytest.raises(ValueError):
+        counter.inc()
+    with pytest.raises(ValueError):
+        registry.gauge("requests_total", "Duplicate")
+
+
+def test_nested_phases_are_exclusive():
+    with metrics.record_phases() as timer:
+        with metrics.phase("predict"):
+            with metrics.phase("model_load"):
+                time.sleep(0.05)
+
+    assert timer.durations["model_load"] >= 0.05
+    assert timer.durations["predict"] < 0.05
+
+
+def test_phases_are_not_recorded_outside_of_record_phases():
+    with metrics.phase("predict"):
+        pass
+
+    with metrics.record_phases() as timer:
+        pass
+
+    assert timer.durations == {}
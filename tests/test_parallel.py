@@ -0,0 +1,74 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+import json
+from pathlib import Path
+
+import pytest
+from cassis import Cas
+from cassis.cas import View
+
+from ariadne.parallel import _CasPickler, _CasUnpickler, shutdown_executor
+from ariadne.protocol import parse_training_request
+
+REQUESTS_DIRECTORY = Path(__file__).resolve().parents[1] / "examples" / "requests"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def executor():
+    yield
+    shutdown_executor()
+
+
+def test_parallel_parsing_yields_same_documents_in_order():
+    with open(REQUESTS_DIRECTORY / "training_sentence_sentiment.json", encoding="utf-8") as f:
+        json_data = json.load(f)
+    # Reversed copies make sure that the order is kept across chunks
+    json_data["documents"] = json_data["documents"] + json_data["documents"][::-1]
+    req = parse_training_request(json_data)
+
+    expected = list(req.iter_documents())
+    actual = list(req.iter_documents(processes=2))
+
+    assert [d.document_id for d in actual] == [d.document_id for d in expected]
+    for a, e in zip(actual, expected):
+        assert a.cas.typesystem is e.cas.typesystem
+        assert a.cas.to_xmi() == e.cas.to_xmi()
+
+    # Parsed documents must behave like ones parsed in this process
+    sentence_type = "de.tudarmstadt.ukp.dkpro.core.api.segmentation.type.Sentence"
+    sentence = actual[0].cas.select(sentence_type)[0]
+    assert sentence.get_covered_text() == expected[0].cas.select(sentence_type)[0].get_covered_text()
+
+
+def test_cassis_internals_used_for_pickling_exist():
+    # Pickling documents relies on private parts of cassis, this fails loudly if an upgrade changes them
+    with open(REQUESTS_DIRECTORY / "training_sentence_sentiment.json", encoding="utf-8") as f:
+        document = next(parse_training_request(json.load(f)).iter_documents())
+    typesystem = document.cas.typesystem
+
+    annotation_type = typesystem.get_type("uima.tcas.Annotation")
+    assert hasattr(annotation_type, "_constructor")
+    assert callable(annotation_type._constructor_fn)
+    view = View(Cas(typesystem).get_sofa())
+    assert hasattr(view.type_index, "items")
+
+    buffer = io.BytesIO()
+    _CasPickler(buffer).dump(document)
+    buffer.seek(0)
+    unpickled = _CasUnpickler(buffer, typesystem).load()
+
+    assert unpickled.cas.to_xmi() == document.cas.to_xmi()
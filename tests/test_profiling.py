@@ -0,0 +1,64 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pstats
+
+from ariadne.profiling import ProfileStore, is_valid_profile_id, new_profile_id
+
+
+def _work():
+    return sum(i * i for i in range(1000))
+
+
+def test_profile_is_stored(tmp_path):
+    store = ProfileStore(tmp_path)
+
+    with store.profile("first", "classifier", "predict") as profiled:
+        _work()
+
+    assert profiled
+    stats = pstats.Stats(str(store.get_path("first")))
+    assert any(function[2] == "_work" for function in stats.stats)
+    assert [p["id"] for p in store.list()] == ["first"]
+
+
+def test_concurrent_profiles_are_skipped(tmp_path):
+    store = ProfileStore(tmp_path)
+
+    with store.profile("outer", "classifier", "predict"):
+        with store.profile("inner", "classifier", "predict") as profiled:
+            assert not profiled
+
+    assert store.get_path("inner") is None
+    assert store.get_path("outer") is not None
+
+
+def test_only_newest_profiles_are_kept(tmp_path):
+    store = ProfileStore(tmp_path, max_profiles=2)
+
+    for profile_id in ["a", "b", "c"]:
+        with store.profile(profile_id, "classifier", "predict"):
+            _work()
+
+    assert sorted(p["id"] for p in store.list()) == ["b", "c"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["b.json", "b.prof", "c.json", "c.prof"]
+
+
+def test_profile_ids_must_be_safe_file_names():
+    assert new_profile_id("abc-123").startswith("abc-123-")
+    assert new_profile_id("abc-123") != new_profile_id("abc-123")
+    assert is_valid_profile_id(new_profile_id("x" * 64))
+    assert not new_profile_id("../etc/passwd").startswith("..")
+    assert new_profile_id(None)
@@ -0,0 +1,254 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+import json
+from pathlib import Path
+
+import pytest
+from cassis import load_cas_from_xmi, load_typesystem
+
+from ariadne import protocol
+
+from ariadne.protocol import (
+    CAS_FORMAT_JSON,
+    CAS_FORMAT_XMI,
+    InvalidRequestError,
+    _JsonStreamReader,
+    detect_cas_format,
+    load_cas,
+    load_typesystem_cached,
+    parse_prediction_request,
+    parse_training_request,
+    parse_training_request_stream,
+    serialize_cas,
+    typesystem_cache,
+)
+
+REQUESTS_DIRECTORY = Path(__file__).resolve().parents[1] / "examples" / "requests"
+
+
+def _load_request(name: str):
+    with open(REQUESTS_DIRECTORY / name, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def empty_typesystem_cache():
+    typesystem_cache.clear()
+    yield typesystem_cache
+    typesystem_cache.clear()
+
+
+def test_parse_prediction_request():
+    json_data = _load_request("predict_sentence_sentiment.json")
+
+    req = parse_prediction_request(json_data)
+
+    assert req.layer == "webanno.custom.Sentiment"
+    assert req.feature == "value"
+    assert req.user_id == json_data["document"]["userId"]
+    assert req.cas.sofa_string
+
+
+def test_parse_training_request():
+    json_data = _load_request("training_sentence_sentiment.json")
+
+    req = parse_training_request(json_data)
+
+    assert req.user_id == json_data["documents"][0]["userId"]
+    assert len(req.documents) == 2
+
+
+def test_training_request_parses_documents_once(monkeypatch):
+    json_data = _load_request("training_sentence_sentiment.json")
+    expected_size = sum(len(document["xmi"].encode("utf-8")) for document in json_data["documents"])
+    parsed = []
+    original_load = protocol.load_cas_from_xmi
+
+    def load_cas_from_xmi(xmi, typesystem):
+        parsed.append(xmi)
+        return original_load(xmi, typesystem)
+
+    monkeypatch.setattr(protocol, "load_cas_from_xmi", load_cas_from_xmi)
+    req = parse_training_request(json_data)
+
+    assert req.document_count == 2
+    assert req.payload_size == expected_size
+    assert parsed == []
+
+    first = req.documents
+    second = req.documents
+
+    assert first is second
+    assert [d.document_id for d in req.iter_documents()] == [d.document_id for d in first]
+    assert len(parsed) == 2
+    # The raw XMI is not needed anymore, the metadata is still available
+    assert req._documents_json == []
+    assert req.document_count == 2
+    assert req.payload_size == expected_size
+
+
+def test_parse_training_request_without_documents():
+    json_data = _load_request("training_sentence_sentiment.json")
+    json_data["documents"] = []
+
+    with pytest.raises(InvalidRequestError):
+        parse_training_request(json_data)
+
+
+@pytest.mark.parametrize(
+    "json_data",
+    [
+        {"metadata": {}},
+        {"document": {}, "typeSystem": ""},
+        {"metadata": None, "document": {}, "typeSystem": ""},
+        {"metadata": {"layer": "l", "feature": "f", "projectId": "p"}, "document": "xmi", "typeSystem": ""},
+    ],
+)
+def test_parse_prediction_request_with_missing_fields(json_data):
+    with pytest.raises(InvalidRequestError):
+        parse_prediction_request(json_data)
+
+
+@pytest.mark.parametrize(
+    "remove",
+    [
+        lambda json_data: json_data.pop("metadata"),
+        lambda json_data: json_data.pop("typeSystem"),
+        lambda json_data: json_data["metadata"].pop("feature"),
+        lambda json_data: json_data["documents"][0].pop("userId"),
+        lambda json_data: json_data["documents"][1].pop("xmi"),
+    ],
+)
+def test_parse_training_request_with_missing_fields(remove):
+    json_data = _load_request("training_sentence_sentiment.json")
+    remove(json_data)
+
+    with pytest.raises(InvalidRequestError):
+        parse_training_request(json_data)
+
+
+def _to_json_cas(json_document, typesystem_xml):
+    cas = load_cas_from_xmi(json_document["xmi"], load_typesystem(typesystem_xml))
+    json_document["xmi"] = cas.to_json()
+    return cas
+
+
+def test_parse_prediction_request_with_json_cas():
+    json_data = _load_request("predict_sentence_sentiment.json")
+    cas = _to_json_cas(json_data["document"], json_data["typeSystem"])
+
+    req = parse_prediction_request(json_data)
+
+    assert req.cas_format == CAS_FORMAT_JSON
+    assert req.cas.to_xmi() == cas.to_xmi()
+    serialized = serialize_cas(req.cas, req.cas_format)
+    assert load_cas(serialized, req.cas.typesystem, CAS_FORMAT_JSON).to_xmi() == cas.to_xmi()
+    # Only the types in use are embedded, not the whole type system
+    assert len(serialized) < len(cas.to_json()) - 50_000
+
+
+def test_parse_training_request_with_json_cas():
+    json_data = _load_request("training_sentence_sentiment.json")
+    expected = [_to_json_cas(document, json_data["typeSystem"]) for document in json_data["documents"]]
+
+    req = parse_training_request(json_data)
+
+    assert [d.cas.to_xmi() for d in req.documents] == [cas.to_xmi() for cas in expected]
+
+
+@pytest.mark.parametrize(
+    "document, expected",
+    [
+        ({"xmi": '<?xml version="1.0"?><xmi:XMI/>'}, CAS_FORMAT_XMI),
+        ({"xmi": ' \n{"%TYPES": {}}'}, CAS_FORMAT_JSON),
+        ({"xmi": "<xmi/>", "format": "xmi"}, CAS_FORMAT_XMI),
+        ({"xmi": "{}", "format": "json"}, CAS_FORMAT_JSON),
+    ],
+)
+def test_detect_cas_format(document, expected):
+    assert detect_cas_format(document) == expected
+
+
+def test_detect_unsupported_cas_format():
+    with pytest.raises(ValueError):
+        detect_cas_format({"xmi": "", "format": "binary"})
+
+
+def test_typesystem_is_parsed_once_per_content(empty_typesystem_cache):
+    json_data = _load_request("predict_sentence_sentiment.json")
+    hits_before = empty_typesystem_cache.stats().hits
+
+    first = parse_prediction_request(json_data)
+    second = parse_prediction_request(json_data)
+
+    assert first.cas.typesystem is second.cas.typesystem
+    assert empty_typesystem_cache.stats().hits == hits_before + 1
+    assert len(empty_typesystem_cache) == 1
+
+
+def test_different_typesystems_are_cached_separately(empty_typesystem_cache):
+    json_data = _load_request("predict_sentence_sentiment.json")
+    xml = json_data["typeSystem"]
+
+    first = load_typesystem_cached(xml)
+    second = load_typesystem_cached(xml.replace("webanno.custom.Sentiment", "webanno.custom.Opinion"))
+
+    assert first is not second
+    assert len(empty_typesystem_cache) == 2
+
+
+def test_parse_training_request_stream(tmp_path):
+    json_data = _load_request("training_sentence_sentiment.json")
+    # Documents before the type system must work as well
+    reordered = {"documents": json_data["documents"], "metadata": json_data["metadata"]}
+    reordered["typeSystem"] = json_data["typeSystem"]
+    stream = io.BytesIO(json.dumps(reordered).encode("utf-8"))
+
+    req = parse_training_request_stream(stream, spool_directory=tmp_path)
+
+    assert req.layer == json_data["metadata"]["layer"]
+    assert req.user_id == json_data["documents"][0]["userId"]
+    assert req.document_count == 2
+    assert req.payload_size == parse_training_request(json_data).payload_size
+    expected = parse_training_request(json_data).documents
+    actual = list(req.iter_documents())
+    assert [d.document_id for d in actual] == [d.document_id for d in expected]
+    assert [d.cas.sofa_string for d in actual] == [d.cas.sofa_string for d in expected]
+
+    req.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_parse_training_request_stream_without_documents(tmp_path):
+    stream = io.BytesIO(json.dumps({"metadata": {}, "typeSystem": "", "documents": []}).encode("utf-8"))
+
+    with pytest.raises(ValueError):
+        parse_training_request_stream(stream, spool_directory=tmp_path)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_json_stream_reader(chunk_size):
+    document = '{"a": 12345, "b": [1, {"x": "y\\" ,]}"}, true, null], "c": -1.5e3, "d": [] , "e": {}}'
+    reader = _JsonStreamReader(io.StringIO(document), chunk_size=chunk_size)
+
+    result = {}
+    for key in reader.iter_object():
+        result[key] = list(reader.iter_array()) if key == "b" else reader.read_value()
+
+    assert result == json.loads(document)
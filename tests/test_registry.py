@@ -0,0 +1,145 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import sys
+
+import pytest
+
+from ariadne.classifier import Classifier
+from ariadne.registry import ClassifierRegistry, import_from_path, module_exists
+
+
+class _ConfiguredClassifier(Classifier):
+    created = 0
+
+    def __init__(self, label, suffix=""):
+        super().__init__()
+        _ConfiguredClassifier.created += 1
+        self.label = label + suffix
+
+
+def test_instances_are_used_directly():
+    registry = ClassifierRegistry()
+    classifier = _ConfiguredClassifier("a")
+
+    registry.register("instance", classifier)
+
+    assert registry.is_loaded("instance")
+    assert registry["instance"] is classifier
+
+
+def test_factories_are_called_once_on_first_use():
+    registry = ClassifierRegistry()
+    created_before = _ConfiguredClassifier.created
+
+    registry.register("factory", _ConfiguredClassifier, args=["a"], kwargs={"suffix": "b"})
+
+    assert not registry.is_loaded("factory")
+    assert _ConfiguredClassifier.created == created_before
+
+    first = registry["factory"]
+    second = registry["factory"]
+
+    assert first is second
+    assert first.label == "ab"
+    assert _ConfiguredClassifier.created == created_before + 1
+
+
+def test_on_load_is_called_once_per_classifier():
+    loaded = []
+    registry = ClassifierRegistry(on_load=lambda name, classifier: loaded.append(name))
+    registry.register("instance", _ConfiguredClassifier("a"))
+    registry.register("factory", _ConfiguredClassifier, args=["a"])
+    assert loaded == ["instance"]
+
+    registry.get("factory")
+    registry.get("factory")
+    assert loaded == ["instance", "factory"]
+
+
+def test_import_paths_are_imported_on_first_use():
+    sys.modules.pop("ariadne.contrib.log_only", None)
+    registry = ClassifierRegistry()
+
+    registry.register("log", "ariadne.contrib.log_only:LogOnlyRecommender")
+    assert "ariadne.contrib.log_only" not in sys.modules
+
+    registry.warmup()
+
+    assert "ariadne.contrib.log_only" in sys.modules
+    assert type(registry["log"]).__name__ == "LogOnlyRecommender"
+    [report] = registry.report()
+    assert report["loaded"]
+    assert report["loadSeconds"] is not None
+    assert report["modulesImported"] >= 1
+
+
+def test_log_report_checks_import_paths_without_importing(caplog):
+    sys.modules.pop("ariadne.contrib.log_only", None)
+    registry = ClassifierRegistry()
+    registry.register("log", "ariadne.contrib.log_only:LogOnlyRecommender")
+    registry.register("missing", "ariadne.contrib.does_not_exist:Classifier")
+
+    with caplog.at_level(logging.INFO, logger="ariadne.registry"):
+        registry.log_report()
+
+    assert "ariadne.contrib.log_only" not in sys.modules
+    assert "Classifiers: [0] of [2] loaded" in caplog.text
+    [warning] = [record for record in caplog.records if record.levelno == logging.WARNING]
+    assert "missing" in warning.getMessage()
+    assert "cannot be found" in warning.getMessage()
+
+
+def test_module_exists():
+    assert module_exists("ariadne.contrib.log_only:LogOnlyRecommender")
+    assert module_exists("ariadne.registry.ClassifierRegistry")
+    assert not module_exists("ariadne.contrib.does_not_exist:Classifier")
+    assert not module_exists("does_not_exist.module:Classifier")
+    assert not module_exists("invalid")
+
+
+def test_failed_creation_is_reported_and_retried():
+    registry = ClassifierRegistry()
+    registry.register("broken", "ariadne.contrib.does_not_exist:Classifier")
+
+    with pytest.raises(ImportError):
+        registry["broken"]
+    with pytest.raises(ImportError):
+        registry["broken"]
+
+    [report] = registry.report()
+    assert not report["loaded"]
+    assert "does_not_exist" in report["error"]
+
+
+def test_invalid_registrations():
+    registry = ClassifierRegistry()
+
+    with pytest.raises(ValueError):
+        registry.register("instance", _ConfiguredClassifier("a"), args=["b"])
+    with pytest.raises(TypeError):
+        registry.register("nothing", 42)
+
+    registry.register("not_a_classifier", dict)
+    with pytest.raises(TypeError):
+        registry["not_a_classifier"]
+
+
+def test_import_from_path():
+    assert import_from_path("ariadne.registry:ClassifierRegistry") is ClassifierRegistry
+    assert import_from_path("ariadne.registry.ClassifierRegistry") is ClassifierRegistry
+    with pytest.raises(ValueError):
+        import_from_path("ClassifierRegistry")
@@ -0,0 +1,131 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+from ariadne.classifier import Classifier, TrainingCancelledError, cancellable_training
+from ariadne.contrib.inception_util import SENTENCE_TYPE
+from ariadne.protocol import parse_training_request
+from ariadne.samples import SampleStore
+
+REQUESTS_DIRECTORY = Path(__file__).resolve().parents[1] / "examples" / "requests"
+
+
+class _SentenceClassifier(Classifier):
+    supports_sample_store = True
+
+    def __init__(self):
+        super().__init__()
+        self.extracted = []
+
+    def extract_samples(self, document, layer, feature):
+        self.extracted.append(document.document_id)
+        return [(document.document_id, s.get_covered_text()) for s in document.cas.select(SENTENCE_TYPE)]
+
+
+def _request_json():
+    with open(REQUESTS_DIRECTORY / "training_sentence_sentiment.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SampleStore(tmp_path / "samples")
+
+
+def test_unchanged_documents_are_reused(store):
+    classifier = _SentenceClassifier()
+
+    first = store.collect(classifier, parse_training_request(_request_json()))
+    second = store.collect(classifier, parse_training_request(_request_json()))
+
+    assert classifier.extracted == [0, 1]
+    assert (first.reused_documents, first.extracted_documents) == (0, 2)
+    assert (second.reused_documents, second.extracted_documents) == (2, 0)
+    assert second.samples == first.samples
+    assert [document_id for document_id, _ in first.samples] == sorted(document_id for document_id, _ in first.samples)
+
+
+def test_collect_stops_once_cancelled(store):
+    classifier = _SentenceClassifier()
+    cancelled = threading.Event()
+    original_extract = classifier.extract_samples
+
+    def extract_samples(document, layer, feature):
+        cancelled.set()
+        return original_extract(document, layer, feature)
+
+    classifier.extract_samples = extract_samples
+    with cancellable_training(cancelled), pytest.raises(TrainingCancelledError):
+        store.collect(classifier, parse_training_request(_request_json()))
+
+    assert classifier.extracted == [0]
+
+
+def test_changed_documents_are_extracted_again(store):
+    classifier = _SentenceClassifier()
+    store.collect(classifier, parse_training_request(_request_json()))
+
+    json_data = _request_json()
+    json_data["documents"][1]["xmi"] = json_data["documents"][0]["xmi"]
+    collected = store.collect(classifier, parse_training_request(json_data))
+
+    assert classifier.extracted == [0, 1, 1]
+    assert collected.reused_documents == 1
+    assert [text for document_id, text in collected.samples if document_id == 1] == [
+        text for document_id, text in collected.samples if document_id == 0
+    ]
+
+
+def test_samples_depend_on_layer_and_sample_version(store):
+    classifier = _SentenceClassifier()
+    store.collect(classifier, parse_training_request(_request_json()))
+
+    json_data = _request_json()
+    json_data["metadata"]["feature"] = "other"
+    assert store.collect(classifier, parse_training_request(json_data)).extracted_documents == 2
+
+    classifier.sample_version = 2
+    assert store.collect(classifier, parse_training_request(json_data)).extracted_documents == 2
+
+
+def test_samples_of_removed_documents_are_deleted(store, tmp_path):
+    classifier = _SentenceClassifier()
+    store.collect(classifier, parse_training_request(_request_json()))
+
+    json_data = _request_json()
+    del json_data["documents"][1]
+    store.collect(classifier, parse_training_request(json_data))
+
+    project_id = json_data["metadata"]["projectId"]
+    project_directory = tmp_path / "samples" / classifier.name / "samples_admin" / f"project_{project_id}"
+    assert len(list(project_directory.iterdir())) == 1
+
+
+def test_samples_are_kept_per_project(store):
+    classifier = _SentenceClassifier()
+    store.collect(classifier, parse_training_request(_request_json()))
+
+    json_data = _request_json()
+    json_data["metadata"]["projectId"] = "other"
+    del json_data["documents"][1]
+    assert store.collect(classifier, parse_training_request(json_data)).extracted_documents == 1
+
+    # Training the other project did not delete the samples of the first one
+    assert store.collect(classifier, parse_training_request(_request_json())).reused_documents == 2
@@ -0,0 +1,835 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gc
+import gzip
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import joblib
+import pytest
+from cassis import load_cas_from_json, load_cas_from_xmi, load_typesystem
+
+from ariadne.classifier import Classifier
+from ariadne.contrib.inception_util import SENTENCE_TYPE, create_span_prediction
+from ariadne.capture import read_archives
+from ariadne.samples import SampleStore
+from ariadne.server import Server
+from ariadne.store import LocalModelStore
+
+REQUESTS_DIRECTORY = Path(__file__).resolve().parents[1] / "examples" / "requests"
+
+
+class _RecordingClassifier(Classifier):
+    def __init__(self, model_store=None):
+        super().__init__(model_store=model_store)
+        self.fitted = []
+        self.may_finish = threading.Event()
+        self.started = threading.Event()
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def fit(self, documents, layer, feature, project_id, user_id):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        self.started.set()
+        self.may_finish.wait(10)
+        with self._lock:
+            self.running -= 1
+        self.fitted.append((project_id, user_id))
+
+    def predict(self, cas, layer, feature, project_id, document_id, user_id):
+        pass
+
+
+def _training_request(project_id, user_id="user"):
+    with open(REQUESTS_DIRECTORY / "training_sentence_sentiment.json", encoding="utf-8") as f:
+        json_data = json.load(f)
+
+    json_data["metadata"]["projectId"] = project_id
+    for document in json_data["documents"]:
+        document["userId"] = user_id
+
+    return json_data
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = Server()
+    server._lock_directory = tmp_path / "locks"
+    server._sample_store = SampleStore(tmp_path / "samples")
+    return server
+
+
+def test_train_unknown_classifier(server):
+    response = server._app.test_client().post("/unknown/train", json=_training_request("p"))
+
+    assert response.status_code == 404
+
+
+def test_train_without_documents(server):
+    server.add_classifier("recording", _RecordingClassifier())
+    json_data = _training_request("p")
+    json_data["documents"] = []
+
+    response = server._app.test_client().post("/recording/train", json=json_data)
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("cache_predictions", [False, True])
+def test_requests_with_missing_fields(server, cache_predictions):
+    server.add_classifier("recording", _RecordingClassifier(), cache_predictions=cache_predictions)
+    client = server._app.test_client()
+
+    assert client.post("/recording/predict", json={"metadata": {}}).status_code == 400
+    assert client.post("/recording/train", json={"metadata": {}}).status_code == 400
+
+
+def test_train_coalesces_requests_during_training(server):
+    classifier = _RecordingClassifier()
+    server.add_classifier("recording", classifier)
+    client = server._app.test_client()
+
+    assert client.post("/recording/train", json=_training_request("first")).status_code == 204
+    assert classifier.started.wait(10)
+
+    assert client.post("/recording/train", json=_training_request("second")).status_code == 204
+    assert client.post("/recording/train", json=_training_request("third")).status_code == 204
+
+    classifier.may_finish.set()
+    assert server._scheduler.wait_until_idle(10)
+
+    assert classifier.fitted == [("first", "user"), ("third", "user")]
+
+
+def test_train_limits_concurrent_trainings_per_classifier(tmp_path):
+    server = Server(training_workers=4, max_concurrent_trainings=1)
+    server._lock_directory = tmp_path / "locks"
+    classifier = _RecordingClassifier()
+    server.add_classifier("recording", classifier)
+    client = server._app.test_client()
+
+    client.post("/recording/train", json=_training_request("p", "alice"))
+    client.post("/recording/train", json=_training_request("p", "bob"))
+    assert classifier.started.wait(10)
+
+    assert not server._scheduler.wait_until_idle(0.2)
+
+    classifier.may_finish.set()
+    assert server._scheduler.wait_until_idle(10)
+    assert sorted(classifier.fitted) == [("p", "alice"), ("p", "bob")]
+    assert classifier.max_running == 1
+
+
+class _SavingClassifier(_RecordingClassifier):
+    def fit(self, documents, layer, feature, project_id, user_id):
+        super().fit(documents, layer, feature, project_id, user_id)
+        self._save_model(user_id, project_id)
+
+
+def test_train_status_reports_jobs(server):
+    classifier = _RecordingClassifier()
+    server.add_classifier("recording", classifier)
+    client = server._app.test_client()
+
+    client.post("/recording/train", json=_training_request("first"))
+    assert classifier.started.wait(10)
+    client.post("/recording/train", json=_training_request("second"))
+
+    status = client.get("/recording/train/status?userId=user").get_json()
+    assert [job["projectId"] for job in status["running"]] == ["first"]
+    assert [job["projectId"] for job in status["queued"]] == ["second"]
+    assert status["running"][0]["documents"] == 2
+    assert status["running"][0]["samples"] is not None
+
+    classifier.may_finish.set()
+    assert server._scheduler.wait_until_idle(10)
+
+    status = client.get("/train/status").get_json()
+    assert [job["state"] for job in status["finished"]] == ["finished", "finished"]
+    assert all(job["durationSeconds"] is not None for job in status["finished"])
+    assert client.get("/recording/train/status?userId=other").get_json()["finished"] == []
+
+
+def test_train_cancel(server, tmp_path):
+    classifier = _SavingClassifier()
+    classifier.model_store = LocalModelStore(tmp_path / "models")
+    server.add_classifier("saving", classifier)
+    client = server._app.test_client()
+
+    client.post("/saving/train", json=_training_request("first"))
+    assert classifier.started.wait(10)
+    client.post("/saving/train", json=_training_request("second"))
+
+    response = client.post("/saving/train/cancel?userId=user")
+    assert response.status_code == 200
+    assert len(response.get_json()["cancelled"]) == 2
+
+    classifier.may_finish.set()
+    assert server._scheduler.wait_until_idle(10)
+
+    assert classifier.fitted == [("first", "user")]
+    assert classifier._load_model("user") is None
+    status = client.get("/saving/train/status").get_json()
+    assert [job["state"] for job in status["finished"]] == ["cancelled", "cancelled"]
+
+
+class _SavingFirstClassifier(_RecordingClassifier):
+    def fit(self, documents, layer, feature, project_id, user_id):
+        self._save_model(user_id, project_id)
+        super().fit(documents, layer, feature, project_id, user_id)
+
+
+def test_train_cancel_after_model_was_saved(server, tmp_path):
+    classifier = _SavingFirstClassifier(LocalModelStore(tmp_path / "models"))
+    server.add_classifier("saving", classifier)
+    client = server._app.test_client()
+
+    client.post("/saving/train", json=_training_request("first"))
+    assert classifier.started.wait(10)
+    assert client.post("/saving/train/cancel?userId=user").status_code == 200
+    classifier.may_finish.set()
+    assert server._scheduler.wait_until_idle(10)
+
+    assert classifier._load_model("user") == "first"
+    assert client.get("/saving/train/status").get_json()["finished"][0]["state"] == "finished"
+
+
+def test_train_times_out_waiting_for_other_process(server):
+    classifier = _RecordingClassifier()
+    server.add_classifier("recording", classifier)
+    server._training_lock_timeout = 0.2
+    client = server._app.test_client()
+
+    # Held by a training of the same classifier and user in another worker process
+    with server._get_lock(classifier.name, "user"):
+        client.post("/recording/train", json=_training_request("first"))
+        assert server._scheduler.wait_until_idle(10)
+
+    assert classifier.fitted == []
+    job = client.get("/recording/train/status").get_json()["finished"][0]
+    assert job["state"] == "lock_timeout"
+    assert job["error"] is not None
+
+
+def test_train_cancel_while_waiting_for_lock(server):
+    classifier = _RecordingClassifier()
+    server.add_classifier("recording", classifier)
+    client = server._app.test_client()
+
+    with server._get_lock(classifier.name, "user"):
+        client.post("/recording/train", json=_training_request("first"))
+        while not client.get("/recording/train/status").get_json()["running"]:
+            time.sleep(0.01)
+        assert client.post("/recording/train/cancel?userId=user").status_code == 200
+        assert server._scheduler.wait_until_idle(10)
+
+    assert classifier.fitted == []
+    assert client.get("/recording/train/status").get_json()["finished"][0]["state"] == "cancelled"
+
+
+def test_train_cancel_without_training(server):
+    server.add_classifier("recording", _RecordingClassifier())
+    client = server._app.test_client()
+
+    assert client.post("/recording/train/cancel?userId=user").status_code == 404
+    assert client.post("/recording/train/cancel").status_code == 400
+
+
+class _BatchRecordingClassifier(Classifier):
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    def predict_batch(self, requests):
+        self.batch_sizes.append(len(requests))
+        if any(req.user_id == "broken" for req in requests):
+            raise ValueError("Cannot predict")
+
+
+def _prediction_request(user_id="user"):
+    with open(REQUESTS_DIRECTORY / "predict_sentence_sentiment.json", encoding="utf-8") as f:
+        json_data = json.load(f)
+
+    json_data["document"]["userId"] = user_id
+    return json_data
+
+
+def test_predict_batches_concurrent_requests(server):
+    classifier = _BatchRecordingClassifier()
+    server.add_classifier("batching", classifier, max_batch_size=3, max_batch_wait=5)
+    json_data = _prediction_request()
+    status_codes = []
+
+    def _send():
+        response = server._app.test_client().post("/batching/predict", json=json_data)
+        status_codes.append(response.status_code)
+
+    threads = [threading.Thread(target=_send) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert status_codes == [200, 200, 200]
+    assert classifier.batch_sizes == [3]
+
+
+def test_predict_batch_waits_at_most_max_wait(server):
+    classifier = _BatchRecordingClassifier()
+    server.add_classifier("batching", classifier, max_batch_size=8, max_batch_wait=0.01)
+
+    response = server._app.test_client().post("/batching/predict", json=_prediction_request())
+
+    assert response.status_code == 200
+    assert classifier.batch_sizes == [1]
+
+
+def test_predict_batch_failure_is_reported(server):
+    server.add_classifier("batching", _BatchRecordingClassifier(), max_batch_size=8, max_batch_wait=0.01)
+
+    response = server._app.test_client().post("/batching/predict", json=_prediction_request("broken"))
+
+    assert response.status_code == 500
+
+
+class _SentencePredictingClassifier(Classifier):
+    def predict(self, cas, layer, feature, project_id, document_id, user_id):
+        for sentence in cas.select(SENTENCE_TYPE):
+            cas.add(create_span_prediction(cas, layer, feature, sentence.begin, sentence.end, "positive"))
+
+
+def test_predict_spliced_response_matches_full_serialization():
+    json_data = _prediction_request()
+    typesystem = load_typesystem(json_data["typeSystem"])
+    responses = []
+
+    for splice_responses in [False, True]:
+        server = Server(splice_responses=splice_responses)
+        server.add_classifier("sentences", _SentencePredictingClassifier())
+        response = server._app.test_client().post("/sentences/predict", json=json_data)
+        assert response.status_code == 200
+        responses.append(response.get_json()["document"])
+
+    full, spliced = [load_cas_from_xmi(xmi, typesystem) for xmi in responses]
+    assert spliced.to_xmi() == full.to_xmi()
+    assert len(spliced.select("webanno.custom.Sentiment")) > 0
+
+
+class _StreamingClassifier(Classifier):
+    supports_streaming_training = True
+
+    def __init__(self):
+        super().__init__()
+        self.documents = None
+
+    def fit(self, documents, layer, feature, project_id, user_id):
+        assert not isinstance(documents, list)
+        self.documents = [document.document_id for document in documents]
+
+
+class _BlockingStreamingClassifier(_StreamingClassifier):
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.may_continue = threading.Event()
+
+    def fit(self, documents, layer, feature, project_id, user_id):
+        self.documents = []
+        for document in documents:
+            self.documents.append(document.document_id)
+            self.started.set()
+            assert self.may_continue.wait(10)
+
+
+def test_train_cancel_stops_streaming_documents(server):
+    classifier = _BlockingStreamingClassifier()
+    server.add_classifier("streaming", classifier)
+    client = server._app.test_client()
+
+    client.post("/streaming/train", json=_training_request("p"))
+    assert classifier.started.wait(10)
+    assert client.post("/streaming/train/cancel?userId=user").status_code == 200
+    classifier.may_continue.set()
+    assert server._scheduler.wait_until_idle(10)
+
+    assert classifier.documents == [0]
+    assert client.get("/streaming/train/status").get_json()["finished"][0]["state"] == "cancelled"
+
+
+def test_train_spooled_request(tmp_path):
+    server = Server(training_spool_threshold=0)
+    server._lock_directory = tmp_path / "locks"
+    classifier = _StreamingClassifier()
+    server.add_classifier("streaming", classifier)
+    client = server._app.test_client()
+
+    assert client.post("/streaming/train", json=_training_request("p")).status_code == 204
+    assert server._scheduler.wait_until_idle(10)
+
+    assert classifier.documents == [0, 1]
+    job = client.get("/streaming/train/status").get_json()["finished"][0]
+    assert job["state"] == "finished"
+    assert job["documents"] == 2
+    assert job["samples"] is not None
+
+
+@pytest.mark.parametrize(
+    "remove",
+    [
+        lambda json_data: json_data.pop("typeSystem"),
+        lambda json_data: json_data.pop("metadata"),
+        lambda json_data: json_data["metadata"].pop("layer"),
+        lambda json_data: json_data["metadata"].pop("feature"),
+        lambda json_data: json_data["metadata"].pop("projectId"),
+        lambda json_data: json_data["documents"][0].pop("xmi"),
+    ],
+    ids=["typeSystem", "metadata", "layer", "feature", "projectId", "xmi"],
+)
+def test_train_spooled_request_with_missing_field(tmp_path, monkeypatch, remove):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "spool"))
+    (tmp_path / "spool").mkdir()
+    server = Server(training_spool_threshold=0)
+    classifier = _StreamingClassifier()
+    server.add_classifier("streaming", classifier)
+    json_data = _training_request("p")
+    remove(json_data)
+
+    response = server._app.test_client().post("/streaming/train", json=json_data)
+
+    assert response.status_code == 400
+    assert server._scheduler.status("streaming") == {"queued": [], "running": [], "finished": []}
+    assert list((tmp_path / "spool").iterdir()) == []
+
+
+def test_train_spooled_corrupt_compressed_request(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "spool"))
+    (tmp_path / "spool").mkdir()
+    server = Server(training_spool_threshold=0)
+    server.add_classifier("streaming", _StreamingClassifier())
+    client = server._app.test_client()
+    body = gzip.compress(json.dumps(_training_request("p")).encode("utf-8"))[:-100]
+
+    response = client.post(
+        "/streaming/train", data=body, headers={"Content-Encoding": "gzip", "Content-Type": "application/json"}
+    )
+
+    assert response.status_code == 400
+    assert list((tmp_path / "spool").iterdir()) == []
+
+
+def _metric_value(text, sample):
+    for line in text.splitlines():
+        if line.startswith(sample + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+def test_metrics(server, tmp_path):
+    server.add_classifier("sentences", _SentencePredictingClassifier())
+    server.add_classifier("batching", _BatchRecordingClassifier(), max_batch_size=8, max_batch_wait=0.01)
+    server.add_classifier("recording", _SavingClassifier(LocalModelStore(tmp_path / "models")))
+    server._classifiers["recording"].may_finish.set()
+    client = server._app.test_client()
+
+    assert client.post("/sentences/predict", json=_prediction_request()).status_code == 200
+    assert client.post("/batching/predict", json=_prediction_request("broken")).status_code == 500
+    assert client.post("/recording/train", json=_training_request("p")).status_code == 204
+    assert server._scheduler.wait_until_idle(10)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    text = response.get_data(as_text=True)
+
+    assert _metric_value(text, 'ariadne_requests_total{classifier="sentences",endpoint="predict"}') == 1
+    assert _metric_value(text, 'ariadne_request_errors_total{classifier="batching",endpoint="predict"}') == 1
+    for phase in ["json_decode", "typesystem_parse", "xmi_parse", "predict", "serialize"]:
+        sample = (
+            f'ariadne_request_phase_duration_seconds_count{{classifier="sentences",endpoint="predict",phase="{phase}"}}'
+        )
+        assert _metric_value(text, sample) == 1
+    assert _metric_value(text, 'ariadne_training_duration_seconds_count{classifier="recording",state="finished"}') == 1
+    assert "# TYPE ariadne_training_queue_depth gauge" in text
+
+
+def test_profiling_is_disabled_by_default(server):
+    server.add_classifier("sentences", _SentencePredictingClassifier())
+    client = server._app.test_client()
+
+    response = client.post("/sentences/predict", json=_prediction_request(), headers={"X-Ariadne-Profile": "true"})
+
+    assert response.status_code == 200
+    assert "X-Ariadne-Profile-Id" not in response.headers
+    assert client.get("/profiles").status_code == 404
+
+
+def test_profiling(tmp_path):
+    server = Server(profile_directory=tmp_path / "profiles")
+    server._lock_directory = tmp_path / "locks"
+    server.add_classifier("sentences", _SentencePredictingClassifier())
+    server.add_classifier("recording", _SavingClassifier(LocalModelStore(tmp_path / "models")))
+    server._classifiers["recording"].may_finish.set()
+    client = server._app.test_client()
+
+    assert "X-Ariadne-Profile-Id" not in client.post("/sentences/predict", json=_prediction_request()).headers
+
+    headers = {"X-Ariadne-Profile": "true", "X-Request-Id": "request-1"}
+    response = client.post("/sentences/predict", json=_prediction_request(), headers=headers)
+    assert response.status_code == 200
+    profile_id = response.headers["X-Ariadne-Profile-Id"]
+    assert profile_id.startswith("request-1-")
+    # Reusing a request id does not overwrite the earlier profile
+    response = client.post("/sentences/predict", json=_prediction_request(), headers=headers)
+    assert response.headers["X-Ariadne-Profile-Id"] not in (profile_id, None)
+
+    response = client.post("/recording/train", json=_training_request("p"), headers={"X-Ariadne-Profile": "1"})
+    assert "X-Ariadne-Profile-Id" not in response.headers
+    assert server._scheduler.wait_until_idle(10)
+    training_profile_id = client.get("/recording/train/status").get_json()["finished"][0]["profileId"]
+
+    profiles = client.get("/profiles").get_json()["profiles"]
+    assert len(profiles) == 3
+    assert {p["id"]: p["endpoint"] for p in profiles}[training_profile_id] == "train"
+
+    response = client.get(f"/profiles/{profile_id}")
+    assert response.status_code == 200
+    assert len(response.data) > 0
+    assert "_predict" in client.get(f"/profiles/{profile_id}?format=text").get_data(as_text=True)
+    # The documents are parsed within the profile of the training
+    training_profile = client.get(f"/profiles/{training_profile_id}?format=text").get_data(as_text=True)
+    assert "parse_documents" in training_profile
+    assert client.get("/profiles/unknown").status_code == 404
+    assert client.get(f"/profiles/{profile_id}?format=text&sort=time").status_code == 200
+    assert client.get(f"/profiles/{profile_id}?format=text&sort=unknown").status_code == 400
+
+
+def test_training_without_profile_reports_no_profile_id(tmp_path):
+    server = Server(profile_directory=tmp_path / "profiles")
+    server._lock_directory = tmp_path / "locks"
+    server.add_classifier("recording", _SavingClassifier(LocalModelStore(tmp_path / "models")))
+    server._classifiers["recording"].may_finish.set()
+    client = server._app.test_client()
+
+    # Another request is being profiled, so the training is not
+    with server._profiles.profile("other", "recording", "predict"):
+        client.post("/recording/train", json=_training_request("p"), headers={"X-Ariadne-Profile": "1"})
+        assert server._scheduler.wait_until_idle(10)
+
+    assert client.get("/recording/train/status").get_json()["finished"][0]["profileId"] is None
+
+
+def test_classifiers_are_created_lazily(server):
+    server.add_classifier("sentences", _SentencePredictingClassifier)
+    server.add_classifier("batching", _BatchRecordingClassifier, max_batch_size=8, max_batch_wait=0.01)
+    client = server._app.test_client()
+
+    loaded = {c["name"]: c["loaded"] for c in client.get("/classifiers").get_json()["classifiers"]}
+    assert loaded == {"sentences": False, "batching": False}
+
+    assert client.post("/sentences/predict", json=_prediction_request()).status_code == 200
+    assert client.post("/batching/predict", json=_prediction_request()).status_code == 200
+
+    loaded = {c["name"]: c["loaded"] for c in client.get("/classifiers").get_json()["classifiers"]}
+    assert loaded == {"sentences": True, "batching": True}
+    assert server._classifiers["batching"].batch_sizes == [1]
+
+
+def test_preload_freezes_loaded_classifiers(server):
+    server.add_classifier("sentences", _SentencePredictingClassifier)
+
+    try:
+        server.preload()
+
+        assert server._classifiers.is_loaded("sentences")
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
+
+
+def test_memory_report(server):
+    report = server._app.test_client().get("/memory").get_json()
+
+    assert report["pid"] == os.getpid()
+    if sys.platform == "linux":
+        assert report["rssBytes"] == report["sharedBytes"] + report["privateBytes"]
+
+
+class _BlockingClassifier(Classifier):
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.may_finish = threading.Event()
+
+    def predict(self, cas, layer, feature, project_id, document_id, user_id):
+        self.entered.set()
+        self.may_finish.wait(10)
+
+
+def test_predict_rejects_requests_beyond_concurrency_limit():
+    server = Server(retry_after=7)
+    classifier = _BlockingClassifier()
+    server.add_classifier("blocking", classifier, max_concurrent_predictions=1)
+    server.add_classifier("sentences", _SentencePredictingClassifier())
+    json_data = _prediction_request()
+    status_codes = []
+
+    thread = threading.Thread(
+        target=lambda: status_codes.append(
+            server._app.test_client().post("/blocking/predict", json=json_data).status_code
+        )
+    )
+    thread.start()
+    assert classifier.entered.wait(10)
+
+    client = server._app.test_client()
+    response = client.post("/blocking/predict", json=json_data)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+    # Other classifiers are not affected
+    assert client.post("/sentences/predict", json=json_data).status_code == 200
+
+    classifier.may_finish.set()
+    thread.join(10)
+    assert status_codes == [200]
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert _metric_value(text, 'ariadne_requests_rejected_total{classifier="blocking",endpoint="predict"}') == 1
+    assert _metric_value(text, 'ariadne_request_errors_total{classifier="blocking",endpoint="predict"}') is None
+    sample = 'ariadne_request_phase_duration_seconds_count{classifier="blocking",endpoint="predict",phase="queue_wait"}'
+    assert _metric_value(text, sample) == 2
+
+
+def test_cached_predictions_are_answered_beyond_concurrency_limit(tmp_path):
+    server = Server()
+    classifier = _BlockingClassifier()
+    server.add_classifier("blocking", classifier, max_concurrent_predictions=1, cache_predictions=True)
+    client = server._app.test_client()
+    classifier.may_finish.set()
+    assert client.post("/blocking/predict", json=_prediction_request()).status_code == 200
+
+    classifier.may_finish.clear()
+    classifier.entered.clear()
+    status_codes = []
+    thread = threading.Thread(
+        target=lambda: status_codes.append(
+            server._app.test_client().post("/blocking/predict", json=_prediction_request("other")).status_code
+        )
+    )
+    thread.start()
+    assert classifier.entered.wait(10)
+
+    assert client.post("/blocking/predict", json=_prediction_request()).status_code == 200
+    assert client.post("/blocking/predict", json=_prediction_request("third")).status_code == 503
+
+    classifier.may_finish.set()
+    thread.join(10)
+    assert status_codes == [200]
+
+
+class _CountingClassifier(_SentencePredictingClassifier):
+    def __init__(self, model_directory):
+        super().__init__(model_directory)
+        self.predictions = 0
+
+    def predict(self, cas, layer, feature, project_id, document_id, user_id):
+        self.predictions += 1
+        super().predict(cas, layer, feature, project_id, document_id, user_id)
+
+
+def test_predictions_are_cached_per_document_and_model_version(server, tmp_path):
+    classifier = _CountingClassifier(tmp_path / "models")
+    server.add_classifier("counting", classifier, cache_predictions=True)
+    client = server._app.test_client()
+    json_data = _prediction_request()
+
+    first = client.post("/counting/predict", json=json_data).get_json()["document"]
+    second = client.post("/counting/predict", json=json_data).get_json()["document"]
+    assert first == second
+    assert classifier.predictions == 1
+
+    classifier._save_model("user", "new model")
+    assert client.post("/counting/predict", json=json_data).status_code == 200
+    assert classifier.predictions == 2
+
+    assert client.post("/counting/predict", json=_prediction_request("other user")).status_code == 200
+    assert classifier.predictions == 3
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert _metric_value(text, 'ariadne_prediction_cache_requests_total{classifier="counting",result="hit"}') == 1
+    assert _metric_value(text, 'ariadne_prediction_cache_requests_total{classifier="counting",result="miss"}') == 3
+
+
+def test_watched_model_store_is_not_asked_for_each_prediction(tmp_path, monkeypatch):
+    server = Server(model_store_poll_interval=3600)
+    classifier = _CountingClassifier(tmp_path / "models")
+    server.add_classifier("counting", classifier, cache_predictions=True)
+    client = server._app.test_client()
+    json_data = _prediction_request()
+    try:
+        assert client.post("/counting/predict", json=json_data).status_code == 200
+
+        # Trained in another process, predictions keep using the known model until the store is polled
+        LocalModelStore(tmp_path / "models").publish(classifier.name, "user", lambda path: joblib.dump("new", path))
+        with monkeypatch.context() as m:
+            m.setattr(classifier.model_store, "latest_version", lambda name, user_id: pytest.fail("Store was asked"))
+            assert client.post("/counting/predict", json=json_data).status_code == 200
+        assert classifier.predictions == 1
+
+        classifier.model_store.poll()
+        assert len(server._prediction_cache) == 0
+        assert client.post("/counting/predict", json=json_data).status_code == 200
+        assert classifier.predictions == 2
+    finally:
+        classifier.model_store.close()
+
+
+def test_prediction_cache_is_bounded_by_memory_of_responses(tmp_path):
+    server = Server(prediction_cache_bytes=16 * 1024 * 1024)
+    server.add_classifier("counting", _CountingClassifier(tmp_path / "models"), cache_predictions=True)
+    json_data = _prediction_request()
+    json_data["document"]["xmi"] = json_data["document"]["xmi"].replace('sofaString="', 'sofaString="\u4e2d', 1)
+
+    document = server._app.test_client().post("/counting/predict", json=json_data).get_json()["document"]
+
+    assert "\u4e2d" in document
+    assert server._prediction_cache.stats().weight == sys.getsizeof(document) > len(document.encode("utf-8"))
+
+
+def test_predictions_are_not_cached_by_default(server, tmp_path):
+    classifier = _CountingClassifier(tmp_path / "models")
+    server.add_classifier("counting", classifier)
+    client = server._app.test_client()
+
+    client.post("/counting/predict", json=_prediction_request())
+    client.post("/counting/predict", json=_prediction_request())
+
+    assert classifier.predictions == 2
+
+
+def test_compressed_prediction(server):
+    server.add_classifier("sentences", _SentencePredictingClassifier())
+    body = gzip.compress(json.dumps(_prediction_request()).encode("utf-8"))
+
+    response = server._app.test_client().post(
+        "/sentences/predict",
+        data=body,
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip", "Accept-Encoding": "gzip"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    xmi = json.loads(gzip.decompress(response.data))["document"]
+    typesystem = load_typesystem(_prediction_request()["typeSystem"])
+    assert len(load_cas_from_xmi(xmi, typesystem).select("webanno.custom.Sentiment")) > 0
+
+
+def test_predict_answers_in_format_of_request(server):
+    server.add_classifier("sentences", _SentencePredictingClassifier())
+    json_data = _prediction_request()
+    typesystem = load_typesystem(json_data["typeSystem"])
+    json_data["document"]["xmi"] = load_cas_from_xmi(json_data["document"]["xmi"], typesystem).to_json()
+
+    response = server._app.test_client().post("/sentences/predict", json=json_data).get_json()
+
+    assert response["format"] == "json"
+    cas = load_cas_from_json(response["document"], typesystem)
+    assert len(cas.select("webanno.custom.Sentiment")) > 0
+
+
+class _SampleClassifier(Classifier):
+    supports_sample_store = True
+
+    def __init__(self):
+        super().__init__()
+        self.extracted = 0
+        self.fitted = []
+
+    def extract_samples(self, document, layer, feature):
+        self.extracted += 1
+        return [document.document_id]
+
+    def fit_samples(self, samples, layer, feature, project_id, user_id):
+        self.fitted.append(samples)
+
+
+def test_training_reuses_samples_of_unchanged_documents(server):
+    classifier = _SampleClassifier()
+    server.add_classifier("samples", classifier)
+    client = server._app.test_client()
+
+    client.post("/samples/train", json=_training_request("p"))
+    assert server._scheduler.wait_until_idle(10)
+    client.post("/samples/train", json=_training_request("p"))
+    assert server._scheduler.wait_until_idle(10)
+
+    assert classifier.extracted == 2
+    assert classifier.fitted == [[0, 1], [0, 1]]
+    finished = client.get("/samples/train/status").get_json()["finished"]
+    assert sorted(job["reusedDocuments"] for job in finished) == [0, 2]
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert _metric_value(text, 'ariadne_training_documents_total{classifier="samples",samples="reused"}') == 2
+    assert _metric_value(text, 'ariadne_training_documents_total{classifier="samples",samples="extracted"}') == 2
+
+
+class _BlockingSampleClassifier(_SampleClassifier):
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.may_continue = threading.Event()
+
+    def extract_samples(self, document, layer, feature):
+        self.started.set()
+        assert self.may_continue.wait(10)
+        return super().extract_samples(document, layer, feature)
+
+
+def test_train_cancel_stops_extracting_samples(server):
+    classifier = _BlockingSampleClassifier()
+    server.add_classifier("samples", classifier)
+    client = server._app.test_client()
+
+    client.post("/samples/train", json=_training_request("p"))
+    assert classifier.started.wait(10)
+    assert client.post("/samples/train/cancel?userId=user").status_code == 200
+    classifier.may_continue.set()
+    assert server._scheduler.wait_until_idle(10)
+
+    assert classifier.extracted == 1
+    assert classifier.fitted == []
+    assert client.get("/samples/train/status").get_json()["finished"][0]["state"] == "cancelled"
+
+
+def test_requests_are_captured(tmp_path):
+    server = Server(capture_directory=tmp_path / "capture", capture_sample_rate=1.0)
+    server._lock_directory = tmp_path / "locks"
+    server.add_classifier("recording", _RecordingClassifier())
+    client = server._app.test_client()
+
+    assert client.post("/recording/predict", json=_prediction_request()).status_code == 200
+    server._recorder.close()
+
+    (captured,) = read_archives(list((tmp_path / "capture").iterdir()))
+    assert captured.path == "/recording/predict"
+    assert json.loads(captured.body) == _prediction_request()
@@ -0,0 +1,135 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+from pathlib import Path
+
+from cassis import Cas, TypeSystem, load_cas_from_xmi
+from cassis.typesystem import TYPE_NAME_ANNOTATION, TYPE_NAME_BOOLEAN, TYPE_NAME_STRING
+
+from ariadne.contrib.inception_util import (
+    IS_PREDICTION,
+    SENTENCE_TYPE,
+    create_relation_prediction,
+    create_span_prediction,
+)
+from ariadne.protocol import parse_prediction_request
+from ariadne import splice
+from ariadne.splice import FALLBACK_ERROR, FALLBACK_UNSUPPORTED, XmiSplicer, get_fallback_counts
+
+REQUESTS_DIRECTORY = Path(__file__).resolve().parents[1] / "examples" / "requests"
+
+
+def _load_prediction_request():
+    with open(REQUESTS_DIRECTORY / "predict_sentence_sentiment.json", encoding="utf-8") as f:
+        json_data = json.load(f)
+
+    return json_data["document"]["xmi"], parse_prediction_request(json_data)
+
+
+def _build_relation_cas():
+    typesystem = TypeSystem()
+    Sentence = typesystem.create_type(SENTENCE_TYPE)
+    Span = typesystem.create_type("custom.Span")
+    Relation = typesystem.create_type("other.layer.Relation")
+    typesystem.create_feature(Relation, "Governor", TYPE_NAME_ANNOTATION)
+    typesystem.create_feature(Relation, "Dependent", TYPE_NAME_ANNOTATION)
+    typesystem.create_feature(Relation, "value", TYPE_NAME_STRING)
+    typesystem.create_feature(Relation, IS_PREDICTION, TYPE_NAME_BOOLEAN)
+
+    cas = Cas(typesystem)
+    cas.sofa_string = "Alice and Bob"
+    cas.add(Sentence(begin=0, end=13))
+    cas.add(Span(begin=0, end=5))
+    cas.add(Span(begin=10, end=13))
+
+    xmi = cas.to_xmi()
+    return xmi, load_cas_from_xmi(xmi, typesystem)
+
+
+def test_splice_span_predictions():
+    xmi, req = _load_prediction_request()
+    sut = XmiSplicer(xmi, req.cas)
+
+    for sentence in req.cas.select(SENTENCE_TYPE):
+        prediction = create_span_prediction(req.cas, req.layer, req.feature, sentence.begin, sentence.end, "pos")
+        req.cas.add(prediction)
+
+    spliced = sut.splice()
+
+    assert spliced is not None
+    assert sut.verify(spliced)
+
+
+def test_splice_relation_prediction_with_new_namespace():
+    xmi, cas = _build_relation_cas()
+    sut = XmiSplicer(xmi, cas)
+
+    alice, bob = cas.select("custom.Span")
+    cas.add(create_relation_prediction(cas, "other.layer.Relation", "value", alice, bob, "knows"))
+
+    spliced = sut.splice()
+
+    assert spliced is not None
+    assert 'xmlns:layer="http:///other/layer.ecore"' in spliced
+    assert sut.verify(spliced)
+    relation = load_cas_from_xmi(spliced, cas.typesystem).select("other.layer.Relation")[0]
+    assert relation.Governor.get_covered_text() == "Alice"
+    assert relation.Dependent.get_covered_text() == "Bob"
+
+
+def test_splice_without_predictions_returns_original():
+    xmi, cas = _build_relation_cas()
+
+    assert XmiSplicer(xmi, cas).splice() == xmi
+
+
+def test_splice_is_not_possible_after_removal():
+    xmi, cas = _build_relation_cas()
+    sut = XmiSplicer(xmi, cas)
+
+    cas.remove(cas.select("custom.Span")[0])
+    before = get_fallback_counts().get(FALLBACK_UNSUPPORTED, 0)
+
+    assert sut.splice() is None
+    assert get_fallback_counts()[FALLBACK_UNSUPPORTED] == before + 1
+
+
+def test_splice_falls_back_loudly_if_cassis_internals_changed(monkeypatch, caplog):
+    xmi, cas = _build_relation_cas()
+    sut = XmiSplicer(xmi, cas)
+    monkeypatch.setattr(splice, "CasXmiSerializer", _SerializerWithoutInternals)
+    alice, bob = cas.select("custom.Span")
+    cas.add(create_relation_prediction(cas, "other.layer.Relation", "value", alice, bob, "knows"))
+    before = get_fallback_counts().get(FALLBACK_ERROR, 0)
+
+    assert sut.splice() is None
+    assert get_fallback_counts()[FALLBACK_ERROR] == before + 1
+    assert "Splicing XMI failed" in caplog.text
+
+
+class _SerializerWithoutInternals:
+    pass
+
+
+def test_cassis_internals_used_for_splicing_exist():
+    # Splicing relies on private parts of cassis, this fails loudly if an upgrade changes them
+    xmi, cas = _build_relation_cas()
+    assert isinstance(cas._xmi_id_generator._next_id, int)
+    assert callable(cas._find_all_fs)
+    serializer = splice.CasXmiSerializer()
+    assert isinstance(serializer._nsmap, dict)
+    assert isinstance(serializer._urls_to_prefixes, dict)
+    assert callable(serializer._serialize_feature_structure)
@@ -0,0 +1,170 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+
+import pytest
+
+from ariadne.store import DirectoryModelStore, LocalModelStore, ModelChange
+
+
+def _writer(content: bytes):
+    return lambda path: path.write_bytes(content)
+
+
+@pytest.fixture(params=["local", "directory"])
+def store(request, tmp_path):
+    if request.param == "local":
+        return LocalModelStore(tmp_path / "models")
+    return DirectoryModelStore(tmp_path / "shared", tmp_path / "node")
+
+
+def test_publish_increments_version(store):
+    assert store.latest_version("classifier", "user") is None
+
+    assert store.publish("classifier", "user", _writer(b"first")) == 1
+    assert store.publish("classifier", "user", _writer(b"second")) == 2
+
+    assert store.latest_version("classifier", "user") == 2
+    assert store.latest_version("classifier", "other") is None
+    assert store.fetch("classifier", "user", 2).read_bytes() == b"second"
+
+
+def test_old_versions_are_deleted(tmp_path):
+    store = LocalModelStore(tmp_path, keep_versions=2)
+    for i in range(4):
+        store.publish("classifier", "user", _writer(str(i).encode()))
+
+    assert sorted(p.name for p in (tmp_path / "classifier" / "model_user.versions").iterdir()) == [
+        "00000003.joblib",
+        "00000004.joblib",
+    ]
+    assert (tmp_path / "classifier" / "model_user.joblib").read_bytes() == b"3"
+
+
+def test_failed_write_publishes_nothing(store):
+    def failing_writer(path):
+        path.write_bytes(b"partial")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        store.publish("classifier", "user", failing_writer)
+
+    assert store.latest_version("classifier", "user") is None
+    assert store.latest_versions() == {}
+
+
+def test_concurrent_publishes_get_distinct_versions(store):
+    versions = []
+
+    def publish(i):
+        versions.append(store.publish("classifier", "user", _writer(str(i).encode())))
+
+    threads = [threading.Thread(target=publish, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(versions) == list(range(1, 9))
+    assert store.latest_version("classifier", "user") == 8
+
+
+def test_legacy_model_is_version_zero(tmp_path):
+    (tmp_path / "classifier").mkdir()
+    (tmp_path / "classifier" / "model_user.joblib").write_bytes(b"legacy")
+    store = LocalModelStore(tmp_path)
+
+    assert store.latest_version("classifier", "user") == 0
+    assert store.fetch("classifier", "user", 0).read_bytes() == b"legacy"
+    assert store.publish("classifier", "user", _writer(b"new")) == 1
+
+
+def test_directory_store_shares_models_between_nodes(tmp_path):
+    first = DirectoryModelStore(tmp_path / "shared", tmp_path / "first")
+    second = DirectoryModelStore(tmp_path / "shared", tmp_path / "second")
+
+    first.publish("classifier", "user", _writer(b"model"))
+
+    assert second.latest_version("classifier", "user") == 1
+    path = second.fetch("classifier", "user", 1)
+    assert path.read_bytes() == b"model"
+    assert tmp_path / "second" in path.parents
+
+
+def test_listeners_are_notified_about_publishes(store):
+    changes = []
+    store.subscribe(changes.append)
+
+    store.publish("classifier", "user", _writer(b"model"))
+
+    assert changes == [ModelChange("classifier", "user", 1)]
+
+
+def test_poll_notices_models_published_elsewhere(tmp_path):
+    first = DirectoryModelStore(tmp_path / "shared", tmp_path / "first")
+    second = DirectoryModelStore(tmp_path / "shared", tmp_path / "second")
+    changes = []
+    second.subscribe(changes.append)
+
+    first.publish("classifier", "user", _writer(b"first"))
+    assert second.poll() == []
+
+    first.publish("classifier", "user", _writer(b"second"))
+    first.publish("classifier", "other", _writer(b"other"))
+
+    expected = [ModelChange("classifier", "other", 1), ModelChange("classifier", "user", 2)]
+    assert second.poll() == expected
+    assert changes == expected
+    assert second.poll() == []
+
+
+def test_current_version_is_notified_version_while_watched(tmp_path):
+    first = LocalModelStore(tmp_path)
+    second = LocalModelStore(tmp_path)
+    first.publish("classifier", "user", _writer(b"first"))
+    assert second.current_version("classifier", "user") == 1
+
+    second.watch(interval=3600)
+    try:
+        first.publish("classifier", "user", _writer(b"second"))
+        assert second.current_version("classifier", "user") == 1
+
+        second.poll()
+        assert second.current_version("classifier", "user") == 2
+
+        # Models published by the store itself are known right away
+        second.publish("classifier", "user", _writer(b"third"))
+        assert second.current_version("classifier", "user") == 3
+        assert second.current_version("classifier", "other") is None
+    finally:
+        second.close()
+
+    first.publish("classifier", "user", _writer(b"fourth"))
+    assert second.current_version("classifier", "user") == 4
+
+
+def test_watch_polls_in_background(tmp_path):
+    first = LocalModelStore(tmp_path)
+    second = LocalModelStore(tmp_path)
+    changed = threading.Event()
+    second.subscribe(lambda change: changed.set())
+
+    second.watch(interval=0.01)
+    try:
+        first.publish("classifier", "user", _writer(b"model"))
+        assert changed.wait(10)
+    finally:
+        second.close()
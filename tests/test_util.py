@@ -0,0 +1,52 @@
+# Licensed to the Technische Universität Darmstadt under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The Technische Universität Darmstadt
+# licenses this file to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import sys
+import time
+
+import pytest
+
+from ariadne.util import RssSampler, get_memory_usage, get_rss_bytes
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="Requires /proc/<pid>/smaps_rollup")
+def test_get_memory_usage():
+    usage = get_memory_usage()
+
+    assert usage.rss > 0
+    assert usage.rss == usage.shared + usage.private
+    assert usage.pss <= usage.rss
+    assert get_memory_usage(os.getpid()) is not None
+
+
+def test_get_memory_usage_of_unknown_process():
+    assert get_memory_usage(-1) is None
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="Requires /proc/self/statm")
+def test_rss_sampler_measures_peak_of_block():
+    with RssSampler(interval=0.001) as sampler:
+        data = bytearray(64 * 1024 * 1024)
+        time.sleep(0.05)
+        del data
+
+    assert sampler.start_bytes > 0
+    assert sampler.increase_bytes >= 32 * 1024 * 1024
+    # A later block does not report the peak of an earlier one
+    with RssSampler() as later:
+        pass
+    assert later.increase_bytes < 32 * 1024 * 1024
+    assert get_rss_bytes() < sampler.peak_bytes
@@ -13,37 +13,36 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from ariadne.demo.demo_link_feature import DemoLinkFeatureRecommender
-from ariadne.demo.demo_multiple_features import DemoMultipleFeaturesRecommender
-from ariadne.demo.demo_relation import DemoRelationLayerRecommender
-from ariadne.demo.demo_string_array_feature import DemoStringArrayFeatureRecommender
-from ariadne.demo.demo_string_feature import DemoStringFeatureRecommender
-from ariadne.demo.demo_list_types import DemoListTypesRecommender
+import os
+
 from ariadne.server import Server
 from ariadne.util import setup_logging
-from ariadne.contrib.spacy import SpacyNerClassifier
 
 setup_logging()
 
 server = Server()
 
-server.add_classifier("demo_string_feature", DemoStringFeatureRecommender())
-server.add_classifier("demo_string_array_feature", DemoStringArrayFeatureRecommender())
-server.add_classifier("demo_link_feature", DemoLinkFeatureRecommender())
-server.add_classifier("demo_relation_layer", DemoRelationLayerRecommender())
-server.add_classifier("demo_multiple_features", DemoMultipleFeaturesRecommender())
-server.add_classifier("demo_list_types", DemoListTypesRecommender())
+# Classifiers given by import path are only imported and created when they are first used or warmed up
+server.add_classifier("demo_string_feature", "ariadne.demo.demo_string_feature:DemoStringFeatureRecommender")
+server.add_classifier(
+    "demo_string_array_feature", "ariadne.demo.demo_string_array_feature:DemoStringArrayFeatureRecommender"
+)
+server.add_classifier("demo_link_feature", "ariadne.demo.demo_link_feature:DemoLinkFeatureRecommender")
+server.add_classifier("demo_relation_layer", "ariadne.demo.demo_relation:DemoRelationLayerRecommender")
+server.add_classifier("demo_multiple_features", "ariadne.demo.demo_multiple_features:DemoMultipleFeaturesRecommender")
+server.add_classifier("demo_list_types", "ariadne.demo.demo_list_types:DemoListTypesRecommender")
 
-server.add_classifier("spacy_ner", SpacyNerClassifier("en_core_web_sm"))
-# server.add_classifier("spacy_pos", SpacyPosClassifier("en_core_web_sm"))
-# server.add_classifier("sklearn_sentence", SklearnSentenceClassifier())
-# server.add_classifier("jieba", JiebaSegmenter())
-# server.add_classifier("stemmer", NltkStemmer())
-# server.add_classifier("leven", LevenshteinStringMatcher())
-# server.add_classifier("sbert", SbertSentenceClassifier())
+server.add_classifier("spacy_ner", "ariadne.contrib.spacy:SpacyNerClassifier", classifier_args=["en_core_web_sm"])
+# server.add_classifier("spacy_pos", "ariadne.contrib.spacy:SpacyPosClassifier", classifier_args=["en_core_web_sm"])
+# server.add_classifier("sklearn_sentence", "ariadne.contrib.sklearn:SklearnSentenceClassifier")
+# server.add_classifier("jieba", "ariadne.contrib.jieba:JiebaSegmenter")
+# server.add_classifier("stemmer", "ariadne.contrib.nltk:NltkStemmer")
+# server.add_classifier("leven", "ariadne.contrib.stringmatcher:LevenshteinStringMatcher")
+# server.add_classifier("sbert", "ariadne.contrib.sbert:SbertSentenceClassifier")
 # server.add_classifier(
 #     "adapter_pos",
-#     AdapterSequenceTagger(
+#     "ariadne.contrib.adapters:AdapterSequenceTagger",
+#     classifier_kwargs=dict(
 #         base_model_name="bert-base-uncased",
 #         adapter_name="pos/ldc2012t13@vblagoje",
 #         labels=[
@@ -70,14 +69,20 @@ server.add_classifier("spacy_ner", SpacyNerClassifier("en_core_web_sm"))
 #
 # server.add_classifier(
 #     "adapter_sent",
-#     AdapterSentenceClassifier(
-#         "bert-base-multilingual-uncased",
-#         "sentiment/hinglish-twitter-sentiment@nirantk",
-#         labels=["negative", "positive"],
-#         config="pfeiffer",
-#     ),
+#     "ariadne.contrib.adapters:AdapterSentenceClassifier",
+#     classifier_args=["bert-base-multilingual-uncased", "sentiment/hinglish-twitter-sentiment@nirantk"],
+#     classifier_kwargs=dict(labels=["negative", "positive"], config="pfeiffer"),
 # )
 
+# Classifiers are loaded on demand unless listed in ARIADNE_PRELOAD, e.g. ARIADNE_PRELOAD=spacy_ner. Set it only
+# when running gunicorn with --preload, then these are loaded once in the master process and shared by all workers.
+preload = [name.strip() for name in os.environ.get("ARIADNE_PRELOAD", "").split(",") if name.strip()]
+if preload:
+    server.preload(preload)
+else:
+    # Reports mistyped import paths at startup instead of on the first request
+    server.log_classifiers()
+
 app = server._app
 
 if __name__ == "__main__":